@@ -0,0 +1,172 @@
+import hashlib
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, Optional
+
+from minsearch import Index
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from config import ANSWER_CACHE_CONFIG
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace"""
+
+    question = question.lower().translate(PUNCTUATION_TABLE)
+    return WHITESPACE_PATTERN.sub(" ", question).strip()
+
+
+def index_version(index: Index) -> str:
+    """Fingerprint of a fitted index: the content of every text field of every doc"""
+
+    digest = hashlib.blake2b(str(len(index.docs)).encode(), digest_size=20)
+    for doc in index.docs:
+        for field in index.text_fields:
+            digest.update(str(doc.get(field, "")).encode())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def question_vector(index: Index, question: str) -> sparse.csr_matrix:
+    """Unit length sparse TF-IDF row of the question over all text fields of the index"""
+
+    parts = [index.vectorizers[field].transform([question]) for field in index.text_fields]
+    return normalize(sparse.hstack(parts, format="csr"))
+
+
+def unknown_terms(index: Index, question: str) -> FrozenSet[str]:
+    """Terms of the question in no vocabulary of the index, the TF-IDF vector ignores them"""
+
+    vectorizers = [index.vectorizers[field] for field in index.text_fields]
+    if not vectorizers:
+        return frozenset()
+    terms = vectorizers[0].build_analyzer()(question)
+    return frozenset(term for term in terms if not any(term in v.vocabulary_ for v in vectorizers))
+
+
+class _Entry:
+    __slots__ = ("answer", "vector", "unknown_terms", "created")
+
+    def __init__(self, answer: str, vector: sparse.csr_matrix, unknown_terms: FrozenSet[str]):
+        self.answer = answer
+        self.vector = vector
+        self.unknown_terms = unknown_terms
+        self.created = time.monotonic()
+
+
+class AnswerCache:
+    """
+    Process-wide cache of agent answers, keyed on (repo, index version,
+    question).
+
+    A question hits when it normalizes to a cached question, or when the
+    cosine similarity of its TF-IDF vector (from the repo's own index) to
+    a cached question is at least similarity_threshold and both have the
+    same terms outside the index vocabulary ("why" vs "how", "conda"),
+    which the vectors cannot tell apart. Entries expire after ttl_seconds
+    and the least recently used ones are evicted beyond max_entries. The
+    index version, a hash of the indexed content, keeps answers of a
+    re-indexed repo from being served. An empty index (a repo without
+    markdown) is never fitted, its questions always miss and are not
+    cached.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = ANSWER_CACHE_CONFIG.similarity_threshold,
+        ttl_seconds: float = ANSWER_CACHE_CONFIG.ttl_seconds,
+        max_entries: int = ANSWER_CACHE_CONFIG.max_entries,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.created > self.ttl_seconds
+
+    def get(self, repo: Hashable, version: str, index: Index, question: str, bypass: bool = False) -> Optional[str]:
+        """Cached answer to question or a similar one, None on a miss"""
+
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        if not index.docs:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        normalized = normalize_question(question)
+        vector = question_vector(index, normalized)
+        unknown = unknown_terms(index, normalized)
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for key, entry in list(self._entries.items()):
+                if self._expired(entry, now):
+                    del self._entries[key]
+                    continue
+                if key[:2] != (repo, version):
+                    continue
+                if key[2] == normalized:
+                    best_key = key
+                    break
+                if entry.unknown_terms == unknown and vector.shape == entry.vector.shape:
+                    score = float(vector.multiply(entry.vector).sum())
+                    if score >= best_score:
+                        best_key, best_score = key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key].answer
+
+    def set(self, repo: Hashable, version: str, index: Index, question: str, answer: str) -> None:
+        if not index.docs:
+            return
+        normalized = normalize_question(question)
+        entry = _Entry(answer, question_vector(index, normalized), unknown_terms(index, normalized))
+        with self._lock:
+            key = (repo, version, normalized)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+
+def cached_messages(question: str, answer: str) -> list:
+    """History messages of a question answered from the cache"""
+
+    return [
+        ModelRequest(parts=[UserPromptPart(content=question)]),
+        ModelResponse(parts=[TextPart(content=answer)]),
+    ]
@@ -0,0 +1,105 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+
+class ChunkStore(Sequence):
+    """
+    Compact, column oriented storage for document chunks.
+
+    The text of every document is held once, chunks are (doc_id, start, end)
+    offsets in array backed columns and the metadata dict is shared by all
+    chunks of a document. Indexing the store returns lightweight ChunkView
+    mappings; chunk content is only sliced out of the document text when
+    it is accessed.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.metadata = []
+        self.doc_ids = array('I')
+        self.starts = array('I')
+        self.ends = array('I')
+
+    def _add_doc(self, text: str, metadata: Dict[str, Any]) -> int:
+        self.texts.append(text)
+        self.metadata.append(metadata)
+        return len(self.texts) - 1
+
+    def _add_chunk(self, doc_id: int, start: int, end: int) -> None:
+        self.doc_ids.append(doc_id)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def add_document(self, doc: Dict[str, Any], offsets: Iterable[Tuple[int, int]]) -> int:
+        """Add a document and the (start, end) offsets of its chunks"""
+
+        metadata = dict(doc)
+        text = metadata.pop('content')
+        doc_id = self._add_doc(text, metadata)
+        for start, end in offsets:
+            self._add_chunk(doc_id, start, end)
+        return doc_id
+
+    def add_chunks(self, chunks: Iterable["ChunkView"]) -> None:
+        """Copy chunks from another store, sharing document text and metadata"""
+
+        doc_map = {}
+        for chunk in chunks:
+            source, source_id = chunk.store, chunk.doc_id
+            key = (id(source), source_id)
+            if key not in doc_map:
+                doc_map[key] = self._add_doc(source.texts[source_id], source.metadata[source_id])
+            self._add_chunk(doc_map[key], source.starts[chunk.index], source.ends[chunk.index])
+
+    def content(self, i: int) -> str:
+        return self.texts[self.doc_ids[i]][self.starts[i]:self.ends[i]]
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ChunkView(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return ChunkView(self, i)
+
+    def __repr__(self) -> str:
+        return f"ChunkStore(documents={len(self.texts)}, chunks={len(self)})"
+
+
+class ChunkView(Mapping):
+    """Read-only dict-like view of one chunk in a ChunkStore"""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: ChunkStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def doc_id(self) -> int:
+        return self.store.doc_ids[self.index]
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'content':
+            return self.store.content(self.index)
+        if key == 'start':
+            return self.store.starts[self.index]
+        return self.store.metadata[self.doc_id][key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield 'start'
+        yield 'content'
+        for key in self.store.metadata[self.doc_id]:
+            if key not in ('start', 'content'):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"ChunkView({dict(self)!r})"
@@ -1,3 +1,6 @@
+import os
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 EVALUATION_USER_PROMPT = """
@@ -35,3 +38,91 @@ class EvaluationConfig(BaseModel):
     output_file: str = "evaluation_results.csv"
 
 EVALUATION_CONFIG = EvaluationConfig()
+
+class IndexCacheConfig(BaseModel):
+    cache_directory: str = os.getenv("INDEX_CACHE_DIRECTORY", ".index_cache")
+    max_bytes: int = 2 * 1024 ** 3
+    max_entries: int = 64
+
+INDEX_CACHE_CONFIG = IndexCacheConfig()
+
+class IndexRegistryConfig(BaseModel):
+    idle_ttl_seconds: float = 30 * 60
+
+INDEX_REGISTRY_CONFIG = IndexRegistryConfig()
+
+class IngestConfig(BaseModel):
+    parse_workers: int = int(os.getenv("INGEST_PARSE_WORKERS", "0"))
+    parse_batch_size: int = 64
+    # method is 'markdown' (header/paragraph/code aware, token budget)
+    # or 'sliding_window' (size/step character windows)
+    chunking_params: dict = {"method": "markdown", "max_tokens": 500}
+
+INGEST_CONFIG = IngestConfig()
+
+class ShardedSearchConfig(BaseModel):
+    max_workers: int = 8
+    num_results: int = 5
+    # 'none' compares raw scores, every shard scores with cosine TF-IDF in [0, 1].
+    # 'max' divides each shard's scores by its best score and 'minmax' rescales
+    # each shard's candidates to [0, 1]; both give every shard's top hit the
+    # same score, so weak matches from other repos can push out the relevant one
+    normalization: str = "none"
+
+SHARDED_SEARCH_CONFIG = ShardedSearchConfig()
+
+class SearchResultConfig(BaseModel):
+    # Fields of a chunk returned to the agent, None keeps every field
+    fields: Optional[List[str]] = ["filename", "title", "content"]
+    content_field: str = "content"
+    # Content is cut to a window around the first matched query term,
+    # or to its start when highlight is off or nothing matches
+    max_content_chars: int = 800
+    highlight: bool = True
+    # Total budget over all results of one call, as serialized JSON
+    max_payload_chars: int = 4000
+    # Smallest content worth returning when the budget runs out
+    min_content_chars: int = 200
+    # Payload sizes go to search_payloads_*.jsonl.gz segments in the logs directory
+    log_payloads: bool = os.getenv("LOG_SEARCH_PAYLOADS", "1") != "0"
+
+SEARCH_RESULT_CONFIG = SearchResultConfig()
+
+class HistoryConfig(BaseModel):
+    # Budget of the history resent to the agent every turn, in estimated tokens
+    max_tokens: int = 6000
+    # Tool returns of the latest turns are kept, older ones are redacted
+    keep_tool_returns_turns: int = 1
+    # Redacted tool returns keep the filenames they returned
+    summarize_tool_returns: bool = True
+
+HISTORY_CONFIG = HistoryConfig()
+
+class AnswerCacheConfig(BaseModel):
+    enabled: bool = True
+    # Cosine similarity of TF-IDF question vectors needed for a hit
+    similarity_threshold: float = 0.9
+    ttl_seconds: float = 24 * 60 * 60
+    max_entries: int = 1024
+    # Follow-up questions depend on the conversation, only cache first questions
+    first_turn_only: bool = True
+
+ANSWER_CACHE_CONFIG = AnswerCacheConfig()
+
+class LogConfig(BaseModel):
+    # 'segments' batches interactions into rotating gzip JSONL segments,
+    # 'files' keeps the old layout of one JSON file per interaction
+    layout: str = os.getenv("LOGS_LAYOUT", "segments")
+    batch_size: int = 64
+    flush_interval_seconds: float = 1.0
+    # A segment is rotated once it reaches either limit
+    segment_max_bytes: int = 16 * 1024 ** 2
+    segment_max_seconds: float = 60 * 60
+    # 'batch' fsyncs after every written batch, 'interval' at most every
+    # fsync_interval_seconds and 'never' leaves it to the OS
+    fsync: str = "interval"
+    fsync_interval_seconds: float = 5.0
+    # Entries beyond this many waiting ones are dropped, logging never blocks a chat turn
+    max_queue_size: int = 10_000
+
+LOG_CONFIG = LogConfig()
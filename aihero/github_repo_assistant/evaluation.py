@@ -2,6 +2,7 @@ import asyncio
 import concurrent.futures
 import json
 import os
+from itertools import chain
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -11,6 +12,7 @@ from pydantic_ai import Agent
 from tqdm.auto import tqdm
 
 from config import EVALUATION_CONFIG, EVALUATION_SYSTEM_PROMPT, EVALUATION_USER_PROMPT
+from logs import SEGMENT_SUFFIX, iter_segment_records, read_segment
 
 # --- Models ---
 
@@ -45,6 +47,18 @@ def load_log_data(log_file: Path) -> Dict[str, Any]:
     except json.JSONDecodeError:
         print(f"Error decoding JSON from {log_file}")
         return {}
+
+def load_log_record(log_directory: Path, log_file: str) -> Dict[str, Any]:
+    """A record by its log_file: a per-file log name or 'segment:line'"""
+    segment, _, line = log_file.rpartition(':')
+    if segment.endswith(SEGMENT_SUFFIX) and line.isdigit():
+        for i, record in enumerate(read_segment(Path(log_directory) / segment)):
+            if i == int(line):
+                record['log_file'] = log_file
+                return record
+        print(f"{log_file} is not found in the desired location")
+        return {}
+    return load_log_data(Path(log_directory) / log_file)
     
 def simplify_log_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     log_simplified = []
@@ -121,8 +135,9 @@ def get_eval_data(log_directory: Path) -> List[Dict[str, Any]]:
     if not log_directory.exists():
         return eval_set
         
-    for log_file in log_directory.glob('*.json'):
-        log_record = load_log_data(log_file=log_file)
+    # Per-file logs and the entries of rotated log segments
+    file_records = (load_log_data(log_file=log_file) for log_file in log_directory.glob('*.json'))
+    for log_record in chain(file_records, iter_segment_records(log_directory)):
         if not log_record: 
             continue
             
@@ -1,11 +1,13 @@
 import glob
-import json
 import os
 
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+from evaluation import load_log_record
+from logs import SEGMENT_SUFFIX
+
 # Set page config
 st.set_page_config(layout="wide", page_title="Evaluation Dashboard", page_icon="📊")
 
@@ -48,7 +50,8 @@ if df is None:
     
     # Check if we have logs at all
     log_count = len(glob.glob("evaluation_data/*.json")) if os.path.exists("evaluation_data") else 0
-    st.caption(f"Note: Found {log_count} log files in `evaluation_data/` waiting to be processed.")
+    segment_count = len(glob.glob(f"evaluation_data/*{SEGMENT_SUFFIX}")) if os.path.exists("evaluation_data") else 0
+    st.caption(f"Note: Found {log_count} log files and {segment_count} log segments in `evaluation_data/` waiting to be processed.")
 
 elif df.empty:
     st.warning("Evaluation CSV found but it is empty.")
@@ -148,10 +151,9 @@ else:
 
     with col_content:
         if selected_file:
-            log_path = os.path.join("evaluation_data", selected_file)
-            if os.path.exists(log_path):
-                with open(log_path, 'r') as f:
-                    log_data = json.load(f)
+            # Per-file logs or 'segment:line' entries of log segments
+            log_data = load_log_record("evaluation_data", selected_file)
+            if log_data:
                 st.json(log_data)
             else:
-                st.error(f"Log file not found at {log_path}")
+                st.error(f"Log file not found at {os.path.join('evaluation_data', selected_file)}")
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+
+class BackgroundEventLoop:
+    """
+    A long-lived asyncio event loop running on a daemon thread.
+
+    Coroutines are submitted from any thread with submit() (returns a
+    concurrent.futures.Future) or run() (blocks for the result). Because the
+    loop outlives every call, async HTTP clients created on it keep their
+    connection pools, so TLS connections to the model provider stay warm
+    between chat turns instead of being torn down with asyncio.run().
+    """
+
+    def __init__(self, name: str = "agent-event-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "BackgroundEventLoop":
+        with self._lock:
+            if self.running:
+                return self
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run_forever():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run_forever, name=self.name, daemon=True)
+            self._thread.start()
+            started.wait()
+        return self
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule coro on the loop, starting it if needed"""
+        if not self.running:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run coro on the loop and wait for its result"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundEventLoop.run() would block its own loop, await the coroutine instead")
+        return self.submit(coro).result(timeout=timeout)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            if not self.running:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+            self._loop = None
+
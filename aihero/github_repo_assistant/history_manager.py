@@ -0,0 +1,121 @@
+from dataclasses import replace
+from typing import Any, Dict, List, Tuple
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from config import HISTORY_CONFIG, HistoryConfig
+from search_tools import CHARS_PER_TOKEN
+
+REDACTED_CONTENT = "RETURN_RESULTS_REDACTED"
+
+
+def estimate_tokens(messages: List[ModelMessage]) -> int:
+    """Rough token count of messages, from the size of their JSON"""
+
+    if not messages:
+        return 0
+    return len(ModelMessagesTypeAdapter.dump_json(messages)) // CHARS_PER_TOKEN
+
+
+def split_turns(messages: List[ModelMessage]) -> List[List[ModelMessage]]:
+    """Group messages into turns, each starting with a user prompt request"""
+
+    turns = []
+    for message in messages:
+        starts_turn = isinstance(message, ModelRequest) and any(
+            isinstance(part, UserPromptPart) for part in message.parts
+        )
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _filenames(content: Any) -> List[str]:
+    if isinstance(content, dict):
+        return [content["filename"]] if "filename" in content else []
+    if isinstance(content, (list, tuple)):
+        return [name for item in content for name in _filenames(item)]
+    return []
+
+
+def redacted_content(content: Any, summarize: bool = True) -> str:
+    """Placeholder for a tool return, optionally naming the files it returned"""
+
+    filenames = list(dict.fromkeys(_filenames(content))) if summarize else []
+    if not filenames:
+        return REDACTED_CONTENT
+    return f"{REDACTED_CONTENT} (files: {', '.join(filenames)})"
+
+
+def redact_tool_returns(messages: List[ModelMessage], summarize: bool = True) -> Tuple[List[ModelMessage], int]:
+    """Copy of messages with tool return contents replaced, and how many were replaced"""
+
+    redacted = []
+    count = 0
+    for message in messages:
+        if isinstance(message, ModelRequest):
+            parts = []
+            for part in message.parts:
+                if isinstance(part, ToolReturnPart) and not str(part.content).startswith(REDACTED_CONTENT):
+                    part = replace(part, content=redacted_content(part.content, summarize))
+                    count += 1
+                parts.append(part)
+            message = replace(message, parts=parts)
+        redacted.append(message)
+    return redacted, count
+
+
+class HistoryManager:
+    """
+    Keeps the conversation history resent to the agent within a token budget.
+
+    compact() redacts the tool returns (search results) of all but the
+    latest turns, like evaluation.simplify_log_messages does for logs, then
+    drops whole turns, oldest first, while the history is over max_tokens.
+    Turns are dropped whole so tool calls never lose their returns.
+    """
+
+    def __init__(self, config: HistoryConfig = HISTORY_CONFIG):
+        self.config = config
+        self.tokens_saved = 0
+
+    def compact(self, messages: List[ModelMessage]) -> Tuple[List[ModelMessage], Dict[str, int]]:
+        tokens_before = estimate_tokens(messages)
+        turns = split_turns(messages)
+
+        old_turns = len(turns) - max(self.config.keep_tool_returns_turns, 0)
+        redacted = 0
+        for i in range(max(old_turns, 0)):
+            turns[i], count = redact_tool_returns(turns[i], self.config.summarize_tool_returns)
+            redacted += count
+
+        dropped = 0
+        tokens = estimate_tokens([m for turn in turns for m in turn])
+        while tokens > self.config.max_tokens and len(turns) > 1:
+            turns.pop(0)
+            dropped += 1
+            tokens = estimate_tokens([m for turn in turns for m in turn])
+
+        # A single turn over budget still loses its tool returns
+        if tokens > self.config.max_tokens and turns:
+            turns[0], count = redact_tool_returns(turns[0], self.config.summarize_tool_returns)
+            redacted += count
+
+        compacted = [m for turn in turns for m in turn]
+        tokens_after = estimate_tokens(compacted)
+        self.tokens_saved += tokens_before - tokens_after
+        stats = {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "tool_returns_redacted": redacted,
+            "turns_dropped": dropped,
+        }
+        return compacted, stats
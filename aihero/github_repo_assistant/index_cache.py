@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from minsearch import Index
+
+from config import INDEX_CACHE_CONFIG
+
+INDEX_FILE = "index.pkl"
+META_FILE = "meta.json"
+FILE_HASHES_FILE = "files.json"
+# Bump when the pickled layout of indexed docs changes
+CACHE_FORMAT_VERSION = 2
+
+
+def cache_key(repo_owner: str, repo_name: str, branch: str, commit_sha: str, chunking_params: Optional[Dict]) -> str:
+    """Content address of a fitted index: the repo commit plus the chunking params"""
+
+    key_material = json.dumps({
+        "format": CACHE_FORMAT_VERSION,
+        "repo_owner": repo_owner.lower(),
+        "repo_name": repo_name.lower(),
+        "branch": branch,
+        "commit_sha": commit_sha,
+        "chunking_params": chunking_params,
+    }, sort_keys=True)
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class IndexCache:
+    """
+    On-disk cache of fitted minsearch indexes (including their chunked docs).
+
+    Every entry lives in its own directory named after its cache key. Entries
+    are written to a temporary directory and renamed into place, so concurrent
+    processes never observe a half written index. The modification time of the
+    index file doubles as the last access time used for LRU eviction.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = INDEX_CACHE_CONFIG.cache_directory,
+        max_bytes: int = INDEX_CACHE_CONFIG.max_bytes,
+        max_entries: int = INDEX_CACHE_CONFIG.max_entries,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def load(self, key: str) -> Optional[Index]:
+        """Return the cached index for key, or None on a miss"""
+
+        index_path = self._entry_dir(key) / INDEX_FILE
+        try:
+            with open(index_path, "rb") as f_in:
+                index = pickle.load(f_in)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+            print(f"Discarding corrupt cache entry {key}: {e}")
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            return None
+
+        # Mark the entry as recently used
+        os.utime(index_path)
+        return index
+
+    def load_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._entry_dir(key) / META_FILE, "r", encoding="utf-8") as f_in:
+                return json.load(f_in)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def load_file_hashes(self, key: str) -> Optional[Dict[str, str]]:
+        """Per-file content hashes of the markdown files behind an entry"""
+
+        try:
+            with open(self._entry_dir(key) / FILE_HASHES_FILE, "r", encoding="utf-8") as f_in:
+                return json.load(f_in)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def find_latest(self, **match) -> Optional[str]:
+        """
+        Key of the newest entry whose metadata matches all given fields,
+        entries of another CACHE_FORMAT_VERSION never match
+        """
+
+        match = {"format": CACHE_FORMAT_VERSION, **match}
+        latest_key, latest_created = None, None
+        for _, _, entry_dir in self.entries():
+            meta = self.load_meta(entry_dir.name)
+            if meta is None or any(meta.get(k) != v for k, v in match.items()):
+                continue
+            if latest_created is None or meta.get("created_at", 0) > latest_created:
+                latest_key, latest_created = entry_dir.name, meta.get("created_at", 0)
+        return latest_key
+
+    def store(
+        self,
+        key: str,
+        index: Index,
+        meta: Optional[Dict[str, Any]] = None,
+        file_hashes: Optional[Dict[str, str]] = None,
+    ) -> Path:
+        """Persist a fitted index under key and evict old entries if needed"""
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry_dir = self._entry_dir(key)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=self.cache_dir))
+        try:
+            with open(tmp_dir / INDEX_FILE, "wb") as f_out:
+                pickle.dump(index, f_out, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f_out:
+                json.dump({**(meta or {}), "format": CACHE_FORMAT_VERSION, "key": key, "created_at": time.time()}, f_out)
+            if file_hashes is not None:
+                with open(tmp_dir / FILE_HASHES_FILE, "w", encoding="utf-8") as f_out:
+                    json.dump(file_hashes, f_out)
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            try:
+                os.replace(tmp_dir, entry_dir)
+            except OSError:
+                # A concurrent writer stored the same key in between, its
+                # entry was built from the same commit so it is kept
+                if not (entry_dir / INDEX_FILE).exists():
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.evict()
+        return entry_dir
+
+    def entries(self):
+        """List (last_access, size_bytes, path) for every complete entry"""
+
+        if not self.cache_dir.exists():
+            return []
+
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            index_path = entry_dir / INDEX_FILE
+            if entry_dir.name.startswith(".") or not index_path.exists():
+                continue
+            size = sum(p.stat().st_size for p in entry_dir.iterdir())
+            entries.append((index_path.stat().st_mtime, size, entry_dir))
+        return entries
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits its limits"""
+
+        entries = sorted(self.entries())
+        total_bytes = sum(size for _, size, _ in entries)
+
+        evicted = 0
+        while entries and (total_bytes > self.max_bytes or len(entries) > self.max_entries):
+            _, size, entry_dir = entries.pop(0)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_bytes -= size
+            evicted += 1
+        return evicted
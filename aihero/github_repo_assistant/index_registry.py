@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from config import INDEX_REGISTRY_CONFIG
+
+
+def registry_key(repo_owner: str, repo_name: str, chunking_params: Optional[Dict] = None) -> tuple:
+    """Registry key of a shared index: the repo plus the chunking params"""
+
+    return (repo_owner.lower(), repo_name.lower(), json.dumps(chunking_params, sort_keys=True))
+
+
+class IndexLease:
+    """
+    A reference to a shared index handed out by the IndexRegistry.
+
+    The lease is released explicitly with release(), or automatically when
+    it is garbage collected (e.g. when a Streamlit session goes away).
+    The value is shared between sessions and must be treated as read-only.
+    """
+
+    def __init__(self, registry: "IndexRegistry", key: Hashable, value: Any):
+        self.key = key
+        self.value = value
+        self._finalizer = weakref.finalize(self, registry._release, key)
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+    def release(self) -> None:
+        self._finalizer()
+
+
+class _Entry:
+    __slots__ = ("value", "refcount", "last_used")
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.refcount = 0
+        self.last_used = time.monotonic()
+
+
+class IndexRegistry:
+    """
+    Process-wide registry of fitted indexes shared across sessions.
+
+    Concurrent acquire() calls for the same key are single-flighted: the
+    first caller runs the build function, the others wait for its result.
+    Entries are reference counted and dropped once nobody holds a lease
+    and they have been idle for longer than idle_ttl seconds.
+    """
+
+    def __init__(self, idle_ttl: float = INDEX_REGISTRY_CONFIG.idle_ttl_seconds):
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._building: Dict[Hashable, Future] = {}
+
+    def acquire(self, key: Hashable, build: Callable[[], Any]) -> IndexLease:
+        """Lease the value for key, building it once if it is not loaded yet"""
+
+        self.evict_idle()
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refcount += 1
+                    entry.last_used = time.monotonic()
+                    return IndexLease(self, key, entry.value)
+
+                future = self._building.get(key)
+                is_builder = future is None
+                if is_builder:
+                    future = Future()
+                    self._building[key] = future
+
+            if not is_builder:
+                # Raises the builder's exception, so every waiter sees the failure
+                future.result()
+                continue
+
+            try:
+                value = build()
+            except BaseException as e:
+                with self._lock:
+                    del self._building[key]
+                future.set_exception(e)
+                raise
+
+            with self._lock:
+                entry = self._entries[key] = _Entry(value)
+                entry.refcount += 1
+                del self._building[key]
+            future.set_result(value)
+            return IndexLease(self, key, value)
+
+    def _release(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refcount = max(entry.refcount - 1, 0)
+                entry.last_used = time.monotonic()
+
+    def evict_idle(self) -> int:
+        """Drop unreferenced entries that have been idle longer than idle_ttl"""
+
+        now = time.monotonic()
+        with self._lock:
+            idle_keys = [
+                key for key, entry in self._entries.items()
+                if entry.refcount == 0 and now - entry.last_used >= self.idle_ttl
+            ]
+            for key in idle_keys:
+                del self._entries[key]
+        return len(idle_keys)
+
+    def stats(self) -> Dict[Hashable, int]:
+        """Reference count of every loaded entry"""
+
+        with self._lock:
+            return {key: entry.refcount for key, entry in self._entries.items()}
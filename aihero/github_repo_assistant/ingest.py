@@ -1,109 +1,511 @@
-import io
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
 import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-import frontmatter
 import requests
 from minsearch import Index
 from tqdm.auto import tqdm
-from typing_extensions import Dict, List
+from typing_extensions import Dict, Iterator, List, Optional, Tuple
 
+from chunk_store import ChunkStore, ChunkView
+from config import INGEST_CONFIG
+from index_cache import cache_key
+from markdown_parser import parse_markdown, parse_markdown_batch
 
-def read_repo_data(repo_owner, repo_name):
-    """Function to read repo data from markdown files"""
-    
-    base_url = "https://codeload.github.com"
-    default_branch = "main"
-    repo_url = f"{base_url}/{repo_owner}/{repo_name}/zip/refs/heads/{default_branch}"
-    
-    resp = requests.get(repo_url)
-    
-    # Retry with 'master' if 'main' is not found
-    if resp.status_code == 404:
-        default_branch = "master"
-        repo_url = f"{base_url}/{repo_owner}/{repo_name}/zip/refs/heads/{default_branch}"
-        resp = requests.get(repo_url)
-
-    if resp.status_code != 200:
-        raise Exception(f"Failed to download repository: {resp.status_code} (checked 'main' and 'master' branches)")
-
-    repository_data = []
-    with zipfile.ZipFile(io.BytesIO(initial_bytes=resp.content)) as zf:
-        for file_info in zf.infolist():
-            filename = file_info.filename.lower()
-            if not filename.endswith((".md", ".mdx")):
+BASE_URL = "https://codeload.github.com"
+GITHUB_API_URL = "https://api.github.com"
+DEFAULT_BRANCHES = ("main", "master")
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Rough token estimate used by the markdown chunker
+CHARS_PER_TOKEN = 4
+HEADER_PATTERN = re.compile(r'#{1,6}\s')
+
+_PARSE_POOLS = {}
+_PARSE_POOLS_LOCK = threading.Lock()
+
+
+def resolve_commit_sha(repo_owner, repo_name, branches=DEFAULT_BRANCHES):
+    """Function to look up the head commit of the repo branch,
+    returns (branch, sha) or None if it cannot be resolved"""
+
+    headers = {"Accept": "application/vnd.github.sha"}
+    if os.getenv("GITHUB_TOKEN"):
+        headers["Authorization"] = f"Bearer {os.environ['GITHUB_TOKEN']}"
+
+    for branch in branches:
+        url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/commits/{branch}"
+        try:
+            resp = requests.get(url, headers=headers, timeout=10)
+        except requests.RequestException as e:
+            print(f"Could not resolve commit for {repo_owner}/{repo_name}: {e}")
+            return None
+        if resp.status_code in (404, 422):
+            continue
+        if resp.status_code != 200:
+            print(f"Could not resolve commit for {repo_owner}/{repo_name}: {resp.status_code}")
+            return None
+        return branch, resp.text.strip()
+
+    return None
+
+
+def download_repo_archive(repo_owner, repo_name, f_out, branches=DEFAULT_BRANCHES, commit_sha=None) -> str:
+    """Function to stream the repo zip archive into a file object
+    in fixed size chunks, returns the branch or commit that was downloaded.
+
+    With a commit_sha that exact commit is downloaded, so the content
+    matches a cache key built from it even if the branch moved since."""
+
+    refs = [commit_sha] if commit_sha else [f"refs/heads/{branch}" for branch in branches]
+    status_code = None
+    for ref in refs:
+        repo_url = f"{BASE_URL}/{repo_owner}/{repo_name}/zip/{ref}"
+        with requests.get(repo_url, stream=True) as resp:
+            status_code = resp.status_code
+            # Retry with the next branch if this one is not found
+            if status_code == 404:
                 continue
-            try:
-                with zf.open(file_info) as f_in:
-                    content_bytes = f_in.read()
-                    try:
-                        content = content_bytes.decode('utf-8')
-                    except UnicodeDecodeError:
-                         # Fallback or skip
-                         print(f"Skipping binary/non-utf8 file: {filename}")
-                         continue
-                         
-                    post = frontmatter.loads(content)
-                    data = post.to_dict()
-                    _, filename_repo = file_info.filename.split('/', maxsplit=1)
-                    data['filename'] = filename_repo
-                    repository_data.append(data)
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
+            if status_code != 200:
+                break
+            for block in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f_out.write(block)
+            return commit_sha or ref.removeprefix("refs/heads/")
+
+    if commit_sha:
+        raise Exception(f"Failed to download repository: {status_code} (checked commit {commit_sha})")
+    raise Exception(f"Failed to download repository: {status_code} (checked 'main' and 'master' branches)")
+
+
+def parse_markdown_file(filename, content_bytes):
+    """Function to decode a markdown file and parse its frontmatter,
+    returns None if the file is skipped"""
+
+    data, error = parse_markdown(filename, content_bytes)
+    if error is not None:
+        print(error)
+    return data
+
+
+def _iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_markdown_files(files, workers=None, batch_size=INGEST_CONFIG.parse_batch_size) -> Iterator[Dict]:
+    """Generator to parse (filename, bytes) pairs into docs.
+
+    With workers > 1 the decoding and YAML parsing is fanned out to a
+    process pool in batches. Batches are submitted ahead only up to a small
+    window and collected in submission order, so the output order and the
+    skip/error messages are the same as the serial path."""
+
+    if not workers or workers <= 1:
+        for filename, content_bytes in files:
+            data = parse_markdown_file(filename, content_bytes)
+            if data is not None:
+                yield data
+        return
+
+    executor = _get_parse_pool(workers)
+    pending = deque()
+    try:
+        for batch in _iter_batches(files, batch_size):
+            pending.append(executor.submit(parse_markdown_batch, batch))
+            if len(pending) < workers * 2:
                 continue
-        return repository_data
+            yield from _collect_batch(pending.popleft())
+        while pending:
+            yield from _collect_batch(pending.popleft())
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory), the next ingest gets a new pool
+        _discard_parse_pool(workers, executor)
+        raise
 
-def sliding_window(seq, size: int, step: int) -> List[Dict]:
-    """Function to create chunks from large docs
-    and keep overlapping data"""
+
+def _get_parse_pool(workers) -> ProcessPoolExecutor:
+    """Process pools are kept for the lifetime of the process, so the
+    worker start up cost is only paid by the first ingest"""
+
+    with _PARSE_POOLS_LOCK:
+        executor = _PARSE_POOLS.get(workers)
+        if executor is None:
+            # Avoid fork(): the Streamlit server is multi-threaded
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method),
+            )
+            _PARSE_POOLS[workers] = executor
+        return executor
+
+
+def _discard_parse_pool(workers, executor):
+    with _PARSE_POOLS_LOCK:
+        if _PARSE_POOLS.get(workers) is executor:
+            del _PARSE_POOLS[workers]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _collect_batch(future):
+    for data, error in future.result():
+        if error is not None:
+            print(error)
+        if data is not None:
+            yield data
+
+
+def iter_repo_files(repo_owner, repo_name, branches=DEFAULT_BRANCHES, commit_sha=None) -> Iterator[Tuple[str, bytes]]:
+    """Generator to stream (filename, raw bytes) of the markdown files in a repo.
+
+    The archive is spooled to a temporary file on disk and read back
+    one member at a time, so only a single file is held in memory."""
+
+    with tempfile.TemporaryFile() as f_archive:
+        download_repo_archive(repo_owner, repo_name, f_archive, branches=branches, commit_sha=commit_sha)
+        f_archive.seek(0)
+
+        with zipfile.ZipFile(f_archive) as zf:
+            for file_info in zf.infolist():
+                filename = file_info.filename.lower()
+                if not filename.endswith((".md", ".mdx")):
+                    continue
+                try:
+                    with zf.open(file_info) as f_in:
+                        content_bytes = f_in.read()
+                    _, filename_repo = file_info.filename.split('/', maxsplit=1)
+                except Exception as e:
+                    print(f"Error processing {filename}: {e}")
+                    continue
+                yield filename_repo, content_bytes
+
+
+def iter_repo_data(repo_owner, repo_name, branches=DEFAULT_BRANCHES, workers=None) -> Iterator[Dict]:
+    """Generator to stream parsed repo data from markdown files"""
+
+    files = iter_repo_files(repo_owner, repo_name, branches=branches)
+    yield from parse_markdown_files(files, workers=workers)
+
+
+def read_repo_data(repo_owner, repo_name, branches=DEFAULT_BRANCHES, workers=None) -> List[Dict]:
+    """Function to read repo data from markdown files"""
+
+    return list(iter_repo_data(repo_owner, repo_name, branches=branches, workers=workers))
+
+def sliding_window_offsets(n: int, size: int, step: int) -> Iterator[Tuple[int, int]]:
+    """Generator of (start, end) offsets of overlapping windows
+    over a sequence of length n"""
 
     if size <= 0 or step <= 0:
         raise ValueError("size and step must be positive")
     if size <= step:
         raise ValueError("size must be greater than step")
-    n = len(seq)
-    chunks = []
     for i in range(0, n, step):
-        chunk = seq[i: i+size]
-        chunks.append({'start': i, 'content': chunk})
+        yield i, min(i + size, n)
         if i + size >= n:
             break
-    return chunks
 
 
-def create_chunks(repo_data, size:int = 2000, step: int=1000):
+def sliding_window(seq, size: int, step: int) -> List[Dict]:
+    """Function to create chunks from large docs
+    and keep overlapping data"""
 
-    repo_chunks = []
-    for doc in tqdm(repo_data):
-        doc_copy = doc.copy()
-        doc_content = doc_copy.pop('content')
+    return [
+        {'start': start, 'content': seq[start:end]}
+        for start, end in sliding_window_offsets(len(seq), size, step)
+    ]
 
-        chunks = sliding_window(
-            seq=doc_content,
-            size=size,
-            step=step
-        )
 
-        for chunk in chunks:
-            chunk.update(doc_copy)
-        repo_chunks.extend(chunks)
+def _markdown_blocks(text) -> Iterator[Tuple[int, int, str]]:
+    """Single pass over the lines of a markdown document, yields
+    (start, end, kind) of headers, paragraphs and fenced code blocks"""
+
+    n = len(text)
+    pos = 0
+    block_start = None
+    fence = None
+    while pos < n:
+        newline = text.find('\n', pos)
+        line_end = n if newline == -1 else newline + 1
+        stripped = text[pos:line_end].strip()
+
+        if fence is not None:
+            if stripped.startswith(fence):
+                yield block_start, line_end, 'code'
+                block_start, fence = None, None
+        elif stripped.startswith(('```', '~~~')):
+            if block_start is not None:
+                yield block_start, pos, 'text'
+            block_start, fence = pos, stripped[:3]
+        elif HEADER_PATTERN.match(stripped):
+            if block_start is not None:
+                yield block_start, pos, 'text'
+                block_start = None
+            yield pos, line_end, 'header'
+        elif not stripped:
+            if block_start is not None:
+                yield block_start, pos, 'text'
+                block_start = None
+        elif block_start is None:
+            block_start = pos
+        pos = line_end
+
+    if block_start is not None:
+        yield block_start, n, 'code' if fence is not None else 'text'
+
+
+def _split_oversized(text, start, end, max_chars, body_start=None) -> Iterator[Tuple[int, int]]:
+    """Split a block larger than the budget on line, then word boundaries.
+    The first piece is never cut before body_start (e.g. after a header)"""
+
+    min_cut = start if body_start is None else body_start
+    while end - start > max_chars:
+        cut = text.rfind('\n', min_cut, start + max_chars)
+        if cut <= min_cut:
+            cut = text.rfind(' ', min_cut, start + max_chars)
+        if cut <= min_cut:
+            cut = start + max_chars - 1
+        yield start, cut + 1
+        start = min_cut = cut + 1
+    if start < end:
+        yield start, end
+
+
+def markdown_chunk_offsets(text, max_tokens: int = 500, min_tokens: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """Generator of (start, end) offsets of markdown aware chunks.
+
+    Paragraphs, headers and fenced code blocks are packed greedily into
+    chunks of at most max_tokens (estimated as CHARS_PER_TOKEN characters
+    per token). A header starts a new chunk once the current one holds at
+    least min_tokens, and headers are never left dangling at the end of a
+    chunk. Only blocks larger than the budget on their own are split."""
+
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    min_chars = (max_tokens // 2 if min_tokens is None else min_tokens) * CHARS_PER_TOKEN
+
+    chunk_start = chunk_end = None
+    # Start of the run of headers at the tail of the current chunk
+    header_start = header_prev_end = None
+
+    for start, end, kind in _markdown_blocks(text):
+        if end - start > max_chars:
+            split_start = start
+            if chunk_start is not None:
+                if header_start is None:
+                    yield chunk_start, chunk_end
+                else:
+                    # Keep the headers with the first piece of the block
+                    if header_start > chunk_start:
+                        yield chunk_start, header_prev_end
+                    split_start = header_start
+            yield from _split_oversized(text, split_start, end, max_chars, body_start=start)
+            chunk_start = header_start = None
+            continue
+
+        if chunk_start is not None:
+            if kind == 'header' and header_start is None and chunk_end - chunk_start >= min_chars:
+                yield chunk_start, chunk_end
+                chunk_start = None
+            elif end - chunk_start > max_chars:
+                if header_start is not None and header_start > chunk_start:
+                    # Carry the trailing headers over to the next chunk
+                    yield chunk_start, header_prev_end
+                    chunk_start = header_start
+                    if end - chunk_start > max_chars:
+                        yield chunk_start, chunk_end
+                        chunk_start = None
+                else:
+                    yield chunk_start, chunk_end
+                    chunk_start = None
+
+        if chunk_start is None:
+            chunk_start = start
+            header_start = None
+        if kind == 'header':
+            if header_start is None:
+                header_start, header_prev_end = start, chunk_end
+        else:
+            header_start = None
+        chunk_end = end
+
+    if chunk_start is not None:
+        yield chunk_start, chunk_end
+
+
+def chunk_offsets(content, method: str = 'sliding_window', size: int = 2000, step: int = 1000, max_tokens: int = 500):
+    """Function to pick the chunker used to split a document"""
+
+    if method == 'sliding_window':
+        return sliding_window_offsets(len(content), size=size, step=step)
+    if method == 'markdown':
+        return markdown_chunk_offsets(content, max_tokens=max_tokens)
+    raise ValueError(f"Unknown chunking method: {method}")
+
+
+def chunk_document(store: ChunkStore, doc, **chunking_params) -> int:
+    """Function to add a single document to the chunk store,
+    chunks are recorded as offsets into the document text"""
+
+    return store.add_document(doc, chunk_offsets(doc['content'], **chunking_params))
+
+
+def create_chunks(repo_data, size:int = 2000, step: int=1000, method: str = 'sliding_window', max_tokens: int = 500) -> ChunkStore:
+
+    repo_chunks = ChunkStore()
+    for doc in tqdm(repo_data):
+        chunk_document(repo_chunks, doc, method=method, size=size, step=step, max_tokens=max_tokens)
 
     return repo_chunks
 
+
+def hash_content(content_bytes: bytes) -> str:
+    return hashlib.sha256(content_bytes).hexdigest()
+
+
+def update_chunks(files, previous_docs, previous_hashes, chunk=True, chunking_params=None, workers=None):
+    """Function to rebuild the indexed docs from (filename, bytes) pairs.
+
+    Files whose content hash matches previous_hashes reuse their docs from
+    previous_docs as is, only new or modified files are parsed and chunked.
+    Returns the docs, the per-file hashes and counts of what changed."""
+
+    previous_by_file = defaultdict(list)
+    for doc in previous_docs:
+        previous_by_file[doc['filename']].append(doc)
+
+    docs = ChunkStore() if chunk else []
+    file_hashes = {}
+    stats = {'unchanged': 0, 'changed': 0, 'deleted': 0}
+
+    def changed_files():
+        for filename, content_bytes in tqdm(files):
+            digest = hash_content(content_bytes)
+            file_hashes[filename] = digest
+
+            if previous_hashes.get(filename) == digest:
+                if chunk:
+                    docs.add_chunks(previous_by_file.get(filename, []))
+                else:
+                    docs.extend(previous_by_file.get(filename, []))
+                stats['unchanged'] += 1
+                continue
+
+            stats['changed'] += 1
+            yield filename, content_bytes
+
+    for data in parse_markdown_files(changed_files(), workers=workers):
+        if chunk:
+            chunk_document(docs, data, **chunking_params)
+        else:
+            docs.append(data)
+
+    stats['deleted'] = len(previous_hashes.keys() - file_hashes.keys())
+    return docs, file_hashes, stats
+
+
 def index_data(
         repo_owner,
         repo_name,
         chunk=True,
         chunking_params=None,
+        streaming=False,
+        cache=None,
+        incremental=True,
+        parse_workers=INGEST_CONFIG.parse_workers,
     ):
-    """Function to index the data and add to minseach"""
+    """Function to index the data and add to minseach.
+
+    With streaming=True the markdown files are parsed lazily from the
+    spooled archive and fed straight into chunking, instead of first
+    materialising the full list of raw documents.
+
+    When an IndexCache is passed, the head commit of the repo is resolved
+    first and a previously fitted index for the same commit and chunking
+    params is loaded from disk instead of being rebuilt. On a miss with
+    incremental=True, the most recent cached build of the same repo is used
+    as a base: only markdown files whose content hash changed are parsed
+    and chunked again, and an unchanged file set reuses the base index.
 
+    parse_workers > 1 parses the markdown files in a process pool."""
 
-    docs = read_repo_data(repo_owner, repo_name)
+    if chunk and chunking_params is None:
+        chunking_params = dict(INGEST_CONFIG.chunking_params)
 
-    if chunk:
-        if chunking_params is None:
-            chunking_params = {'size': 2000, 'step': 1000}
-        docs = create_chunks(docs, **chunking_params)
+    branches = DEFAULT_BRANCHES
+    key = None
+    if cache is not None:
+        resolved = resolve_commit_sha(repo_owner, repo_name)
+        if resolved is not None:
+            branch, commit_sha = resolved
+            branches = (branch,)
+            key = cache_key(
+                repo_owner=repo_owner,
+                repo_name=repo_name,
+                branch=branch,
+                commit_sha=commit_sha,
+                chunking_params=chunking_params if chunk else None,
+            )
+            cached_index = cache.load(key)
+            if cached_index is not None:
+                print(f"Loaded cached index for {repo_owner}/{repo_name}@{commit_sha[:7]}")
+                return cached_index
+
+    file_hashes = None
+    if key is not None:
+        meta = {
+            "repo_owner": repo_owner,
+            "repo_name": repo_name,
+            "branch": branch,
+            "commit_sha": commit_sha,
+            "chunking_params": chunking_params if chunk else None,
+        }
+
+        base_index, base_hashes = None, {}
+        if incremental:
+            base_key = cache.find_latest(**{k: v for k, v in meta.items() if k != "commit_sha"})
+            if base_key is not None:
+                base_index = cache.load(base_key)
+                base_hashes = cache.load_file_hashes(base_key) or {}
+
+        docs, file_hashes, stats = update_chunks(
+            files=iter_repo_files(repo_owner, repo_name, branches=branches, commit_sha=commit_sha),
+            previous_docs=base_index.docs if base_index is not None else [],
+            previous_hashes=base_hashes,
+            chunk=chunk,
+            chunking_params=chunking_params,
+            workers=parse_workers,
+        )
+        print(
+            f"Refreshed {repo_owner}/{repo_name}@{commit_sha[:7]}: "
+            f"{stats['changed']} changed, {stats['unchanged']} unchanged, {stats['deleted']} deleted files"
+        )
+
+        if base_index is not None and not stats['changed'] and not stats['deleted']:
+            cache.store(key, base_index, meta=meta, file_hashes=file_hashes)
+            return base_index
+    else:
+        if streaming:
+            docs = iter_repo_data(repo_owner, repo_name, branches=branches, workers=parse_workers)
+        else:
+            docs = read_repo_data(repo_owner, repo_name, branches=branches, workers=parse_workers)
+
+        if chunk:
+            docs = create_chunks(docs, **chunking_params)
 
     index = Index(
         text_fields=["content", "filename"],
@@ -113,8 +515,9 @@ def index_data(
     valid_docs = []
     for doc in docs:
         try:
-            # Force conversion to dict to avoid custom object weirdness
-            clean_doc = dict(doc)
+            # Force conversion to dict to avoid custom object weirdness,
+            # chunk views stay lazy so their content is not copied
+            clean_doc = doc if isinstance(doc, ChunkView) else dict(doc)
             if clean_doc.get('filename') and clean_doc.get('content'):
                 valid_docs.append(clean_doc)
             else:
@@ -137,5 +540,8 @@ def index_data(
         if len(docs) > 0:
             print(f"First doc keys: {docs[0].keys()}")
         raise e
-        
+
+    if key is not None:
+        cache.store(key, index, meta=meta, file_hashes=file_hashes)
+
     return index
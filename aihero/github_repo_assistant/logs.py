@@ -1,18 +1,39 @@
+import atexit
+import gzip
 import json
 import os
+import queue
 import secrets
+import threading
+import time
+import zlib
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from config import LOG_CONFIG, LogConfig
 
 LOG_DIR = Path(os.getenv('LOGS_DIRECTORY', 'logs'))
-LOG_DIR.mkdir(exist_ok=True)
+SEGMENT_SUFFIX = '.jsonl.gz'
+# Segment name prefixes, one background writer per kind of log
+INTERACTIONS_PREFIX = 'interactions'
+SEARCH_PAYLOADS_PREFIX = 'search_payloads'
+
+_created_dirs = set()
+
+
+def _ensure_dir(directory: Path):
+    """Create a log directory on first use instead of at import time"""
+    if directory not in _created_dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(directory)
 
 
 def log_entry(agent, messages, source: str="user"):
     tools = []
     for ts in agent.toolsets:
         tools.extend(ts.tools.keys())
-    
+
     messages = json.loads(messages)
 
     return {
@@ -30,23 +51,262 @@ def serializer(obj):
         return obj.isoformat()
     raise TypeError(f"Type {type(obj)} not serializable")
 
-def log_interaction(agent, messages, source: str="user"):
+def log_filename(entry: Dict[str, Any]) -> str:
+    """Per-file layout name: agent name, time of the last message and a random suffix"""
 
-    entry = log_entry(
-        agent=agent,
-        messages=messages,
-        source=source
-    )
-
-    ts = entry["messages"][-1]['timestamp']
-    ts_obj = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    try:
+        ts = entry["messages"][-1]['timestamp']
+        ts_obj = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except (KeyError, IndexError, TypeError, AttributeError):
+        ts_obj = datetime.now()
     ts_str = ts_obj.strftime("%Y%m%d_%H%M%S")
     rand_hex = secrets.token_hex(nbytes=3)
 
-    filename = f"{agent.name}_{ts_str}_{rand_hex}.json"
-    filepath = LOG_DIR / filename
+    return f"{entry.get('agent_name', 'agent')}_{ts_str}_{rand_hex}.json"
+
+
+class LogWriter:
+    """
+    Background writer of interaction logs.
+
+    write() only puts the entry on a bounded queue, a daemon thread builds
+    and serializes the entries and writes them in batches (up to batch_size
+    entries or flush_interval_seconds). With the 'segments' layout every
+    batch is appended to the current segment as one gzip member, so a
+    segment stays readable while it is written and after a crash; segments
+    are rotated by size and age. The 'files' layout writes one JSON file
+    per entry like before. Segment names start with prefix, so writers of
+    different logs can share a directory.
+    """
+
+    def __init__(self, directory: Path = LOG_DIR, config: LogConfig = LOG_CONFIG, prefix: str = INTERACTIONS_PREFIX):
+        if config.layout not in ('segments', 'files'):
+            raise ValueError(f"Unknown log layout: {config.layout}")
+        if config.fsync not in ('batch', 'interval', 'never'):
+            raise ValueError(f"Unknown fsync policy: {config.fsync}")
+        self.directory = Path(directory)
+        self.config = config
+        self.prefix = prefix
+        self.written = 0
+        self.dropped = 0
+        self.segment_path: Optional[Path] = None
+        self._segment = None
+        self._segment_started = 0.0
+        self._segment_bytes = 0
+        self._fsync_pending = False
+        self._last_fsync = 0.0
+        self._queue = queue.Queue(maxsize=config.max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, entry) -> bool:
+        """
+        Queue an entry, a dict or a callable returning one (called on the
+        writer thread). Returns False when the queue is full and the entry
+        is dropped.
+        """
+        self._start()
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until everything queued so far is written. Returns False if
+        that did not happen within timeout.
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            print(f"Logging error: queue still full after {timeout}s, not flushed")
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write what is queued, close the segment and stop the thread.
+        Returns False if the writer did not stop within timeout.
+        """
+        if self._thread is None:
+            return True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print(f"Logging error: queue still full after {timeout}s, {self._queue.qsize()} entries not written")
+            return False
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        self._thread = None
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                # Idle with an fsync due: do it instead of waiting for more entries
+                timeout = self.config.fsync_interval_seconds if self._fsync_pending else None
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._fsync()
+                continue
+
+            batch, flushed, stop = [], [], False
+            deadline = time.monotonic() + self.config.flush_interval_seconds
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    flushed.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.config.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+                if stop:
+                    self._close_segment()
+            except Exception as e:
+                print(f"Logging error: {e}")
+            for event in flushed:
+                event.set()
+            if stop:
+                return
+
+    def _build(self, item) -> Optional[Dict[str, Any]]:
+        try:
+            return item() if callable(item) else item
+        except Exception as e:
+            print(f"Logging error: {e}")
+            return None
+
+    def _write_batch(self, batch):
+        entries = [entry for entry in map(self._build, batch) if entry is not None]
+        if not entries:
+            return
+        _ensure_dir(self.directory)
+
+        if self.config.layout == 'files':
+            for entry in entries:
+                with open(self.directory / log_filename(entry), mode='w', encoding='utf-8') as f_out:
+                    json.dump(obj=entry, fp=f_out, default=serializer)
+                    if self.config.fsync == 'batch':
+                        f_out.flush()
+                        os.fsync(f_out.fileno())
+            self.written += len(entries)
+            return
+
+        lines = "".join(json.dumps(entry, default=serializer) + "\n" for entry in entries)
+        member = gzip.compress(lines.encode('utf-8'))
+        segment = self._open_segment()
+        segment.write(member)
+        segment.flush()
+        self._segment_bytes += len(member)
+        self.written += len(entries)
+
+        self._fsync_pending = self.config.fsync != 'never'
+        if self.config.fsync == 'batch' or (
+            self.config.fsync == 'interval'
+            and time.monotonic() - self._last_fsync >= self.config.fsync_interval_seconds
+        ):
+            self._fsync()
+
+    def _open_segment(self):
+        if self._segment is not None and (
+            self._segment_bytes >= self.config.segment_max_bytes
+            or time.monotonic() - self._segment_started >= self.config.segment_max_seconds
+        ):
+            self._close_segment()
+        if self._segment is None:
+            name = f"{self.prefix}_{datetime.now():%Y%m%d_%H%M%S}_{secrets.token_hex(nbytes=3)}{SEGMENT_SUFFIX}"
+            self.segment_path = self.directory / name
+            self._segment = open(self.segment_path, mode='ab')
+            self._segment_started = time.monotonic()
+            self._segment_bytes = 0
+        return self._segment
+
+    def _fsync(self):
+        if self._segment is not None and self.config.fsync != 'never':
+            os.fsync(self._segment.fileno())
+        self._fsync_pending = False
+        self._last_fsync = time.monotonic()
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+        self._fsync()
+        self._segment.close()
+        self._segment = None
+
+
+_writers: Dict[str, LogWriter] = {}
+_writer_lock = threading.Lock()
+
+
+def get_log_writer(prefix: str = INTERACTIONS_PREFIX) -> LogWriter:
+    """The process-wide writer of the log named prefix, closed at exit"""
+    with _writer_lock:
+        writer = _writers.get(prefix)
+        if writer is None:
+            config = LOG_CONFIG
+            if prefix != INTERACTIONS_PREFIX:
+                # Only interactions have a one file per entry layout
+                config = LOG_CONFIG.model_copy(update={'layout': 'segments'})
+            writer = _writers[prefix] = LogWriter(config=config, prefix=prefix)
+            atexit.register(writer.close, 5.0)
+    return writer
+
+def log_interaction(agent, messages, source: str="user") -> bool:
+    """
+    Queue an interaction for the background log writer. The entry is built
+    and written off the request path; returns False if it was dropped.
+    """
+
+    return get_log_writer().write(lambda: log_entry(agent=agent, messages=messages, source=source))
+
+def read_segment(path: Path) -> Iterator[Dict[str, Any]]:
+    """Entries of a log segment, read up to the cut of an incompletely written last batch"""
+
+    with gzip.open(path, mode='rt', encoding='utf-8') as f_in:
+        try:
+            for line in f_in:
+                if not line.endswith("\n"):
+                    return
+                yield json.loads(line)
+        except (EOFError, zlib.error, gzip.BadGzipFile):
+            return
+
+def iter_segment_records(directory: Path, prefix: str = INTERACTIONS_PREFIX) -> Iterator[Dict[str, Any]]:
+    """Entries of every segment of the log named prefix in directory, log_file set to 'segment:line'"""
+
+    for path in sorted(Path(directory).glob(f'{prefix}_*{SEGMENT_SUFFIX}')):
+        for i, record in enumerate(read_segment(path)):
+            record['log_file'] = f"{path.name}:{i}"
+            yield record
 
-    with open(filepath, mode='w', encoding='utf-8') as f_out:
-        json.dump(obj=entry, fp=f_out, default=serializer)
+def log_search_payload(stats: dict) -> bool:
+    """
+    Queue the size of one search tool payload, to tune SearchResultConfig.
+    Written to search_payloads_*.jsonl.gz segments by a background writer,
+    so the tool call does no file I/O; returns False if it was dropped.
+    """
 
-    return filepath
+    entry = {"timestamp": datetime.now().isoformat(), **stats}
+    return get_log_writer(SEARCH_PAYLOADS_PREFIX).write(entry)
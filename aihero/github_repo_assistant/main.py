@@ -1,11 +1,17 @@
-import asyncio
 import os
+import queue
 
 import streamlit as st
 
+from answer_cache import AnswerCache, cached_messages, index_version
+from config import ANSWER_CACHE_CONFIG
+from event_loop import BackgroundEventLoop
+from history_manager import HistoryManager
+from index_cache import IndexCache
+from index_registry import IndexRegistry, registry_key
 from ingest import index_data
 from logs import log_interaction
-from search_agent import init_agent
+from search_agent import init_agent, stream_response
 
 # 1. Page Configuration
 st.set_page_config(
@@ -108,14 +114,40 @@ if "agent" not in st.session_state:
     st.session_state.agent = None
 if "index" not in st.session_state:
     st.session_state.index = None
+if "index_lease" not in st.session_state:
+    st.session_state.index_lease = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "repo_info" not in st.session_state:
     st.session_state.repo_info = {"owner": "", "name": ""}
 if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []
+if "history_manager" not in st.session_state:
+    st.session_state.history_manager = HistoryManager()
+if "index_version" not in st.session_state:
+    st.session_state.index_version = None
 
 # 4. Agent Initialization Helper
+@st.cache_resource
+def get_index_cache() -> IndexCache:
+    """On-disk index cache shared by every session in this process."""
+    return IndexCache()
+
+@st.cache_resource
+def get_index_registry() -> IndexRegistry:
+    """Fitted indexes shared (read-only) by every session in this process."""
+    return IndexRegistry()
+
+@st.cache_resource
+def get_agent_loop() -> BackgroundEventLoop:
+    """Event loop running every agent call, kept alive so provider connections are reused."""
+    return BackgroundEventLoop().start()
+
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """Answers to repeated questions, shared by every session in this process."""
+    return AnswerCache()
+
 def load_and_index_repo(owner: str, name: str):
     """Indexes the repo and initializes the agent."""
     try:
@@ -127,22 +159,36 @@ def load_and_index_repo(owner: str, name: str):
                 st.success(f"✅ Repository {owner}/{name} is ready!")
                 return st.session_state.agent
 
-            # 1. Indexing
+            # 1. Indexing (shared across sessions, built once per repo)
             try:
-                index = index_data(repo_owner=owner, repo_name=name)
+                lease = get_index_registry().acquire(
+                    key=registry_key(owner, name),
+                    build=lambda: index_data(
+                        repo_owner=owner,
+                        repo_name=name,
+                        streaming=True,
+                        cache=get_index_cache(),
+                    ),
+                )
             except Exception as e:
                 st.error(f"❌ Indexing Failed: {type(e).__name__}: {e}")
                 return None
+            index = lease.value
 
             # 2. Agent Initialization
             try:
                 agent = init_agent(index=index, repo_owner=owner, repo_name=name)
             except Exception as e:
+                lease.release()
                 st.error(f"❌ Agent Initialization Failed: {type(e).__name__}: {e}")
                 return None
             
             # Update Session State
+            if st.session_state.index_lease is not None:
+                st.session_state.index_lease.release()
+            st.session_state.index_lease = lease
             st.session_state.index = index
+            st.session_state.index_version = index_version(index)
             st.session_state.agent = agent
             st.session_state.repo_info = {"owner": owner, "name": name}
             st.session_state.messages = [] # Clear history on new repo
@@ -168,6 +214,12 @@ with st.sidebar:
     if api_key:
         os.environ["OPENAI_API_KEY"] = api_key
 
+    st.subheader("Answer Cache")
+    use_answer_cache = st.toggle("Reuse answers to similar questions", value=ANSWER_CACHE_CONFIG.enabled)
+    cache_stats = get_answer_cache().stats()
+    st.caption(f"{cache_stats['hits']} hits, {cache_stats['misses']} misses "
+               f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['size']} answers cached")
+
     st.write("") # Spacer
     if st.button("Initialize Agent", type="primary", use_container_width=True):
         if not input_owner or not input_name:
@@ -210,58 +262,92 @@ else:
 
         # Generate Response
         with st.chat_message("assistant"):
+            status = st.status("Thinking...", expanded=False)
             message_placeholder = st.empty()
-            
+            streamed = {"text": "", "tool_calls": 0}
+
+            def show_text(text):
+                # Answer tokens follow the tool calls, close the progress box
+                if not streamed["text"]:
+                    label = f"Searched the repository ({streamed['tool_calls']} calls)" if streamed["tool_calls"] else "Answering"
+                    status.update(label=label, state="complete")
+                streamed["text"] = text
+                message_placeholder.markdown(text + "▌")
+
+            def show_tool_call(description):
+                # Text before a tool call was a preamble, the answer closes the box again
+                streamed["text"] = ""
+                streamed["tool_calls"] += 1
+                status.update(label=f"Searching: {description}", state="running")
+                status.write(f"🔍 `{description}`")
+
             try:
-                # Helper to run async pydantic-ai agent
-                async def get_response(user_prompt, history):
-                    result = await st.session_state.agent.run(
-                        user_prompt,
-                        message_history=history
-                    )
-                    return result
+                # Keep the resent history within budget, old search results go first
+                history, history_stats = st.session_state.history_manager.compact(
+                    st.session_state.conversation_history
+                )
+                st.session_state.conversation_history = history
+                if history_stats["tokens_saved"]:
+                    print(f"History compacted: {history_stats}, "
+                          f"{st.session_state.history_manager.tokens_saved} tokens saved this session")
 
-                with st.spinner("Thinking..."):
-                    # Robust async handling for Streamlit
-                    try:
-                        loop = asyncio.get_running_loop()
-                    except RuntimeError:
-                        loop = None
-                    
-                    if loop and loop.is_running():
-                        # This should not happen in standard Streamlit script execution, 
-                        # but if it does, we can't use run_until_complete.
-                        # We would need to use a future or nest_asyncio.
-                        # For now, let's assume we can schedule and wait (which is hard in sync).
-                        # We will try to rely on the fact that we are likely not in a running loop.
-                        # But if we are, we try to wait on the task?
-                        # Actually standard streamlit runs in a thread.
-                        future = asyncio.run_coroutine_threadsafe(
-                            get_response(prompt, st.session_state.conversation_history),
-                            loop
-                        )
-                        result = future.result()
-                    else:
-                        # No running loop, safe to use asyncio.run
-                        result = asyncio.run(get_response(prompt, st.session_state.conversation_history))
-                
-                response_text = result.output
-                
-                # Update conversation history with new messages from the agent run
-                st.session_state.conversation_history.extend(result.new_messages())
+                # Near-identical first questions about the same index get the cached answer
+                answer_cache = get_answer_cache()
+                cacheable = not ANSWER_CACHE_CONFIG.first_turn_only or not st.session_state.conversation_history
+                cache_args = (
+                    registry_key(st.session_state.repo_info["owner"], st.session_state.repo_info["name"]),
+                    st.session_state.index_version,
+                    st.session_state.index,
+                )
+                cached_answer = None
+                if cacheable:
+                    cached_answer = answer_cache.get(*cache_args, prompt, bypass=not use_answer_cache)
+
+                if cached_answer is not None:
+                    status.update(label="Answered from cache", state="complete")
+                    message_placeholder.markdown(cached_answer)
+                    st.session_state.conversation_history.extend(cached_messages(prompt, cached_answer))
+                    full_response = cached_answer
+                else:
+                    # The agent runs on the shared background loop, st.* calls must stay
+                    # on this script thread, so stream updates come back through a queue
+                    updates = queue.Queue()
+                    future = get_agent_loop().submit(stream_response(
+                        st.session_state.agent,
+                        prompt,
+                        message_history=st.session_state.conversation_history,
+                        on_text=lambda text: updates.put((show_text, text)),
+                        on_tool_call=lambda description: updates.put((show_tool_call, description)),
+                    ))
+                    while not (future.done() and updates.empty()):
+                        try:
+                            show, value = updates.get(timeout=0.05)
+                        except queue.Empty:
+                            continue
+                        show(value)
+                    result = future.result()
+
+                    response_text = result.output
+                    status.update(state="complete")
+
+                    # Update conversation history with new messages from the agent run
+                    st.session_state.conversation_history.extend(result.new_messages())
                 
-                # Display final response
-                st.markdown(response_text)
+                    # Display final response
+                    message_placeholder.markdown(response_text)
                 
-                # Log interaction
-                try:
-                    log_interaction(st.session_state.agent, result.new_messages_json(), source="git_assistant_web")
-                except Exception as e:
-                    print(f"Logging error: {e}")
+                    # Log interaction
+                    try:
+                        log_interaction(st.session_state.agent, result.new_messages_json(), source="git_assistant_web")
+                    except Exception as e:
+                        print(f"Logging error: {e}")
                     
-                full_response = response_text
+                    full_response = response_text
+                    if cacheable and response_text:
+                        answer_cache.set(*cache_args, prompt, response_text)
 
             except Exception as e:
+                status.update(state="error")
                 full_response = f"⚠️ An error occurred: {str(e)}"
                 st.error(full_response)
                 import traceback
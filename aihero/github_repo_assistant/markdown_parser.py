@@ -0,0 +1,30 @@
+"""Markdown parsing helpers used by ingest.
+
+Kept free of heavy imports (minsearch, pandas, sklearn) so that process
+pool workers only pay for importing frontmatter when they start."""
+import frontmatter
+
+
+def parse_markdown(filename, content_bytes):
+    """Decode and parse one markdown file, returns (data, error message)"""
+
+    try:
+        content = content_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        return None, f"Skipping binary/non-utf8 file: {filename}"
+
+    try:
+        post = frontmatter.loads(content)
+    except Exception as e:
+        return None, f"Error processing {filename}: {e}"
+
+    data = post.to_dict()
+    data['filename'] = filename
+    return data, None
+
+
+def parse_markdown_batch(batch):
+    """Worker function to parse a batch of (filename, bytes) pairs in a
+    separate process, returns (data, error message) pairs in input order"""
+
+    return [parse_markdown(filename, content_bytes) for filename, content_bytes in batch]
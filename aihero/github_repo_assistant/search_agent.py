@@ -1,7 +1,18 @@
+import time
+from typing import Callable, List, Optional
+
 from minsearch import Index
 from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    FunctionToolCallEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+)
 
 from search_tools import SearchTool
+from sharded_search import ShardedSearch
 
 SYSTEM_PROMPT_TEMPLATE = """
 You are a helpful assistant for documentation  
@@ -24,6 +35,28 @@ Format: [filename](https://github.com/{repo_owner}/{repo_name}/blob/main/filenam
 If the search doesn't return relevant results, let the user know and provide general guidance.  
 """.strip()
 
+MULTI_REPO_SYSTEM_PROMPT_TEMPLATE = """
+You are a helpful assistant for the documentation of these GitHub repositories: {repos}
+
+Use the search tool to find relevant information from the document materials before answering questions.
+Every search result has a "repo" field with the repository it comes from.
+
+If you can find specific information through search, use it to provide accurate answers.
+Before providing an answer please make certain checks:
+- The response directly addresses the user's question  
+- The answer is clear and correct  
+- The response includes proper citations or sources when required  
+- The response is complete and covers all key aspects of the request
+- The response was not hallucinated and covers actual facts
+
+
+Finally Always include references by citing the filename of the source material you used.  
+When citing the reference, construct the link from the repo and filename of the result: "https://github.com/{{repo}}/blob/main/{{filename}}"
+Format: [filename](https://github.com/repo/blob/main/filename)
+
+If the search doesn't return relevant results, let the user know and provide general guidance.  
+""".strip()
+
 def init_agent(index: Index, repo_owner: str, repo_name: str) -> Agent:
 
     system_prompt = SYSTEM_PROMPT_TEMPLATE.format(repo_owner=repo_owner, repo_name=repo_name)
@@ -36,7 +69,83 @@ def init_agent(index: Index, repo_owner: str, repo_name: str) -> Agent:
         name = "search_docs",
         instructions=system_prompt,
         model = "gpt-4o-mini",
-        tools=[st.search]
+        tools=[st.search, st.search_many]
+    )
+
+    return agent
+
+
+def init_multi_repo_agent(sharded_search: ShardedSearch, repos: List[str] = None) -> Agent:
+
+    repos = repos or sharded_search.shards
+    system_prompt = MULTI_REPO_SYSTEM_PROMPT_TEMPLATE.format(repos=", ".join(repos))
+
+    agent = Agent(
+        name = "search_docs",
+        instructions=system_prompt,
+        model = "gpt-4o-mini",
+        tools=[sharded_search.search, sharded_search.search_many]
     )
 
     return agent
+
+
+def describe_tool_call(event: FunctionToolCallEvent) -> str:
+    """Short progress line for a tool call, e.g. search("install")"""
+    args = event.part.args_as_dict()
+    if "query" in args:
+        return f'{event.part.tool_name}("{args["query"]}")'
+    if "queries" in args:
+        return f"{event.part.tool_name}({len(args['queries'])} queries)"
+    return f"{event.part.tool_name}()"
+
+
+async def stream_response(
+    agent: Agent,
+    user_prompt: str,
+    message_history: Optional[list] = None,
+    on_text: Optional[Callable[[str], None]] = None,
+    on_tool_call: Optional[Callable[[str], None]] = None,
+    debounce_by: Optional[float] = 0.05,
+):
+    """
+    Run the agent, calling on_text with the answer so far as tokens arrive
+    (at most every debounce_by seconds) and on_tool_call with a progress
+    line for every tool call.
+
+    Unlike run_stream, agent.run executes every tool call, including ones
+    that follow a text preamble in the same model response. Text followed
+    by a tool call was such a preamble, so the answer starts over after it.
+    Returns the finished AgentRunResult for history and logging.
+    """
+
+    answer = {"text": "", "sent": "", "sent_at": 0.0}
+
+    def emit(force=False):
+        now = time.monotonic()
+        if not on_text or not answer["text"] or answer["text"] == answer["sent"]:
+            return
+        if force or not debounce_by or now - answer["sent_at"] >= debounce_by:
+            on_text(answer["text"])
+            answer["sent"], answer["sent_at"] = answer["text"], now
+
+    async def handle_events(ctx, events):
+        async for event in events:
+            if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                separator = "\n\n" if answer["text"] else ""
+                answer["text"] += separator + event.part.content
+                emit()
+            elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                answer["text"] += event.delta.content_delta
+                emit()
+            elif isinstance(event, FunctionToolCallEvent):
+                answer["text"] = ""
+                if on_tool_call:
+                    on_tool_call(describe_tool_call(event))
+        emit(force=True)
+
+    return await agent.run(
+        user_prompt,
+        message_history=message_history,
+        event_stream_handler=handle_events,
+    )
@@ -1,11 +1,151 @@
-from typing import Any, List
+import json
+import re
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from minsearch import Index
+from sklearn.metrics.pairwise import cosine_similarity
+
+from config import SEARCH_RESULT_CONFIG, SearchResultConfig
+from logs import log_search_payload
+
+# Queries scored together, bounds the dense queries x docs score matrix
+QUERY_BATCH_SIZE = 64
+# Rough token estimate of a payload, for the payload log
+CHARS_PER_TOKEN = 4
+WORD_PATTERN = re.compile(r"\w+")
+ELLIPSIS = "…"
+
+
+def query_terms(query: str) -> set:
+    return {term.lower() for term in WORD_PATTERN.findall(query) if len(term) > 2}
+
+
+def excerpt(text: str, query: str, max_chars: int, highlight: bool = True) -> Tuple[str, bool]:
+    """
+    Cut text to max_chars, returning the excerpt and whether it was cut.
+
+    With highlight the excerpt is the window holding the most query terms,
+    starting a little before the first of them; otherwise it is the start
+    of the text. Cut ends are marked with an ellipsis.
+    """
+    if len(text) <= max_chars:
+        return text, False
+
+    start = 0
+    terms = query_terms(query) if highlight else set()
+    matches = [m.start() for m in WORD_PATTERN.finditer(text) if m.group().lower() in terms]
+    if matches:
+        lead = max_chars // 4
+        best = max(matches, key=lambda pos: bisect_left(matches, pos - lead + max_chars) - bisect_left(matches, pos))
+        start = max(0, min(best - lead, len(text) - max_chars))
+
+    end = start + max_chars
+    return (ELLIPSIS if start else "") + text[start:end] + (ELLIPSIS if end < len(text) else ""), True
+
+
+def _json_size(item: dict) -> int:
+    return len(json.dumps(item, ensure_ascii=False, default=str))
+
+
+def project_results(results: List[Any], query: str,
+                    config: SearchResultConfig = SEARCH_RESULT_CONFIG) -> Tuple[List[Dict], Dict]:
+    """
+    Trim search results to what the agent needs.
+
+    Keeps only the configured fields, cuts the content around the query
+    terms and stops adding results once the payload budget is used up,
+    shrinking the content of the last result to fit when that leaves at
+    least min_content_chars. Returns the payload and its size stats.
+    """
+    payload = []
+    used = 2  # the list brackets
+    truncated = 0
+    content_field = config.content_field
+
+    for result in results:
+        doc = dict(result)
+        item = doc if config.fields is None else {field: doc[field] for field in config.fields if field in doc}
+        content = item.get(content_field)
+        cut = False
+        if isinstance(content, str):
+            item[content_field], cut = excerpt(content, query, config.max_content_chars, config.highlight)
+
+        separator = 2 if payload else 0  # ", "
+        remaining = config.max_payload_chars - used - separator
+        size = _json_size(item)
+        if size > remaining and isinstance(content, str):
+            allowed = len(item[content_field]) - (size - remaining) - 2 * len(ELLIPSIS)
+            if allowed >= config.min_content_chars:
+                item[content_field], cut = excerpt(content, query, allowed, config.highlight)
+                size = _json_size(item)
+        if size > remaining:
+            break
+
+        payload.append(item)
+        used += separator + size
+        truncated += cut
+
+    stats = {
+        "query": query,
+        "results": len(results),
+        "returned": len(payload),
+        "truncated": truncated,
+        "chars": used,
+        "tokens": used // CHARS_PER_TOKEN,
+    }
+    return payload, stats
+
+
+def scored_search_many(index: Index, queries: List[str], num_results: int = 5,
+                       boost_dict: Optional[Dict[str, float]] = None) -> List[List[Tuple[float, Any]]]:
+    """
+    Same ranking as Index.search for every query, returning (score, doc) pairs.
+
+    All queries are vectorized at once and scored with one sparse matrix
+    product per field, instead of one Index.search call per query.
+    """
+    if not index.docs:
+        return [[] for _ in queries]
+    boost_dict = boost_dict or {}
+
+    results = []
+    for start in range(0, len(queries), QUERY_BATCH_SIZE):
+        batch = queries[start:start + QUERY_BATCH_SIZE]
+        scores = np.zeros((len(batch), len(index.docs)))
+        for field in index.text_fields:
+            query_vecs = index.vectorizers[field].transform(batch)
+            scores += cosine_similarity(query_vecs, index.text_matrices[field]) * boost_dict.get(field, 1)
+
+        for row in scores:
+            candidates = np.flatnonzero(row > 0)
+            top = candidates[np.argsort(-row[candidates], kind="stable")][:num_results]
+            results.append([(float(row[i]), index.docs[i]) for i in top])
+    return results
+
+
+def scored_search(index: Index, query: str, num_results: int = 5,
+                  boost_dict: Optional[Dict[str, float]] = None) -> List[Tuple[float, Any]]:
+    """
+    Same ranking as Index.search, but returning (score, doc) pairs.
+
+    Index.search drops the scores, which are needed to merge the results
+    of several indexes.
+    """
+    return scored_search_many(index, [query], num_results, boost_dict)[0]
 
 
 class SearchTool:
-    def __init__(self, index: Index):
+    def __init__(self, index: Index, result_config: SearchResultConfig = SEARCH_RESULT_CONFIG):
         self.index = index
+        self.result_config = result_config
+
+    def project(self, query: str, results: List[Any]) -> List[Dict]:
+        payload, stats = project_results(results, query, self.result_config)
+        if self.result_config.log_payloads:
+            log_search_payload(stats)
+        return payload
 
     def search(self, query: str) -> List[Any]:
         """
@@ -17,4 +157,24 @@ class SearchTool:
         Returns:
             List[Any]: A list of up to 5 search results returned by the FAQ index.
         """
-        return self.index.search(query, num_results=5)
+        results = self.index.search(query, num_results=5)
+        # Trimmed plain dicts, the lazy chunk views are materialised here
+        return self.project(query, results)
+
+    def search_many(self, queries: List[str]) -> List[List[Any]]:
+        """
+        Perform several text-based searches on the FAQ index in one call.
+
+        Prefer this over repeated calls to search when you need results for
+        more than one query.
+
+        Args:
+            queries (List[str]): The search query strings.
+
+        Returns:
+            List[List[Any]]: For every query, in order, a list of up to 5 search results.
+        """
+        return [
+            self.project(query, [doc for _, doc in results])
+            for query, results in zip(queries, scored_search_many(self.index, queries, num_results=5))
+        ]
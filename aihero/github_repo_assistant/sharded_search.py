@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from minsearch import Index
+
+from config import SEARCH_RESULT_CONFIG, SHARDED_SEARCH_CONFIG, SearchResultConfig
+from index_registry import IndexLease
+from logs import log_search_payload
+from search_tools import project_results, scored_search, scored_search_many
+
+
+def normalize_scores(results: List[Tuple[float, Any]], method: str) -> List[Tuple[float, Any]]:
+    """Make scores of indexes with different vocabularies comparable"""
+    if not results or method == "none":
+        return results
+
+    scores = np.array([score for score, _ in results])
+    if method == "max":
+        scores = scores / scores.max()
+    elif method == "minmax":
+        spread = scores.max() - scores.min()
+        scores = (scores - scores.min()) / spread if spread else np.ones_like(scores)
+    else:
+        raise ValueError(f"Unknown score normalization: {method}")
+    return [(float(score), doc) for score, (_, doc) in zip(scores, results)]
+
+
+class ShardedSearch:
+    """
+    Search across several repos, one fitted index (shard) per repo.
+
+    Shards are added and removed independently, so adding a repo never
+    re-fits the others. A query runs on every shard in parallel and the
+    best results overall are returned, tagged with the repo they come from.
+    Scores are compared as they are unless a normalization is configured.
+    """
+
+    def __init__(self, max_workers: int = SHARDED_SEARCH_CONFIG.max_workers,
+                 num_results: int = SHARDED_SEARCH_CONFIG.num_results,
+                 normalization: str = SHARDED_SEARCH_CONFIG.normalization,
+                 result_config: SearchResultConfig = SEARCH_RESULT_CONFIG):
+        self.num_results = num_results
+        self.normalization = normalization
+        # Results keep the repo they come from, it is needed for citations
+        if result_config.fields is not None and "repo" not in result_config.fields:
+            result_config = result_config.model_copy(update={"fields": ["repo", *result_config.fields]})
+        self.result_config = result_config
+        self._lock = threading.Lock()
+        self._shards: Dict[str, Index] = {}
+        self._leases: Dict[str, IndexLease] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+
+    @property
+    def shards(self) -> List[str]:
+        with self._lock:
+            return list(self._shards)
+
+    def add_shard(self, name: str, index: Index, lease: Optional[IndexLease] = None) -> None:
+        """Add or replace the shard of a repo, holding its registry lease if given"""
+        with self._lock:
+            previous_lease = self._leases.pop(name, None)
+            self._shards[name] = index
+            if lease is not None:
+                self._leases[name] = lease
+        if previous_lease is not None and previous_lease is not lease:
+            previous_lease.release()
+
+    def load_shard(self, name: str, build: Callable[[], Index]) -> Index:
+        """Build the index of a repo and add it as a shard"""
+        index = build()
+        self.add_shard(name, index)
+        return index
+
+    def remove_shard(self, name: str) -> bool:
+        with self._lock:
+            index = self._shards.pop(name, None)
+            lease = self._leases.pop(name, None)
+        if lease is not None:
+            lease.release()
+        return index is not None
+
+    def close(self) -> None:
+        for name in self.shards:
+            self.remove_shard(name)
+        self._executor.shutdown(wait=False)
+
+    def _search_shard(self, name: str, index: Index, query: str, num_results: int):
+        results = normalize_scores(scored_search(index, query, num_results), self.normalization)
+        return [(score, name, doc) for score, doc in results]
+
+    def _search_shard_many(self, name: str, index: Index, queries: List[str], num_results: int):
+        return [
+            [(score, name, doc) for score, doc in normalize_scores(results, self.normalization)]
+            for results in scored_search_many(index, queries, num_results)
+        ]
+
+    def _merge(self, query: str, results: List[Tuple[float, str, Any]]) -> List[Any]:
+        # Ties keep shard order so results are deterministic
+        results.sort(key=lambda result: -result[0])
+        merged = [{**dict(doc), "repo": name} for _, name, doc in results[:self.num_results]]
+
+        payload, stats = project_results(merged, query, self.result_config)
+        if self.result_config.log_payloads:
+            log_search_payload(stats)
+        return payload
+
+    def search(self, query: str) -> List[Any]:
+        """
+        Perform a text-based search across the documentation of every loaded repository.
+
+        Args:
+            query (str): The search query string.
+
+        Returns:
+            List[Any]: The best matching results over all repositories, each with
+            a 'repo' field naming the repository it comes from.
+        """
+        with self._lock:
+            shards = list(self._shards.items())
+
+        futures = [
+            self._executor.submit(self._search_shard, name, index, query, self.num_results)
+            for name, index in shards
+        ]
+        return self._merge(query, [result for future in futures for result in future.result()])
+
+    def search_many(self, queries: List[str]) -> List[List[Any]]:
+        """
+        Perform several text-based searches across every loaded repository in one call.
+
+        Prefer this over repeated calls to search when you need results for
+        more than one query.
+
+        Args:
+            queries (List[str]): The search query strings.
+
+        Returns:
+            List[List[Any]]: For every query, in order, the best matching results over
+            all repositories, each with a 'repo' field naming its repository.
+        """
+        with self._lock:
+            shards = list(self._shards.items())
+
+        futures = [
+            self._executor.submit(self._search_shard_many, name, index, queries, self.num_results)
+            for name, index in shards
+        ]
+        per_shard = [future.result() for future in futures]
+        return [
+            self._merge(query, [result for shard_results in per_shard for result in shard_results[i]])
+            for i, query in enumerate(queries)
+        ]
@@ -0,0 +1,77 @@
+"""Benchmark chunk memory of the offset based ChunkStore against the
+previous list of dict chunks, and the markdown aware chunker against
+character sliding windows.
+
+Run from the project root:
+    python -m tests.benchmark_chunking --docs 2000
+"""
+import argparse
+import time
+import tracemalloc
+
+from ingest import CHARS_PER_TOKEN, create_chunks, sliding_window
+from markdown_parser import parse_markdown
+from tests.benchmark_ingest import make_files
+
+
+def dict_chunks(repo_data, size, step):
+    """The chunk layout used before ChunkStore: one dict per chunk
+    holding a copy of the window text and of the metadata"""
+    repo_chunks = []
+    for doc in repo_data:
+        doc_copy = doc.copy()
+        doc_content = doc_copy.pop('content')
+        chunks = sliding_window(seq=doc_content, size=size, step=step)
+        for chunk in chunks:
+            chunk.update(doc_copy)
+        repo_chunks.extend(chunks)
+    return repo_chunks
+
+
+def measure(build, docs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = build(docs)
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return chunks, retained, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chunk memory")
+    parser.add_argument("--docs", type=int, default=2000, help="number of synthetic markdown files")
+    parser.add_argument("--sections", type=int, default=40, help="sections per file")
+    parser.add_argument("--size", type=int, default=2000, help="window size in characters")
+    parser.add_argument("--step", type=int, default=1000, help="window step in characters")
+    parser.add_argument("--max-tokens", type=int, default=500, help="token budget of markdown chunks")
+    args = parser.parse_args()
+
+    docs = [parse_markdown(name, content)[0] for name, content in make_files(args.docs, args.sections)]
+    text_bytes = sum(len(doc['content']) for doc in docs)
+    print(f"{len(docs)} docs, {text_bytes / 1024 ** 2:.1f} MB of text")
+
+    legacy, legacy_bytes, legacy_time = measure(lambda d: dict_chunks(d, args.size, args.step), docs)
+    del legacy
+    store, store_bytes, store_time = measure(lambda d: create_chunks(d, args.size, args.step), docs)
+
+    # Once the raw docs are dropped, the store is the only owner of the text
+    store_bytes += text_bytes
+    print(f"dict chunks:  {legacy_bytes / 1024 ** 2:7.1f} MB  {legacy_time:.2f}s")
+    print(f"chunk store:  {store_bytes / 1024 ** 2:7.1f} MB  {store_time:.2f}s  ({len(store)} chunks, incl. document text)")
+    print(f"memory saved: {1 - store_bytes / legacy_bytes:.0%}")
+
+    print("\nChunker comparison")
+    chunkers = {
+        f"sliding_window({args.size}/{args.step})": {'size': args.size, 'step': args.step},
+        f"markdown({args.max_tokens} tokens)": {'method': 'markdown', 'max_tokens': args.max_tokens},
+    }
+    for name, params in chunkers.items():
+        start = time.perf_counter()
+        chunks = create_chunks(docs, **params)
+        elapsed = time.perf_counter() - start
+        tokens = sum(len(c['content']) for c in chunks) / CHARS_PER_TOKEN
+        print(
+            f"{name:<28} {len(chunks):6d} chunks  {tokens / len(chunks):6.0f} tokens/chunk  "
+            f"{tokens / 1000:8.0f}k tokens total  {text_bytes / 1024 ** 2 / elapsed:6.1f} MB/s"
+        )
@@ -0,0 +1,70 @@
+"""Benchmark serial vs process pool markdown parsing.
+
+Run from the project root:
+    python -m tests.benchmark_ingest --docs 5000 --workers 4
+"""
+import argparse
+import os
+import time
+
+from ingest import parse_markdown_files
+
+FRONTMATTER = """---
+title: Page {i}
+description: Synthetic documentation page number {i}
+sidebarTitle: Page {i}
+tags: [docs, benchmark, page-{i}]
+---
+"""
+
+BODY = """
+## Section {j}
+
+Some explanatory text for section {j} of page {i}, with `inline code` and a
+[link](https://example.com/{i}/{j}).
+
+```python
+def example_{j}():
+    return {i} * {j}
+```
+"""
+
+
+def make_files(num_docs: int, sections: int):
+    files = []
+    for i in range(num_docs):
+        body = "".join(BODY.format(i=i, j=j) for j in range(sections))
+        files.append((f"docs/page_{i}.mdx", (FRONTMATTER.format(i=i) + body).encode("utf-8")))
+    return files
+
+
+def timed_parse(files, workers, batch_size):
+    start = time.perf_counter()
+    docs = list(parse_markdown_files(iter(files), workers=workers, batch_size=batch_size))
+    return docs, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel frontmatter parsing")
+    parser.add_argument("--docs", type=int, default=3000, help="number of synthetic markdown files")
+    parser.add_argument("--sections", type=int, default=8, help="sections per file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="process pool size")
+    parser.add_argument("--batch-size", type=int, default=64, help="files per worker batch")
+    args = parser.parse_args()
+
+    files = make_files(args.docs, args.sections)
+    size_mb = sum(len(content) for _, content in files) / 1024 ** 2
+    print(f"Parsing {len(files)} files ({size_mb:.1f} MB)")
+
+    serial_docs, serial_time = timed_parse(files, workers=None, batch_size=args.batch_size)
+    print(f"serial:             {serial_time:.2f}s")
+
+    # The pool is reused across ingests, its start up is paid once per process
+    _, startup_time = timed_parse(files[:args.workers], workers=args.workers, batch_size=1)
+    print(f"pool startup:       {startup_time:.2f}s (once per process)")
+
+    parallel_docs, parallel_time = timed_parse(files, workers=args.workers, batch_size=args.batch_size)
+    print(f"parallel ({args.workers} workers): {parallel_time:.2f}s")
+
+    assert parallel_docs == serial_docs, "parallel output differs from serial output"
+    print(f"speedup: {serial_time / parallel_time:.2f}x")
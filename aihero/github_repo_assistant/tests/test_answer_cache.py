@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+
+from minsearch import Index
+
+from answer_cache import AnswerCache, cached_messages, index_version, normalize_question
+
+DOCS = [
+    {'content': 'Install the library with pip install evidently.', 'filename': 'install.md'},
+    {'content': 'Detect data drift in numerical columns with a drift report.', 'filename': 'drift.md'},
+    {'content': 'Build a dashboard of classification metrics.', 'filename': 'dashboard.md'},
+]
+
+REPO = ('evidentlyai', 'docs')
+
+
+class TestAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.index = Index(text_fields=['content', 'filename']).fit(DOCS)
+        self.version = index_version(self.index)
+        self.cache = AnswerCache(similarity_threshold=0.8)
+        self.cache.set(REPO, self.version, self.index, 'How do I detect data drift?', 'Use a drift report.')
+
+    def get(self, question, **kwargs):
+        return self.cache.get(REPO, self.version, self.index, question, **kwargs)
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question('  How do I detect   Data Drift?! '), 'how do i detect data drift')
+
+    def test_exact_and_normalized_hits(self):
+        self.assertEqual(self.get('How do I detect data drift?'), 'Use a drift report.')
+        self.assertEqual(self.get('how do i detect DATA drift'), 'Use a drift report.')
+        self.assertEqual(self.cache.stats()['hits'], 2)
+
+    def test_similar_question_hits(self):
+        self.assertEqual(self.get('How do I detect drift in data?'), 'Use a drift report.')
+
+    def test_unknown_terms_must_match(self):
+        self.cache.set(REPO, self.version, self.index, 'How do I install the library?', 'Run pip install evidently.')
+
+        # Same vector over the index vocabulary, different question
+        self.assertIsNone(self.get("Why can't I install the library?"))
+        self.assertIsNone(self.get('How do I install the library with conda?'))
+        self.assertIsNone(self.get('How can I detect data drift?'))
+        self.assertEqual(self.cache.stats()['misses'], 3)
+
+    def test_different_question_misses(self):
+        self.assertIsNone(self.get('How do I install the library?'))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_keyed_on_repo_and_index_version(self):
+        self.assertIsNone(self.cache.get(('other', 'repo'), self.version, self.index, 'How do I detect data drift?'))
+
+        reindexed = Index(text_fields=['content', 'filename']).fit(DOCS + [{'content': 'New page', 'filename': 'new.md'}])
+        self.assertNotEqual(index_version(reindexed), self.version)
+        self.assertIsNone(self.cache.get(REPO, index_version(reindexed), reindexed, 'How do I detect data drift?'))
+
+    def test_index_version_changes_with_content(self):
+        edited = [dict(doc) for doc in DOCS]
+        # Same vocabulary and number of docs, different content
+        edited[1]['content'] = 'Detect drift in numerical data columns with a drift report.'
+        reindexed = Index(text_fields=['content', 'filename']).fit(edited)
+
+        self.assertEqual(index_version(Index(text_fields=['content', 'filename']).fit(DOCS)), self.version)
+        self.assertNotEqual(index_version(reindexed), self.version)
+
+    def test_empty_index_misses(self):
+        # index_data returns an unfitted index for a repo without markdown
+        empty = Index(text_fields=['content', 'filename'])
+        version = index_version(empty)
+
+        self.cache.set(REPO, version, empty, 'How do I detect data drift?', 'No docs.')
+        self.assertIsNone(self.cache.get(REPO, version, empty, 'How do I detect data drift?'))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.stats()['size'], 1)
+
+    def test_bypass(self):
+        self.assertIsNone(self.get('How do I detect data drift?', bypass=True))
+        self.assertEqual(self.cache.stats()['bypassed'], 1)
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+    def test_ttl(self):
+        with patch('answer_cache.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(self.get('How do I detect data drift?'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_lru_eviction(self):
+        cache = AnswerCache(max_entries=2)
+        for question in ['drift report', 'install', 'dashboard']:
+            cache.set(REPO, self.version, self.index, question, question.upper())
+
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertIsNone(cache.get(REPO, self.version, self.index, 'drift report'))
+        self.assertEqual(cache.get(REPO, self.version, self.index, 'dashboard'), 'DASHBOARD')
+
+    def test_cached_messages(self):
+        request, response = cached_messages('question', 'answer')
+
+        self.assertEqual(request.parts[0].content, 'question')
+        self.assertEqual(response.parts[0].content, 'answer')
+
+
+if __name__ == '__main__':
+    unittest.main()
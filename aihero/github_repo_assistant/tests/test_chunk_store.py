@@ -0,0 +1,67 @@
+import pickle
+import unittest
+
+from chunk_store import ChunkStore
+from ingest import create_chunks, sliding_window, update_chunks
+
+
+class TestChunkStore(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = [
+            {'content': '1234567890', 'filename': 'nums.md', 'title': 'Numbers'},
+            {'content': 'abcdefgh', 'filename': 'letters.md'},
+        ]
+
+    def test_chunks_match_sliding_window(self):
+        store = create_chunks(self.docs, size=5, step=2)
+
+        expected = []
+        for doc in self.docs:
+            meta = {k: v for k, v in doc.items() if k != 'content'}
+            expected.extend({**chunk, **meta} for chunk in sliding_window(doc['content'], size=5, step=2))
+
+        self.assertEqual([dict(chunk) for chunk in store], expected)
+        self.assertEqual(store[-1]['content'], 'efgh')
+        self.assertEqual(store[0].get('title'), 'Numbers')
+        self.assertIsNone(store[-1].get('title'))
+
+    def test_text_and_metadata_are_stored_once_per_document(self):
+        store = create_chunks(self.docs, size=5, step=2)
+
+        self.assertEqual(len(store.texts), 2)
+        self.assertIs(store.texts[0], self.docs[0]['content'])
+        self.assertIs(store[0].store.metadata[store[0].doc_id], store[1].store.metadata[store[1].doc_id])
+
+    def test_pickle_roundtrip(self):
+        store = create_chunks(self.docs, size=5, step=2)
+        chunks = pickle.loads(pickle.dumps(list(store)))
+
+        self.assertEqual([dict(c) for c in chunks], [dict(c) for c in store])
+        # All views still point at one shared store
+        self.assertEqual(len({id(c.store) for c in chunks}), 1)
+
+    def test_add_chunks_shares_source_documents(self):
+        source = create_chunks(self.docs, size=5, step=2)
+        target = ChunkStore()
+        target.add_chunks(c for c in source if c['filename'] == 'letters.md')
+
+        self.assertEqual(len(target.texts), 1)
+        self.assertIs(target.texts[0], source.texts[1])
+        self.assertEqual([c['content'] for c in target], ['abcde', 'cdefg', 'efgh'])
+
+    def test_update_chunks_reuses_unchanged_files(self):
+        files = [('nums.md', b'1234567890'), ('letters.md', b'abcdefgh')]
+        params = {'size': 5, 'step': 2}
+        previous, hashes, _ = update_chunks(iter(files), [], {}, chunking_params=params)
+
+        files[1] = ('letters.md', b'ABCDEFGH')
+        docs, _, stats = update_chunks(iter(files), list(previous), hashes, chunking_params=params)
+
+        self.assertEqual(stats, {'unchanged': 1, 'changed': 1, 'deleted': 0})
+        self.assertIs(docs.texts[0], previous.texts[0])
+        self.assertEqual([c['content'] for c in docs if c['filename'] == 'letters.md'], ['ABCDE', 'CDEFG', 'EFGH'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -100,3 +100,26 @@ def test_data_loading_filtering(tmp_path):
     
     assert len(eval_data) == 1
     assert eval_data[0]['log_file'] == "log1.json"
+
+def test_data_loading_from_segments(tmp_path):
+    from config import LogConfig
+    from evaluation import load_log_record
+    from logs import LogWriter
+
+    d = tmp_path / "logs"
+    (tmp_path / "logs").mkdir()
+    (d / "log1.json").write_text('{"source": "ai-generated", "messages": []}')
+
+    writer = LogWriter(d, LogConfig(flush_interval_seconds=0.05))
+    writer.write({"source": "user", "messages": []})
+    writer.write({"source": "ai-generated", "messages": [], "question": "q"})
+    writer.close(5)
+
+    eval_data = get_eval_data(d)
+
+    assert len(eval_data) == 2
+    segment_record = eval_data[1]
+    assert segment_record['question'] == "q"
+    assert segment_record['log_file'].endswith(".jsonl.gz:1")
+    assert load_log_record(d, segment_record['log_file']) == segment_record
+    assert load_log_record(d, "log1.json")['source'] == "ai-generated"
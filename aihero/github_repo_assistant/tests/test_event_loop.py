@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import unittest
+
+from event_loop import BackgroundEventLoop
+
+
+class TestBackgroundEventLoop(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = BackgroundEventLoop().start()
+        self.addCleanup(self.loop.stop)
+
+    def test_run_returns_result(self):
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        self.assertEqual(self.loop.run(add(1, 2)), 3)
+
+    def test_same_loop_across_calls(self):
+        async def current_loop():
+            return asyncio.get_running_loop(), threading.current_thread()
+
+        first = self.loop.run(current_loop())
+        second = self.loop.run(current_loop())
+
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[1], second[1])
+        self.assertIsNot(first[1], threading.current_thread())
+
+    def test_submit_from_many_threads(self):
+        async def square(x):
+            await asyncio.sleep(0.01)
+            return x * x
+
+        results = {}
+
+        def worker(x):
+            results[x] = self.loop.submit(square(x)).result(timeout=5)
+
+        threads = [threading.Thread(target=worker, args=(x,)) for x in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {x: x * x for x in range(8)})
+
+    def test_exceptions_propagate(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.loop.run(fail())
+        # The loop survives a failed coroutine
+        self.assertTrue(self.loop.running)
+
+    def test_run_from_loop_thread_raises(self):
+        async def nested():
+            inner = asyncio.sleep(0)
+            with self.assertRaises(RuntimeError):
+                self.loop.run(inner)
+
+        self.loop.run(nested())
+
+    def test_stop_and_restart(self):
+        self.loop.stop()
+        self.assertFalse(self.loop.running)
+
+        async def answer():
+            return 42
+
+        # submit starts a stopped loop again
+        self.assertEqual(self.loop.run(answer()), 42)
+        self.assertTrue(self.loop.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from pydantic_ai.messages import (
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from config import HistoryConfig
+from history_manager import (
+    REDACTED_CONTENT,
+    HistoryManager,
+    estimate_tokens,
+    split_turns,
+)
+
+
+def turn(question, filenames):
+    """One chat turn: prompt, search call, search results and the answer"""
+    results = [{'filename': name, 'content': 'Some long documentation content. ' * 20} for name in filenames]
+    return [
+        ModelRequest(parts=[UserPromptPart(content=question)]),
+        ModelResponse(parts=[ToolCallPart(tool_name='search', args={'query': question}, tool_call_id=question)]),
+        ModelRequest(parts=[ToolReturnPart(tool_name='search', content=results, tool_call_id=question)]),
+        ModelResponse(parts=[TextPart(content=f'Answer to {question}')]),
+    ]
+
+
+def tool_returns(messages):
+    return [part for m in messages if isinstance(m, ModelRequest) for part in m.parts if isinstance(part, ToolReturnPart)]
+
+
+class TestHistoryManager(unittest.TestCase):
+
+    def setUp(self):
+        self.history = turn('q1', ['a.md', 'b.md']) + turn('q2', ['c.md']) + turn('q3', ['d.md', 'd.md'])
+
+    def test_split_turns(self):
+        turns = split_turns(self.history)
+
+        self.assertEqual(len(turns), 3)
+        self.assertTrue(all(len(t) == 4 for t in turns))
+
+    def test_redacts_old_tool_returns(self):
+        manager = HistoryManager(HistoryConfig(max_tokens=100_000, keep_tool_returns_turns=1))
+        compacted, stats = manager.compact(self.history)
+
+        returns = tool_returns(compacted)
+        self.assertEqual(returns[0].content, f'{REDACTED_CONTENT} (files: a.md, b.md)')
+        self.assertEqual(returns[1].content, f'{REDACTED_CONTENT} (files: c.md)')
+        self.assertEqual(returns[2].content, tool_returns(self.history)[2].content)
+        self.assertEqual(stats['tool_returns_redacted'], 2)
+        self.assertEqual(stats['turns_dropped'], 0)
+        self.assertGreater(stats['tokens_saved'], 0)
+        self.assertEqual(stats['tokens_after'], estimate_tokens(compacted))
+
+        # The original history is left untouched
+        self.assertIsInstance(tool_returns(self.history)[0].content, list)
+
+    def test_plain_placeholder_without_summary(self):
+        manager = HistoryManager(HistoryConfig(max_tokens=100_000, summarize_tool_returns=False))
+        compacted, _ = manager.compact(self.history)
+
+        self.assertEqual(tool_returns(compacted)[0].content, REDACTED_CONTENT)
+
+    def test_drops_oldest_turns_over_budget(self):
+        manager = HistoryManager(HistoryConfig(keep_tool_returns_turns=1))
+        budget = estimate_tokens(manager.compact(self.history)[0]) - 1
+        manager = HistoryManager(HistoryConfig(max_tokens=budget, keep_tool_returns_turns=1))
+
+        compacted, stats = manager.compact(self.history)
+
+        self.assertEqual(stats['turns_dropped'], 1)
+        self.assertLessEqual(stats['tokens_after'], budget)
+        self.assertEqual(compacted[0].parts[0].content, 'q2')
+        # Every remaining tool call still has its return
+        self.assertEqual(len(tool_returns(compacted)), 2)
+
+    def test_single_turn_over_budget_is_redacted(self):
+        manager = HistoryManager(HistoryConfig(max_tokens=1))
+        compacted, stats = manager.compact(self.history)
+
+        self.assertEqual(len(split_turns(compacted)), 1)
+        self.assertTrue(tool_returns(compacted)[0].content.startswith(REDACTED_CONTENT))
+        self.assertEqual(stats['turns_dropped'], 2)
+
+    def test_compaction_is_stable(self):
+        manager = HistoryManager(HistoryConfig(max_tokens=100_000))
+        compacted, first = manager.compact(self.history)
+        again, second = manager.compact(compacted)
+
+        self.assertEqual(again, compacted)
+        self.assertEqual(second['tokens_saved'], 0)
+        self.assertEqual(manager.tokens_saved, first['tokens_saved'])
+
+    def test_empty_history(self):
+        compacted, stats = HistoryManager().compact([])
+
+        self.assertEqual(compacted, [])
+        self.assertEqual(stats['tokens_before'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
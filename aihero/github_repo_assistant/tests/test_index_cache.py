@@ -0,0 +1,162 @@
+import errno
+import json
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from minsearch import Index
+
+from index_cache import IndexCache, cache_key
+from ingest import index_data, parse_markdown_file
+
+MOCK_DOCS = [
+    {
+        'content': 'Caching fitted indexes keyed by commit sha.',
+        'filename': 'cache.md',
+    }
+]
+
+
+MOCK_FILES = [
+    ('cache.md', b'Caching fitted indexes keyed by commit sha.'),
+    ('guide.md', b'---\ntitle: Guide\n---\nIncremental refresh guide.'),
+]
+
+
+def fitted_index():
+    return Index(text_fields=["content", "filename"]).fit(list(MOCK_DOCS))
+
+
+class TestIndexCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_key_depends_on_commit_and_chunking_params(self):
+        params = {'size': 2000, 'step': 1000}
+        key = cache_key('owner', 'repo', 'main', 'abc', params)
+
+        self.assertEqual(key, cache_key('Owner', 'Repo', 'main', 'abc', dict(params)))
+        self.assertNotEqual(key, cache_key('owner', 'repo', 'main', 'def', params))
+        self.assertNotEqual(key, cache_key('owner', 'repo', 'main', 'abc', {'size': 1000, 'step': 500}))
+
+    def test_store_and_load_roundtrip(self):
+        cache = IndexCache(cache_dir=self.tmp_dir.name)
+        key = cache_key('owner', 'repo', 'main', 'abc', None)
+
+        self.assertIsNone(cache.load(key))
+        cache.store(key, fitted_index(), meta={'commit_sha': 'abc'})
+
+        index = cache.load(key)
+        self.assertEqual(index.search('commit sha')[0]['filename'], 'cache.md')
+        self.assertEqual(cache.load_meta(key)['commit_sha'], 'abc')
+
+    def test_evicts_least_recently_used(self):
+        cache = IndexCache(cache_dir=self.tmp_dir.name, max_entries=2)
+        keys = [cache_key('owner', 'repo', 'main', sha, None) for sha in ('a', 'b', 'c')]
+
+        for i, key in enumerate(keys[:2]):
+            entry_dir = cache.store(key, fitted_index())
+            os.utime(entry_dir / 'index.pkl', (i, i))
+
+        # Touch the oldest entry so the second one becomes the LRU
+        cache.load(keys[0])
+        cache.store(keys[2], fitted_index())
+
+        self.assertIsNotNone(cache.load(keys[0]))
+        self.assertIsNone(cache.load(keys[1]))
+        self.assertIsNotNone(cache.load(keys[2]))
+
+    def test_store_keeps_entry_of_concurrent_writer(self):
+        cache = IndexCache(cache_dir=self.tmp_dir.name)
+        key = cache_key('owner', 'repo', 'main', 'abc', None)
+        replace = os.replace
+
+        def concurrent_replace(src, dst):
+            # Another process stores the same key between rmtree and replace
+            other = IndexCache(cache_dir=self.tmp_dir.name)
+            with patch('index_cache.os.replace', replace):
+                other.store(key, fitted_index(), meta={'commit_sha': 'abc'})
+            raise OSError(errno.ENOTEMPTY, 'Directory not empty')
+
+        with patch('index_cache.os.replace', side_effect=concurrent_replace):
+            entry_dir = cache.store(key, fitted_index(), meta={'commit_sha': 'abc'})
+
+        self.assertEqual(cache.load(key).search('commit sha')[0]['filename'], 'cache.md')
+        self.assertEqual([p.name for p in Path(self.tmp_dir.name).iterdir()], [entry_dir.name])
+
+    @patch('ingest.resolve_commit_sha', return_value=('main', 'abc123'))
+    @patch('ingest.iter_repo_files')
+    def test_index_data_reuses_cached_index(self, mock_iter_files, _mock_resolve):
+        mock_iter_files.side_effect = lambda *args, **kwargs: iter(MOCK_FILES)
+        cache = IndexCache(cache_dir=self.tmp_dir.name)
+
+        index_data('test_owner', 'test_repo', cache=cache)
+        index = index_data('test_owner', 'test_repo', cache=cache)
+
+        mock_iter_files.assert_called_once()
+        # The archive of the resolved commit is indexed, not the branch head
+        self.assertEqual(mock_iter_files.call_args.kwargs['commit_sha'], 'abc123')
+        self.assertEqual(index.search('commit sha')[0]['filename'], 'cache.md')
+
+    @patch('ingest.parse_markdown_file', wraps=parse_markdown_file)
+    @patch('ingest.resolve_commit_sha')
+    @patch('ingest.iter_repo_files')
+    def test_index_data_rechunks_only_changed_files(self, mock_iter_files, mock_resolve, mock_parse):
+        cache = IndexCache(cache_dir=self.tmp_dir.name)
+
+        mock_resolve.return_value = ('main', 'sha1')
+        mock_iter_files.side_effect = lambda *args, **kwargs: iter(MOCK_FILES)
+        index_data('test_owner', 'test_repo', cache=cache)
+        self.assertEqual(mock_parse.call_count, 2)
+
+        # guide.md is modified and cache.md is deleted upstream
+        mock_parse.reset_mock()
+        mock_resolve.return_value = ('main', 'sha2')
+        updated_files = [('guide.md', b'Rewritten guide about delta refresh.'), ('new.md', b'Brand new page.')]
+        mock_iter_files.side_effect = lambda *args, **kwargs: iter(updated_files)
+        index = index_data('test_owner', 'test_repo', cache=cache)
+
+        parsed = [c.args[0] for c in mock_parse.call_args_list]
+        self.assertEqual(parsed, ['guide.md', 'new.md'])
+        self.assertEqual({d['filename'] for d in index.docs}, {'guide.md', 'new.md'})
+        self.assertEqual(index.search('delta refresh')[0]['filename'], 'guide.md')
+
+        # Nothing changed for the next commit, so nothing is parsed again
+        mock_parse.reset_mock()
+        mock_resolve.return_value = ('main', 'sha3')
+        index_data('test_owner', 'test_repo', cache=cache)
+        mock_parse.assert_not_called()
+
+
+    @patch('ingest.resolve_commit_sha')
+    @patch('ingest.iter_repo_files')
+    def test_index_data_skips_base_of_older_format(self, mock_iter_files, mock_resolve):
+        cache = IndexCache(cache_dir=self.tmp_dir.name)
+        mock_iter_files.side_effect = lambda *args, **kwargs: iter(MOCK_FILES)
+
+        # An entry written before docs were ChunkViews: dict docs, no format in meta
+        mock_resolve.return_value = ('main', 'sha1')
+        index_data('test_owner', 'test_repo', cache=cache)
+        (old_key,) = [entry_dir.name for _, _, entry_dir in cache.entries()]
+        meta = cache.load_meta(old_key)
+        meta.pop('format', None)
+        cache.store(old_key, fitted_index(), meta=meta, file_hashes=cache.load_file_hashes(old_key))
+        with open(Path(self.tmp_dir.name) / old_key / 'meta.json', 'w') as f_out:
+            json.dump(meta, f_out)
+
+        self.assertIsNone(cache.find_latest(repo_owner='test_owner', repo_name='test_repo'))
+        mock_resolve.return_value = ('main', 'sha2')
+        updated_files = [MOCK_FILES[0], ('guide.md', b'Rewritten guide about delta refresh.')]
+        mock_iter_files.side_effect = lambda *args, **kwargs: iter(updated_files)
+        index = index_data('test_owner', 'test_repo', cache=cache)
+
+        self.assertEqual({d['filename'] for d in index.docs}, {'cache.md', 'guide.md'})
+        self.assertEqual(index.search('delta refresh')[0]['filename'], 'guide.md')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import gc
+import threading
+import time
+import unittest
+
+from index_registry import IndexRegistry, registry_key
+
+
+class TestIndexRegistry(unittest.TestCase):
+
+    def test_registry_key_normalises_repo(self):
+        self.assertEqual(registry_key('EvidentlyAI', 'Docs'), registry_key('evidentlyai', 'docs'))
+        self.assertNotEqual(
+            registry_key('evidentlyai', 'docs', {'size': 2000, 'step': 1000}),
+            registry_key('evidentlyai', 'docs', {'size': 1000, 'step': 500}),
+        )
+
+    def test_concurrent_acquire_builds_once(self):
+        registry = IndexRegistry()
+        build_started = threading.Event()
+        release_build = threading.Event()
+        build_calls = []
+
+        def build():
+            build_calls.append(1)
+            build_started.set()
+            release_build.wait(timeout=5)
+            return object()
+
+        leases = []
+        threads = [
+            threading.Thread(target=lambda: leases.append(registry.acquire('repo', build)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        build_started.wait(timeout=5)
+        time.sleep(0.05)
+        release_build.set()
+        for t in threads:
+            t.join(timeout=5)
+
+        self.assertEqual(len(build_calls), 1)
+        self.assertEqual(len({id(lease.value) for lease in leases}), 1)
+        self.assertEqual(registry.stats(), {'repo': 5})
+
+    def test_idle_entries_are_evicted_after_release(self):
+        registry = IndexRegistry(idle_ttl=0)
+        lease = registry.acquire('repo', object)
+
+        self.assertEqual(registry.evict_idle(), 0)
+        lease.release()
+        lease.release()  # releasing twice is a no-op
+        self.assertTrue(lease.released)
+        self.assertEqual(registry.evict_idle(), 1)
+        self.assertEqual(registry.stats(), {})
+
+    def test_garbage_collected_lease_is_released(self):
+        registry = IndexRegistry()
+        lease = registry.acquire('repo', object)
+        registry.acquire('repo', object).release()
+        self.assertEqual(registry.stats(), {'repo': 1})
+
+        del lease
+        gc.collect()
+        self.assertEqual(registry.stats(), {'repo': 0})
+
+    def test_failed_build_propagates_and_can_retry(self):
+        registry = IndexRegistry()
+
+        def failing_build():
+            raise RuntimeError("download failed")
+
+        with self.assertRaises(RuntimeError):
+            registry.acquire('repo', failing_build)
+
+        lease = registry.acquire('repo', lambda: 'index')
+        self.assertEqual(lease.value, 'index')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,61 @@
+import io
+import os
 import unittest
-from unittest.mock import patch
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+from unittest.mock import MagicMock, patch
 
-from ingest import index_data
+from ingest import (
+    CHARS_PER_TOKEN,
+    _get_parse_pool,
+    create_chunks,
+    download_repo_archive,
+    index_data,
+    iter_repo_data,
+    markdown_chunk_offsets,
+    parse_markdown_files,
+)
+
+MARKDOWN_DOC = """# Title
+
+Intro paragraph about the project.
+
+## Install
+
+Run the installer:
+
+```bash
+pip install package
+
+pip install package[extra]
+```
+
+## Usage
+
+""" + "word " * 120 + """
+
+### Details
+
+Closing notes.
+"""
+
+
+def make_archive_response(files, status_code=200, block_size=16):
+    """Build a mocked streaming response serving a zip archive"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    payload = buffer.getvalue()
+
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.__enter__.return_value = resp
+    resp.iter_content.side_effect = lambda chunk_size: (
+        payload[i: i + block_size] for i in range(0, len(payload), block_size)
+    )
+    return resp
 
 
 class TestIngest(unittest.TestCase):
@@ -56,5 +110,113 @@ class TestIngest(unittest.TestCase):
         self.assertEqual(chunks[0]['content'], '12345')
         print("✅ chunking logic verification passed.")
 
+    @patch('ingest.requests.get')
+    def test_iter_repo_data_streams_archive(self, mock_get):
+        mock_get.return_value = make_archive_response({
+            'repo-main/docs/guide.md': '---\ntitle: Guide\n---\nHello docs',
+            'repo-main/docs/binary.md': b'\xff\xfe\x00',
+            'repo-main/assets/logo.png': b'png',
+        })
+
+        docs = iter_repo_data('test_owner', 'test_repo')
+
+        # Nothing is downloaded until the generator is consumed
+        mock_get.assert_not_called()
+        docs = list(docs)
+
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0]['filename'], 'docs/guide.md')
+        self.assertEqual(docs[0]['title'], 'Guide')
+        self.assertEqual(docs[0]['content'], 'Hello docs')
+        _, kwargs = mock_get.call_args
+        self.assertTrue(kwargs['stream'])
+
+    @patch('ingest.requests.get')
+    def test_iter_repo_data_falls_back_to_master(self, mock_get):
+        mock_get.side_effect = [
+            make_archive_response({}, status_code=404),
+            make_archive_response({'repo-master/README.md': 'Readme'}),
+        ]
+
+        docs = list(iter_repo_data('test_owner', 'test_repo'))
+
+        self.assertEqual([d['filename'] for d in docs], ['README.md'])
+        self.assertIn('/refs/heads/master', mock_get.call_args[0][0])
+
+    @patch('ingest.requests.get')
+    def test_download_repo_archive_pins_commit(self, mock_get):
+        mock_get.return_value = make_archive_response({'repo-abc123/README.md': 'Readme'})
+
+        with io.BytesIO() as f_out:
+            ref = download_repo_archive('test_owner', 'test_repo', f_out, commit_sha='abc123')
+
+        self.assertEqual(ref, 'abc123')
+        mock_get.assert_called_once()
+        self.assertTrue(mock_get.call_args[0][0].endswith('/test_owner/test_repo/zip/abc123'))
+
+    def test_parallel_parsing_matches_serial(self):
+        files = [(f'docs/page_{i}.mdx', f'---\ntitle: Page {i}\n---\nBody {i}'.encode()) for i in range(20)]
+        files.insert(5, ('docs/binary.md', b'\xff\xfe\x00'))
+        files.insert(12, ('docs/broken.md', b'---\ntitle: [unclosed\n---\nBody'))
+
+        serial_out, parallel_out = io.StringIO(), io.StringIO()
+        with redirect_stdout(serial_out):
+            serial = list(parse_markdown_files(iter(files)))
+        with redirect_stdout(parallel_out):
+            parallel = list(parse_markdown_files(iter(files), workers=2, batch_size=3))
+
+        self.assertEqual(len(serial), 20)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel_out.getvalue(), serial_out.getvalue())
+        self.assertIn('Skipping binary/non-utf8 file: docs/binary.md', serial_out.getvalue())
+        self.assertIn('Error processing docs/broken.md', serial_out.getvalue())
+
+    def test_broken_parse_pool_is_replaced(self):
+        files = [(f'docs/page_{i}.md', f'Body {i}'.encode()) for i in range(4)]
+        # A worker dies, which breaks the shared pool
+        broken = _get_parse_pool(2)
+        with self.assertRaises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+
+        with self.assertRaises(BrokenProcessPool):
+            list(parse_markdown_files(iter(files), workers=2, batch_size=2))
+
+        docs = list(parse_markdown_files(iter(files), workers=2, batch_size=2))
+        self.assertEqual([d['content'] for d in docs], [f'Body {i}' for i in range(4)])
+        self.assertIsNot(_get_parse_pool(2), broken)
+
+    def test_markdown_chunker_respects_structure(self):
+        max_tokens = 40
+        chunks = [MARKDOWN_DOC[s:e] for s, e in markdown_chunk_offsets(MARKDOWN_DOC, max_tokens=max_tokens)]
+
+        self.assertTrue(all(len(c) <= max_tokens * CHARS_PER_TOKEN for c in chunks))
+        # The fenced code block is kept whole, including its blank line
+        self.assertEqual(sum('```' in c for c in chunks), 1)
+        self.assertIn('pip install package\n\npip install package[extra]', ''.join(chunks))
+        # No chunk ends on a header and no word is cut in half
+        for chunk in chunks:
+            self.assertFalse(chunk.rstrip().splitlines()[-1].startswith('#'), chunk)
+            self.assertFalse(chunk.endswith('wor'), chunk)
+        self.assertTrue(any(c.startswith('## Usage\n\nword') for c in chunks))
+        self.assertTrue(chunks[-1].startswith('### Details'))
+
+    def test_markdown_chunker_is_lossless_and_ordered(self):
+        offsets = list(markdown_chunk_offsets(MARKDOWN_DOC, max_tokens=40))
+
+        self.assertEqual(offsets, sorted(offsets))
+        covered = ''.join(MARKDOWN_DOC[s:e] for s, e in offsets)
+        self.assertEqual(covered.split(), MARKDOWN_DOC.split())
+
+    def test_create_chunks_with_markdown_method(self):
+        docs = [{'content': MARKDOWN_DOC, 'filename': 'guide.md'}]
+        windows = create_chunks(docs, size=400, step=200)
+        sections = create_chunks(docs, method='markdown', max_tokens=150)
+
+        # Markdown chunks do not overlap, so no text is sent to the agent twice
+        self.assertLessEqual(sum(len(c['content']) for c in sections), len(MARKDOWN_DOC))
+        self.assertGreater(sum(len(c['content']) for c in windows), len(MARKDOWN_DOC))
+        self.assertTrue(sections[0]['content'].startswith('# Title'))
+        self.assertEqual(sections[0]['filename'], 'guide.md')
+
 if __name__ == '__main__':
     unittest.main()
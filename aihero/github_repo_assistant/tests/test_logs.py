@@ -0,0 +1,201 @@
+import gzip
+import json
+import threading
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+
+from config import LogConfig
+from logs import (
+    SEARCH_PAYLOADS_PREFIX,
+    SEGMENT_SUFFIX,
+    LogWriter,
+    iter_segment_records,
+    log_search_payload,
+    read_segment,
+)
+
+
+def entry(i):
+    return {
+        "agent_name": "search_docs",
+        "messages": [{"parts": [], "timestamp": "2025-12-28T02:00:17Z"}],
+        "source": "user",
+        "i": i,
+    }
+
+
+class TestLogWriter(unittest.TestCase):
+
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name) / "logs"
+
+    def writer(self, **config):
+        writer = LogWriter(self.directory, LogConfig(**{"flush_interval_seconds": 0.05, **config}))
+        self.addCleanup(writer.close, 5)
+        return writer
+
+    def segments(self):
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def test_directory_created_on_first_write(self):
+        writer = self.writer()
+        self.assertFalse(self.directory.exists())
+
+        writer.write(entry(0))
+        writer.flush(5)
+        self.assertTrue(self.directory.exists())
+
+    def test_batches_into_one_segment(self):
+        writer = self.writer(batch_size=10)
+        for i in range(25):
+            self.assertTrue(writer.write(entry(i)))
+        writer.flush(5)
+
+        segments = self.segments()
+        self.assertEqual(len(segments), 1)
+        self.assertEqual([record["i"] for record in read_segment(segments[0])], list(range(25)))
+        self.assertEqual(writer.written, 25)
+
+        # Every batch is its own gzip member, the segment is still one gzip file
+        with gzip.open(segments[0], "rt") as f_in:
+            self.assertEqual(len(f_in.readlines()), 25)
+
+    def test_callables_are_built_on_writer_thread(self):
+        writer = self.writer()
+        threads = []
+
+        def build():
+            threads.append(threading.current_thread())
+            return entry(0)
+
+        writer.write(build)
+        writer.write(lambda: 1 / 0)
+        writer.flush(5)
+
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertEqual(writer.written, 1)
+
+    def test_rotates_by_size(self):
+        writer = self.writer(batch_size=1, segment_max_bytes=1)
+        for i in range(3):
+            writer.write(entry(i))
+            writer.flush(5)
+
+        self.assertEqual(len(self.segments()), 3)
+        records = list(iter_segment_records(self.directory))
+        self.assertEqual(sorted(record["i"] for record in records), [0, 1, 2])
+        self.assertTrue(all(record["log_file"].endswith(":0") for record in records))
+
+    def test_rotates_by_age(self):
+        writer = self.writer(segment_max_seconds=0)
+        for i in range(2):
+            writer.write(entry(i))
+            writer.flush(5)
+
+        self.assertEqual(len(self.segments()), 2)
+
+    def test_truncated_last_batch(self):
+        writer = self.writer()
+        writer.write(entry(0))
+        writer.flush(5)
+        writer.close(5)
+
+        segment = self.segments()[0]
+        partial = gzip.compress(b'{"i": 1}\n{"i": 2}\n')[:-10]
+        with open(segment, "ab") as f_out:
+            f_out.write(partial)
+
+        # Complete lines before the cut are read, then reading stops without an error
+        records = [record["i"] for record in read_segment(segment)]
+        self.assertEqual(records, [0, 1, 2][:len(records)])
+        self.assertIn(0, records)
+
+    def test_full_queue_drops_entries(self):
+        writer = self.writer(max_queue_size=1)
+        # Keep the writer busy so the queue fills up
+        blocked = threading.Event()
+        writer.write(lambda: blocked.wait(5) and entry(0))
+        results = [writer.write(entry(i)) for i in range(5)]
+        blocked.set()
+        writer.flush(5)
+
+        self.assertIn(False, results)
+        self.assertEqual(writer.dropped, results.count(False))
+
+    def test_flush_and_close_time_out_on_full_queue(self):
+        writer = self.writer(max_queue_size=1)
+        started, blocked = threading.Event(), threading.Event()
+        self.addCleanup(blocked.set)
+        writer.write(lambda: started.set() or (blocked.wait(5) and entry(0)))
+        started.wait(5)
+        # Fill the queue behind the busy writer
+        while writer.write(entry(1)):
+            pass
+
+        self.assertFalse(writer.flush(0.05))
+        self.assertFalse(writer.close(0.05))
+
+        blocked.set()
+        self.assertTrue(writer.close(5))
+        self.assertEqual(writer.written, 2)
+
+    def test_fsync_policies(self):
+        for policy, expected in [("batch", 2), ("never", 0)]:
+            with patch("logs.os.fsync") as fsync:
+                writer = self.writer(fsync=policy)
+                writer.write(entry(0))
+                writer.flush(5)
+                writer.close(5)
+                # One fsync for the batch and one when the segment is closed
+                self.assertEqual(fsync.call_count, expected, policy)
+
+    def test_files_layout(self):
+        writer = self.writer(layout="files")
+        writer.write(entry(0))
+        writer.write(entry(1))
+        writer.flush(5)
+
+        files = sorted(self.directory.glob("*.json"))
+        self.assertEqual(len(files), 2)
+        self.assertTrue(all(f.name.startswith("search_docs_20251228_020017_") for f in files))
+        self.assertEqual(sorted(json.loads(f.read_text())["i"] for f in files), [0, 1])
+        self.assertEqual(self.segments(), [])
+
+    def test_prefixes_keep_logs_apart(self):
+        interactions = self.writer()
+        payloads = LogWriter(self.directory, LogConfig(flush_interval_seconds=0.05), prefix=SEARCH_PAYLOADS_PREFIX)
+        self.addCleanup(payloads.close, 5)
+        interactions.write(entry(0))
+        payloads.write({"query": "drift", "chars": 120})
+        interactions.flush(5)
+        payloads.flush(5)
+
+        self.assertEqual(len(self.segments()), 2)
+        self.assertEqual([record["i"] for record in iter_segment_records(self.directory)], [0])
+        payload_records = list(iter_segment_records(self.directory, prefix=SEARCH_PAYLOADS_PREFIX))
+        self.assertEqual([record["query"] for record in payload_records], ["drift"])
+
+    def test_search_payloads_are_queued_without_file_io(self):
+        writer = MagicMock()
+        with patch("logs.get_log_writer", return_value=writer) as get_writer, \
+                patch("builtins.open", side_effect=AssertionError("file I/O on the request path")):
+            log_search_payload({"query": "drift", "chars": 120})
+
+        get_writer.assert_called_once_with(SEARCH_PAYLOADS_PREFIX)
+        queued = writer.write.call_args.args[0]
+        self.assertEqual(queued["query"], "drift")
+        self.assertIn("timestamp", queued)
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            LogWriter(self.directory, LogConfig(layout="sqlite"))
+        with self.assertRaises(ValueError):
+            LogWriter(self.directory, LogConfig(fsync="sometimes"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+from minsearch import Index
+from pydantic_ai.messages import ModelRequest, ToolReturnPart
+from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+
+from search_agent import init_agent, stream_response
+
+DOCS = [
+    {'content': 'Install the library with pip.', 'filename': 'install.md'},
+    {'content': 'Detect data drift with a drift report.', 'filename': 'drift.md'},
+]
+
+
+async def search_then_answer(messages, info):
+    """Streams a search tool call on the first request, then the answer in chunks"""
+    if not any(isinstance(part, ToolReturnPart) for m in messages if isinstance(m, ModelRequest) for part in m.parts):
+        yield {0: DeltaToolCall(name='search', json_args='{"query": "install"}', tool_call_id='call_1')}
+        return
+    for chunk in ['Install ', 'it with ', 'pip.']:
+        yield chunk
+
+
+async def preamble_then_search(messages, info):
+    """Streams a text preamble and a search call in the same response, then the answer"""
+    if not any(isinstance(part, ToolReturnPart) for m in messages if isinstance(m, ModelRequest) for part in m.parts):
+        yield 'Let me search the repository. '
+        yield {1: DeltaToolCall(name='search', json_args='{"query": "install"}', tool_call_id='call_1')}
+        return
+    yield 'Install it with pip.'
+
+
+class TestStreamResponse(unittest.TestCase):
+
+    def setUp(self):
+        index = Index(text_fields=['content', 'filename']).fit(DOCS)
+        # The model is overridden in every test, the key only lets the agent be created
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test'}):
+            self.agent = init_agent(index, 'owner', 'repo')
+        patcher = patch('search_tools.log_search_payload')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_stream(self, history=None, stream_function=search_then_answer):
+        texts, tool_calls = [], []
+        with self.agent.override(model=FunctionModel(stream_function=stream_function)):
+            result = asyncio.run(stream_response(
+                self.agent, 'How do I install it?', message_history=history,
+                on_text=texts.append, on_tool_call=tool_calls.append, debounce_by=None,
+            ))
+        return result, texts, tool_calls
+
+    def test_streams_text_incrementally(self):
+        _, texts, _ = self.run_stream()
+
+        self.assertEqual(texts, ['Install ', 'Install it with ', 'Install it with pip.'])
+
+    def test_reports_tool_calls(self):
+        _, _, tool_calls = self.run_stream()
+
+        self.assertEqual(tool_calls, ['search("install")'])
+
+    def test_tool_call_after_preamble_runs(self):
+        result, texts, tool_calls = self.run_stream(stream_function=preamble_then_search)
+
+        self.assertEqual(tool_calls, ['search("install")'])
+        tool_return = [part for m in result.new_messages() if isinstance(m, ModelRequest)
+                       for part in m.parts if isinstance(part, ToolReturnPart)][0]
+        self.assertIn('install.md', str(tool_return.content))
+        # The preamble is shown while searching, the answer replaces it
+        self.assertEqual(texts, ['Let me search the repository. ', 'Install it with pip.'])
+        self.assertEqual(result.output, 'Install it with pip.')
+
+    def test_new_messages_for_history(self):
+        result, _, _ = self.run_stream()
+        history = result.new_messages()
+
+        # request, tool call, tool return and final answer
+        self.assertEqual(len(history), 4)
+        self.assertIn(b'Install it with pip.', result.new_messages_json())
+
+        second, _, _ = self.run_stream(history=history)
+        self.assertEqual(len(second.all_messages()), len(history) + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
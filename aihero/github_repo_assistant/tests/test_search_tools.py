@@ -0,0 +1,100 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from minsearch import Index
+
+from config import SearchResultConfig
+from ingest import create_chunks
+from search_tools import SearchTool, excerpt, project_results, scored_search_many
+
+DOCS = [
+    {'content': 'Detect data drift in numerical columns with a drift report.', 'filename': 'drift.md'},
+    {'content': 'Classification metrics such as precision and recall.', 'filename': 'metrics.md'},
+    {'content': 'Install the library with pip.', 'filename': 'install.md'},
+    {'content': 'Build a dashboard of drift and classification metrics.', 'filename': 'dashboard.md'},
+]
+
+QUERIES = ['drift report', 'classification metrics', 'install pip', 'dashboard', 'unknownword']
+
+RESULT_CONFIG = SearchResultConfig(log_payloads=False)
+
+LONG_CONTENT = 'Intro text. ' * 100 + 'The drift report compares datasets. ' + 'Outro text. ' * 100
+
+
+class TestSearchTool(unittest.TestCase):
+
+    def setUp(self):
+        self.index = Index(text_fields=['content', 'filename']).fit(DOCS)
+        self.tool = SearchTool(index=self.index, result_config=RESULT_CONFIG)
+
+    def test_search_many_matches_search(self):
+        self.assertEqual(self.tool.search_many(QUERIES), [self.tool.search(q) for q in QUERIES])
+
+    def test_search_many_batches_queries(self):
+        with patch('search_tools.QUERY_BATCH_SIZE', 2):
+            batched = scored_search_many(self.index, QUERIES)
+
+        self.assertEqual(batched, scored_search_many(self.index, QUERIES))
+        self.assertEqual(len(batched), len(QUERIES))
+        self.assertEqual(batched[-1], [])
+
+    def test_search_many_on_chunk_store(self):
+        chunks = create_chunks(DOCS, method='markdown')
+        tool = SearchTool(index=Index(text_fields=['content', 'filename']).fit(chunks), result_config=RESULT_CONFIG)
+
+        results = tool.search_many(['drift'])
+
+        self.assertEqual(results, [tool.search('drift')])
+        self.assertIsInstance(results[0][0], dict)
+
+
+
+class TestProjectResults(unittest.TestCase):
+
+    def test_only_configured_fields_are_returned(self):
+        docs = [{'filename': 'a.md', 'title': 'A', 'content': 'drift', 'start': 0, 'description': 'x'}]
+
+        payload, _ = project_results(docs, 'drift', RESULT_CONFIG)
+
+        self.assertEqual(payload, [{'filename': 'a.md', 'title': 'A', 'content': 'drift'}])
+
+    def test_excerpt_centres_on_matched_terms(self):
+        snippet, cut = excerpt(LONG_CONTENT, 'drift report', max_chars=200)
+
+        self.assertTrue(cut)
+        self.assertIn('The drift report compares datasets.', snippet)
+        self.assertTrue(snippet.startswith('…') and snippet.endswith('…'))
+        self.assertEqual(len(snippet), 200 + 2)
+
+        head, _ = excerpt(LONG_CONTENT, 'drift report', max_chars=200, highlight=False)
+        self.assertTrue(head.startswith('Intro text.'))
+        self.assertEqual(excerpt('short', 'drift', max_chars=200), ('short', False))
+
+    def test_payload_budget_is_enforced(self):
+        docs = [{'filename': f'{i}.md', 'content': LONG_CONTENT} for i in range(5)]
+        config = SearchResultConfig(max_content_chars=800, max_payload_chars=2000, log_payloads=False)
+
+        payload, stats = project_results(docs, 'drift report', config)
+
+        self.assertLessEqual(len(json.dumps(payload, ensure_ascii=False)), 2000)
+        self.assertEqual(stats['chars'], len(json.dumps(payload, ensure_ascii=False)))
+        self.assertEqual(len(payload), 3)
+        self.assertLess(len(payload[-1]['content']), 800)
+        self.assertEqual(stats['returned'], 3)
+        self.assertEqual(stats['truncated'], 3)
+
+    def test_payload_sizes_are_logged(self):
+        tool = SearchTool(index=Index(text_fields=['content', 'filename']).fit(DOCS))
+
+        with patch('search_tools.log_search_payload') as log:
+            tool.search('drift')
+
+        stats = log.call_args.args[0]
+        self.assertEqual(stats['query'], 'drift')
+        self.assertEqual(stats['returned'], 2)
+        self.assertGreater(stats['chars'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import threading
+import time
+import unittest
+
+from minsearch import Index
+
+from config import SearchResultConfig
+from index_registry import IndexRegistry
+from search_tools import scored_search
+from sharded_search import ShardedSearch, normalize_scores
+
+EVIDENTLY_DOCS = [
+    {'content': 'Detect data drift in numerical columns with a drift report.', 'filename': 'drift.md'},
+    {'content': 'Classification metrics such as precision and recall.', 'filename': 'metrics.md'},
+    {'content': 'Install the library with pip.', 'filename': 'install.md'},
+]
+
+STREAMLIT_DOCS = [
+    {'content': 'Use st.cache_resource to share objects across sessions.', 'filename': 'caching.md'},
+    {'content': 'Install streamlit with pip and run streamlit hello.', 'filename': 'install.md'},
+]
+
+
+RESULT_CONFIG = SearchResultConfig(log_payloads=False)
+
+
+def fitted_index(docs):
+    return Index(text_fields=['content', 'filename']).fit(docs)
+
+
+class TestShardedSearch(unittest.TestCase):
+
+    def test_scored_search_matches_index_search(self):
+        index = fitted_index(EVIDENTLY_DOCS)
+
+        scored = scored_search(index, 'drift report metrics', num_results=3)
+
+        self.assertEqual([doc for _, doc in scored], index.search('drift report metrics', num_results=3))
+        self.assertEqual([score for score, _ in scored], sorted((score for score, _ in scored), reverse=True))
+
+    def test_relevant_shard_beats_weak_shards(self):
+        sharded = ShardedSearch(num_results=5, result_config=RESULT_CONFIG)
+        for i in range(6):
+            sharded.add_shard(f'weak{i}', fitted_index([
+                {'content': f'Release notes {i}: configure the logging output.', 'filename': 'notes.md'},
+                {'content': f'Contributing guide {i}.', 'filename': 'contributing.md'},
+            ]))
+        sharded.add_shard('evidently', fitted_index(EVIDENTLY_DOCS))
+
+        results = sharded.search('configure data drift detection for numerical columns')
+
+        self.assertEqual(results[0]['repo'], 'evidently')
+        self.assertEqual(results[0]['filename'], 'drift.md')
+        sharded.close()
+
+    def test_normalize_scores(self):
+        results = [(0.8, 'a'), (0.4, 'b'), (0.2, 'c')]
+
+        self.assertEqual([s for s, _ in normalize_scores(results, 'max')], [1.0, 0.5, 0.25])
+        self.assertEqual([s for s, _ in normalize_scores(results, 'minmax')], [1.0, 1 / 3, 0.0])
+        self.assertEqual(normalize_scores(results, 'none'), results)
+
+    def test_search_merges_shards_and_tags_repo(self):
+        search = ShardedSearch(num_results=3, result_config=RESULT_CONFIG)
+        search.add_shard('evidentlyai/docs', fitted_index(EVIDENTLY_DOCS))
+        search.add_shard('streamlit/docs', fitted_index(STREAMLIT_DOCS))
+
+        results = search.search('install with pip')
+
+        self.assertEqual(
+            {(r['repo'], r['filename']) for r in results[:2]},
+            {('evidentlyai/docs', 'install.md'), ('streamlit/docs', 'install.md')},
+        )
+        self.assertEqual(search.search('cache_resource sessions')[0]['repo'], 'streamlit/docs')
+        search.close()
+
+    def test_search_many_matches_search(self):
+        search = ShardedSearch(num_results=3, result_config=RESULT_CONFIG)
+        search.add_shard('evidentlyai/docs', fitted_index(EVIDENTLY_DOCS))
+        search.add_shard('streamlit/docs', fitted_index(STREAMLIT_DOCS))
+        queries = ['install with pip', 'cache_resource sessions', 'unknownword']
+
+        self.assertEqual(search.search_many(queries), [search.search(q) for q in queries])
+        search.close()
+
+    def test_results_are_projected_with_repo(self):
+        search = ShardedSearch(result_config=SearchResultConfig(fields=['filename'], log_payloads=False))
+        search.add_shard('streamlit/docs', fitted_index(STREAMLIT_DOCS))
+
+        self.assertEqual(search.search('cache_resource'), [{'repo': 'streamlit/docs', 'filename': 'caching.md'}])
+        search.close()
+
+    def test_shards_load_and_unload_independently(self):
+        search = ShardedSearch(result_config=RESULT_CONFIG)
+        search.add_shard('evidentlyai/docs', fitted_index(EVIDENTLY_DOCS))
+        search.load_shard('streamlit/docs', lambda: fitted_index(STREAMLIT_DOCS))
+        evidently_index = fitted_index(EVIDENTLY_DOCS)
+        search.add_shard('evidentlyai/docs', evidently_index)
+
+        self.assertEqual(search.shards, ['evidentlyai/docs', 'streamlit/docs'])
+        self.assertTrue(search.remove_shard('evidentlyai/docs'))
+        self.assertFalse(search.remove_shard('evidentlyai/docs'))
+        self.assertEqual({r['repo'] for r in search.search('install')}, {'streamlit/docs'})
+        search.close()
+
+    def test_removing_shard_releases_registry_lease(self):
+        registry = IndexRegistry()
+        lease = registry.acquire('streamlit/docs', lambda: fitted_index(STREAMLIT_DOCS))
+        search = ShardedSearch(result_config=RESULT_CONFIG)
+        search.add_shard('streamlit/docs', lease.value, lease=lease)
+
+        search.remove_shard('streamlit/docs')
+
+        self.assertTrue(lease.released)
+        search.close()
+
+    def test_shards_are_searched_in_parallel(self):
+        search = ShardedSearch(max_workers=4, result_config=RESULT_CONFIG)
+        in_flight, max_in_flight, lock = [0], [0], threading.Lock()
+        search_shard = search._search_shard
+
+        def slow_search_shard(*args):
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return search_shard(*args)
+
+        search._search_shard = slow_search_shard
+        for i in range(4):
+            search.add_shard(f'repo-{i}', fitted_index(EVIDENTLY_DOCS))
+
+        search.search('drift')
+
+        self.assertGreater(max_in_flight[0], 1)
+        search.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
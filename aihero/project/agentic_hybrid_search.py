@@ -1,63 +1,14 @@
-import asyncio
-import hashlib
-import pickle
-from typing import Any, Callable, List
-
-import numpy as np
-from minsearch import Index, VectorSearch
+import os
+from typing import Callable, List
+
+from embeddings import (DEFAULT_STORE_DIRECTORY, load_search_data,
+                        store_generation)
+from event_loop import get_event_loop
+from hybrid_search import MinSearch
+from query_cache import QueryEmbeddingCache
+from vector_index import build_vector_index
 from pydantic_ai import Agent, run
-from sentence_transformers import SentenceTransformer
-
-
-class MinSearch:
-    def __init__(self, docs: list, embeddings: np.array, model_name: str='multi-qa-distilbert-cos-v1'):
-        self.docs = docs
-        self.embeddings = embeddings
-        self.index = self.text_index()
-        self.v_index = self.vector_index()
-        self.embedding_model = SentenceTransformer(f'{model_name}')
-        
-        
-    def text_index(self) -> Index:
-        """Creating a text , vast index"""
 
-        index = Index(text_fields=['title', 'description', 'filename', 'section'],
-                keyword_fields=[])
-        index.fit(self.docs)
-        return index
-
-    def vector_index(self) -> VectorSearch:
-        """Creating a vector index"""
-        
-        index = VectorSearch()
-        index.fit(self.embeddings, self.docs)
-        return index
-
-    def text_search(self, query: str) -> List[Any]:
-        return self.index.search(query, num_results=5)
-
-    def vector_search(self, query: str) -> List[Any]:
-        q = self.embedding_model.encode(query)
-        return self.v_index.search(q, num_results=5)
-
-    def hybrid_search(self, query: str) -> List[Any]:
-        text_results = self.text_search(query)
-        vector_results = self.vector_search(query)
-        
-        # Combine and deduplicate results
-        seen_ids = set()
-        combined_results = []
-
-        for result in text_results + vector_results:
-            text_to_hash = result['filename'] + ' ' + result['section'][0:250]
-            encoded_string = text_to_hash.encode('utf-8')
-            hash_object = hashlib.sha256(encoded_string)
-            hex_digest = hash_object.hexdigest()
-            if hex_digest not in seen_ids:
-                seen_ids.add(result['filename'])
-                combined_results.append(result)
-        
-        return combined_results
 
 class AgentSearch:
     def __init__(self, name: str, tools: List[Callable], system_prompt: str, model: str ):
@@ -73,31 +24,34 @@ class AgentSearch:
             )
     
     def search(self, query: str) -> run.AgentRunResult:
-        result = asyncio.run(self._agent.run(user_prompt=query))
+        # One long-lived loop keeps the model client's connections open between searches
+        result = get_event_loop().run(self._agent.run(user_prompt=query))
         return result
 
 if __name__ == "__main__":
-    FILE_PATH = "../course/vector_search_data.pkl"
-    loaded_data = None
-    try:
-        with open(FILE_PATH, 'rb') as f:
-            loaded_data = pickle.load(f)
-        print(f"Data successfully unpickled from {FILE_PATH}")
-
-        # Access the loaded data
-        loaded_embeddings = loaded_data['embeddings']
-        loaded_docs = loaded_data['documents']
-
-
-    except FileNotFoundError:
-        print(f"Error: The file {FILE_PATH} was not found.")
-    except pickle.UnpicklingError as e:
-        print(f"An error occurred during unpickling: {e}")
+    # Embeddings are memory mapped and docs read on access, see embeddings.py
+    loaded_embeddings, loaded_docs = load_search_data(DEFAULT_STORE_DIRECTORY)
 
     if len(loaded_embeddings) > 0 and len(loaded_docs) > 0:
+        # Agent searches repeat across runs, keep their embeddings
+        query_cache = QueryEmbeddingCache(
+            path="../course/query_cache.npz",
+            model_name="multi-qa-distilbert-cos-v1"
+            )
+        # Large stores get an IVF index, persisted in the store generation
+        generation = store_generation(loaded_docs)
+        vector_index = build_vector_index(
+            loaded_embeddings,
+            loaded_docs,
+            path=os.path.join(generation, "ivf_index.npz"),
+            version=os.path.basename(generation)
+            )
         ms = MinSearch(
             docs=loaded_docs,
-            embeddings=loaded_embeddings
+            embeddings=loaded_embeddings,
+            query_cache=query_cache,
+            vector_index=vector_index,
+            warm_up=True
             )
 
         query = "How can I evaluate classification model results, and ensure numerical data is not drifted?"
@@ -115,7 +69,7 @@ if __name__ == "__main__":
 
         ag = AgentSearch(
             name="faq_search",
-            tools=[ms.hybrid_search],
+            tools=[ms.ahybrid_search, ms.search_many],
             system_prompt=system_prompt,
             model="gpt-4o-mini"
             )
@@ -125,3 +79,6 @@ if __name__ == "__main__":
         )
 
         print(agent_result.output)
+
+        print(f"Query embedding cache: {query_cache.stats()}")
+        query_cache.save()
@@ -0,0 +1,386 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections.abc import Sequence
+from concurrent.futures import Future
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = 'multi-qa-distilbert-cos-v1'
+DEFAULT_STORE_DIRECTORY = '../course/embedding_store'
+EMBEDDINGS_FILE = 'embeddings.npy'
+DOCUMENTS_FILE = 'documents.jsonl'
+OFFSETS_FILE = 'documents.offsets.npy'
+META_FILE = 'meta.json'
+# Names the directory of the current generation of a store
+POINTER_FILE = 'CURRENT'
+GENERATION_PREFIX = 'generation-'
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name=DEFAULT_MODEL_NAME):
+    """
+    SentenceTransformer shared by everything in this process, loaded on first use.
+
+    sentence_transformers (and torch) are imported here rather than at module
+    import time. Concurrent first calls wait for the same load.
+    """
+    with _models_lock:
+        future = _models.get(model_name)
+        loading = future is None
+        if loading:
+            future = _models[model_name] = Future()
+
+    if loading:
+        try:
+            from sentence_transformers import SentenceTransformer
+            future.set_result(SentenceTransformer(model_name))
+        except BaseException as e:
+            # Let the next call retry instead of caching the failure
+            with _models_lock:
+                del _models[model_name]
+            future.set_exception(e)
+    return future.result()
+
+
+def warm_up_embedding_model(model_name=DEFAULT_MODEL_NAME):
+    """Load the shared model in a background thread, returns the thread"""
+
+    def load():
+        try:
+            get_embedding_model(model_name)
+        except Exception as e:
+            print(f"Error loading embedding model {model_name}: {e}")
+
+    thread = threading.Thread(target=load, name=f'warm-up-{model_name}', daemon=True)
+    thread.start()
+    return thread
+
+
+def section_hash(doc):
+    """Hash of the text that gets embedded for a section doc"""
+    return hashlib.sha256(doc['section'].encode('utf-8')).hexdigest()
+
+
+class JsonlDocuments(Sequence):
+    """
+    Read-only list of the docs in a JSONL file, parsed on access.
+
+    The byte offset of every line comes from a memory mapped offsets array,
+    so opening the table costs nothing and docs[i] is one positional read
+    and one json.loads. Reads do not share a file position, so the docs can
+    be read from many threads. Pages are shared with other processes via
+    the page cache.
+    """
+
+    def __init__(self, path, offsets_path):
+        self.path = path
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._fd is None:
+            with self._lock:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDONLY)
+        return self._fd
+
+    def __del__(self):
+        if getattr(self, '_fd', None) is not None:
+            os.close(self._fd)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('document index out of range')
+
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(os.pread(self._open(), end - start, start))
+
+    def __iter__(self):
+        # Sequential reads do not need the offsets
+        with open(self.path, 'rb') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def __getstate__(self):
+        # Worker processes reopen the files instead of receiving the docs
+        return {'path': self.path, 'offsets_path': self.offsets.filename}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['offsets_path'])
+
+    def __repr__(self):
+        return f'JsonlDocuments({self.path!r}, {len(self)} docs)'
+
+
+class EmbeddingStore:
+    """
+    On-disk embeddings with a sidecar doc table.
+
+    Vectors are kept as float16 (or float32, for full precision re-ranking
+    of a quantized index) in a .npy file so they can be memory mapped,
+    row i of embeddings.npy belongs to line i of documents.jsonl, whose line
+    offsets are in documents.offsets.npy. meta.json records the model the
+    vectors were produced with.
+
+    Every write is a new generation directory holding all four files, the
+    CURRENT file names the current one and is replaced in one step, so a
+    reader or a crash sees either the old or the new generation. Stores
+    written before generations keep the files in the directory itself and
+    are still read.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIRECTORY):
+        self.directory = directory
+
+    def current_generation(self):
+        """Directory of the current generation, resolve it once to read files that belong together"""
+        try:
+            with open(os.path.join(self.directory, POINTER_FILE)) as f:
+                return os.path.join(self.directory, f.read().strip())
+        except FileNotFoundError:
+            return self.directory
+
+    def _path(self, name, generation=None):
+        return os.path.join(generation or self.current_generation(), name)
+
+    def exists(self, generation=None):
+        generation = generation or self.current_generation()
+        return all(os.path.exists(self._path(name, generation)) for name in (EMBEDDINGS_FILE, DOCUMENTS_FILE, OFFSETS_FILE, META_FILE))
+
+    def load_meta(self, generation=None):
+        with open(self._path(META_FILE, generation)) as f:
+            return json.load(f)
+
+    def load_documents(self, generation=None):
+        return JsonlDocuments(self._path(DOCUMENTS_FILE, generation), self._path(OFFSETS_FILE, generation))
+
+    def load_embeddings(self, mmap_mode='r', generation=None):
+        return np.load(self._path(EMBEDDINGS_FILE, generation), mmap_mode=mmap_mode)
+
+    def load(self, generation=None):
+        """
+        Return (embeddings, documents) of one generation, both read lazily
+        from disk. Raises ValueError if their counts disagree with meta.json.
+        """
+        generation = generation or self.current_generation()
+        count = self.load_meta(generation)['count']
+        embeddings = self.load_embeddings(generation=generation)
+        documents = self.load_documents(generation)
+        if not count == len(embeddings) == len(documents):
+            raise ValueError(
+                f"Inconsistent embedding store {generation}: meta.json has {count} docs, "
+                f"{len(embeddings)} embeddings and {len(documents)} document offsets"
+            )
+        return embeddings, documents
+
+    def write(self, docs, fill_rows, dimension, model_name, dtype='float16'):
+        """
+        Write a new generation of the store.
+
+        fill_rows(out) writes the vectors into the memmap out. The files
+        are written into a hidden directory, which is renamed to a
+        generation and made current by replacing CURRENT. The previous
+        generation is kept for readers that resolved it just before, older
+        ones are removed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self.current_generation()
+        tmp_dir = tempfile.mkdtemp(prefix=f'.{GENERATION_PREFIX}', dir=self.directory)
+        try:
+            out = np.lib.format.open_memmap(self._path(EMBEDDINGS_FILE, tmp_dir), mode='w+', dtype=dtype,
+                                            shape=(len(docs), dimension))
+            fill_rows(out)
+            out.flush()
+            del out
+
+            offsets = np.zeros(len(docs) + 1, dtype=np.uint64)
+            with open(self._path(DOCUMENTS_FILE, tmp_dir), 'wb') as f:
+                for i, doc in enumerate(docs):
+                    f.write(json.dumps(doc, ensure_ascii=False).encode('utf-8') + b'\n')
+                    offsets[i + 1] = f.tell()
+
+            with open(self._path(OFFSETS_FILE, tmp_dir), 'wb') as f:
+                np.save(f, offsets)
+
+            with open(self._path(META_FILE, tmp_dir), 'w') as f:
+                json.dump({'model_name': model_name, 'dimension': dimension, 'count': len(docs), 'dtype': dtype}, f)
+
+            generation = os.path.basename(tmp_dir)[1:]
+            os.replace(tmp_dir, os.path.join(self.directory, generation))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        tmp_pointer = os.path.join(self.directory, f'.{POINTER_FILE}-{generation}')
+        with open(tmp_pointer, 'w') as f:
+            f.write(generation)
+        os.replace(tmp_pointer, os.path.join(self.directory, POINTER_FILE))
+
+        self._remove_old_generations(keep={generation, os.path.basename(previous)})
+
+    def _remove_old_generations(self, keep):
+        for name in os.listdir(self.directory):
+            if name.startswith(GENERATION_PREFIX) and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            elif name in (EMBEDDINGS_FILE, DOCUMENTS_FILE, OFFSETS_FILE, META_FILE):
+                # Files of a store written before generations
+                os.remove(os.path.join(self.directory, name))
+
+
+def build_embeddings(docs, store, model=None, model_name=DEFAULT_MODEL_NAME, batch_size=64, show_progress_bar=False,
+                     dtype='float16'):
+    """
+    Embed the sections of docs into store, re-encoding only new sections.
+
+    Sections whose hash is already in the store reuse their stored vector,
+    the rest are encoded in batches. The model is only loaded when there is
+    something to encode. Returns counts of reused and encoded sections.
+    """
+    previous_rows = {}
+    previous_embeddings = None
+    generation = store.current_generation()
+    if store.exists(generation) and store.load_meta(generation)['model_name'] == model_name:
+        previous_embeddings, previous_documents = store.load(generation)
+        for row, doc in enumerate(iter(previous_documents)):
+            previous_rows.setdefault(section_hash(doc), row)
+
+    hashes = [section_hash(doc) for doc in docs]
+    # Duplicate sections are encoded once
+    missing_texts = {}
+    for doc, h in zip(docs, hashes):
+        if h not in previous_rows:
+            missing_texts.setdefault(h, doc['section'])
+    missing = list(missing_texts)
+
+    new_embeddings = None
+    if missing:
+        if model is None:
+            model = get_embedding_model(model_name)
+        new_embeddings = model.encode(
+            list(missing_texts.values()),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=show_progress_bar,
+        )
+        new_rows = {h: row for row, h in enumerate(missing)}
+
+    if new_embeddings is not None:
+        dimension = new_embeddings.shape[1]
+    elif previous_embeddings is not None:
+        dimension = previous_embeddings.shape[1]
+    else:
+        dimension = 0
+
+    def fill_rows(out):
+        for i, h in enumerate(hashes):
+            if h in previous_rows:
+                out[i] = previous_embeddings[previous_rows[h]]
+            else:
+                out[i] = new_embeddings[new_rows[h]]
+
+    store.write(docs, fill_rows, dimension=dimension, model_name=model_name, dtype=dtype)
+    return {'reused': len(docs) - sum(h not in previous_rows for h in hashes), 'encoded': len(missing)}
+
+
+def store_from_pickle(pickle_path, store, model_name=DEFAULT_MODEL_NAME, dtype='float16'):
+    """Convert a vector_search_data.pkl with 'embeddings' and 'documents' into store"""
+    with open(pickle_path, 'rb') as f:
+        data = pickle.load(f)
+    embeddings = np.asarray(data['embeddings'])
+
+    def fill_rows(out):
+        out[:] = embeddings
+
+    store.write(data['documents'], fill_rows, dimension=embeddings.shape[1], model_name=model_name, dtype=dtype)
+    return len(data['documents'])
+
+
+def store_generation(documents):
+    """Generation directory the docs of a loaded store belong to, files derived from its vectors are kept there"""
+    return os.path.dirname(documents.path)
+
+
+def load_search_data(store_directory=DEFAULT_STORE_DIRECTORY):
+    """Open the embeddings and docs MinSearch is built from, without reading them into memory"""
+    store = EmbeddingStore(store_directory)
+    if not store.exists():
+        print(f"Error: no embedding store in {store_directory}, run embeddings.py first")
+        return np.empty((0, 0), dtype=np.float16), []
+
+    try:
+        embeddings, docs = store.load()
+    except ValueError as e:
+        print(f"Error: {e}, run embeddings.py again")
+        return np.empty((0, 0), dtype=np.float16), []
+    print(f"Loaded {len(docs)} documents from {store_directory}")
+    return embeddings, docs
+
+
+def main(repo_owner, repo_name, llm_model_name, store_directory=DEFAULT_STORE_DIRECTORY,
+         model_name=DEFAULT_MODEL_NAME, batch_size=64, dtype='float16'):
+    """Chunk a repo with the LLM and embed its sections into the store"""
+    from extract_and_chunking import main as extract_and_chunk
+
+    docs = extract_and_chunk(repo_owner=repo_owner, repo_name=repo_name, model_name=llm_model_name)
+    stats = build_embeddings(
+        docs,
+        EmbeddingStore(store_directory),
+        model_name=model_name,
+        batch_size=batch_size,
+        show_progress_bar=True,
+        dtype=dtype,
+    )
+    print(f"Embedded {stats['encoded']} sections, reused {stats['reused']} from {store_directory}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='BuildEmbeddings',
+                    description='Chunk a github repo and store the embeddings of its sections',
+                    usage='%(prog)s [options]')
+
+    parser.add_argument("-o", "--owner", type=str, required=False, help="user name of the github repo owner")
+    parser.add_argument("-r", "--repo", type=str, required=False, help="name of the repository on github")
+    parser.add_argument("-m", "--model", type=str, required=False, help="name of openai model used for chunking")
+    parser.add_argument("-s", "--store", type=str, default=DEFAULT_STORE_DIRECTORY, help="directory of the embedding store")
+    parser.add_argument("-e", "--embedding-model", type=str, default=DEFAULT_MODEL_NAME, help="sentence transformers model")
+    parser.add_argument("-b", "--batch-size", type=int, default=64, help="sections encoded per batch")
+    parser.add_argument("--dtype", type=str, default="float16", choices=["float16", "float32"], help="precision of the stored vectors")
+    parser.add_argument("--from-pickle", type=str, required=False, help="convert an existing vector_search_data.pkl instead")
+    args = parser.parse_args()
+
+    if args.from_pickle:
+        count = store_from_pickle(args.from_pickle, EmbeddingStore(args.store),
+                                  model_name=args.embedding_model, dtype=args.dtype)
+        print(f"Converted {count} documents from {args.from_pickle} into {args.store}")
+        raise SystemExit(0)
+    if not (args.owner and args.repo):
+        parser.error("--owner and --repo are required unless --from-pickle is given")
+
+    main(
+        repo_owner=args.owner,
+        repo_name=args.repo,
+        llm_model_name=args.model,
+        store_directory=args.store,
+        model_name=args.embedding_model,
+        batch_size=args.batch_size,
+        dtype=args.dtype,
+    )
@@ -1,12 +1,16 @@
 import argparse
+import asyncio
 import io
 import re
+import time
 import zipfile
 
 import frontmatter
 import requests
 from config import prompt_template
-from openai import APIConnectionError, APIStatusError, OpenAI, RateLimitError
+from openai import (APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI,
+                    RateLimitError)
+from section_cache import DEFAULT_CACHE_PATH, SectionCache, section_cache_key
 from tenacity import (retry, retry_if_exception_type, stop_after_attempt,
                       wait_random_exponential)
 from tqdm.auto import tqdm
@@ -114,26 +118,40 @@ class OpenAIClient:
 
         return response.output_text
 
+def parse_sections(response):
+    """Split the model response into the sections it produced"""
+    sections = response.split('---')
+    return [s.strip() for s in sections if s.strip()]
+
 class IntelligentChunking(OpenAIClient):
-    def __init__(self, openai_model):
+    def __init__(self, openai_model, cache=None):
         super().__init__(model=openai_model)
+        self.cache = cache
     
     def intelligent_chunking(self, text):
+        if self.cache is not None:
+            key = section_cache_key(text, prompt_template, self.model)
+            sections = self.cache.get(key)
+            if sections is not None:
+                return sections
+
         prompt = prompt_template.format(document=text)
         response = self.llm(prompt)
-        sections = response.split('---')
-        sections = [s.strip() for s in sections if s.strip()]
+        sections = parse_sections(response)
+
+        if self.cache is not None:
+            self.cache.set(key, sections)
         return sections
 
 
-def create_chunks(repo_data, model_name):
+def create_chunks(repo_data, model_name, cache=None):
 
     repo_chunks = []
+    ic = IntelligentChunking(openai_model=model_name, cache=cache)
     for doc in tqdm(repo_data):
         doc_copy = doc.copy()
         doc_content = doc_copy.pop('content')
 
-        ic = IntelligentChunking(openai_model=model_name)
         sections = ic.intelligent_chunking(text=doc_content)
         for section in sections:
             section_doc = doc_copy.copy()
@@ -143,11 +161,226 @@ def create_chunks(repo_data, model_name):
     return repo_chunks
 
 
-def main(repo_owner, repo_name, model_name):
+# Rough token estimate used for rate limiting
+CHARS_PER_TOKEN = 4
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value):
+    """Parse rate limit reset values such as '1s', '6m0s' or '20ms' into seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = DURATION_PATTERN.findall(value)
+    if not matches:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in matches)
+
+
+def _int_header(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenRateLimiter:
+    """
+    Token bucket limiting the tokens sent to the API per minute.
+
+    The bucket refills continuously at tokens_per_minute / 60 per second.
+    It adapts to the x-ratelimit-* headers returned by the API (adopting the
+    reported limit when none is configured) and pauses all requests after
+    a 429 until the time the API asks us to wait.
+    """
+
+    def __init__(self, tokens_per_minute=None):
+        self.tokens_per_minute = tokens_per_minute
+        self._available = float(tokens_per_minute or 0)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.tokens_per_minute:
+            refill = (now - self._updated_at) * self.tokens_per_minute / 60
+            self._available = min(self.tokens_per_minute, self._available + refill)
+        self._updated_at = now
+
+    async def acquire(self, tokens):
+        """Wait until tokens can be spent without exceeding the limit"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # Requests are admitted one at a time, in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if not self.tokens_per_minute:
+                    return
+
+                self._refill()
+                # A prompt larger than the whole budget waits for a full bucket
+                needed = min(tokens, self.tokens_per_minute)
+                if self._available >= needed:
+                    self._available -= needed
+                    return
+                await asyncio.sleep((needed - self._available) * 60 / self.tokens_per_minute)
+
+    def refund(self, tokens):
+        """Correct the bucket once the actual usage of a request is known"""
+        if self.tokens_per_minute:
+            self._refill()
+            self._available = min(self.tokens_per_minute, self._available + tokens)
+
+    def update_from_headers(self, headers):
+        limit = _int_header(headers, 'x-ratelimit-limit-tokens')
+        remaining = _int_header(headers, 'x-ratelimit-remaining-tokens')
+        if limit and not self.tokens_per_minute:
+            self.tokens_per_minute = limit
+            self._available = float(limit)
+        if remaining is not None and self.tokens_per_minute:
+            self._refill()
+            self._available = min(self._available, remaining)
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def retry_after(headers, default=1.0):
+    """Seconds to wait after a 429, as reported by the API"""
+    for name in ('retry-after', 'x-ratelimit-reset-tokens', 'x-ratelimit-reset-requests'):
+        seconds = parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return default
+
+
+class AsyncOpenAIClient:
+    def __init__(self, model, client=None, max_concurrency=8, tokens_per_minute=None):
+        self.model = model
+        self._client = client or AsyncOpenAI()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = TokenRateLimiter(tokens_per_minute=tokens_per_minute)
+
+    @retry(
+    wait=wait_random_exponential(multiplier=1, max=60),
+    stop=stop_after_attempt(max_attempt_number=5),
+    retry=retry_if_exception_type((APIConnectionError, RateLimitError, APIStatusError))
+    )
+    async def llm(self, prompt):
+        messages = [
+        {"role": "user", "content": prompt}
+        ]
+        # The model rewrites the document, so expect about as many output tokens
+        estimated_tokens = 2 * len(prompt) // CHARS_PER_TOKEN
+
+        async with self._semaphore:
+            await self.rate_limiter.acquire(estimated_tokens)
+            try:
+                raw_response = await self._client.responses.with_raw_response.create(
+                    model=f'{self.model}',
+                    input=messages
+                    )
+            except RateLimitError as e:
+                self.rate_limiter.pause(retry_after(e.response.headers))
+                raise
+            self.rate_limiter.update_from_headers(raw_response.headers)
+            response = raw_response.parse()
+
+        if response.usage is not None:
+            self.rate_limiter.refund(estimated_tokens - response.usage.total_tokens)
+        return response.output_text
+
+class AsyncIntelligentChunking(AsyncOpenAIClient):
+    def __init__(self, openai_model, cache=None, **client_options):
+        super().__init__(model=openai_model, **client_options)
+        self.cache = cache
+
+    async def intelligent_chunking(self, text):
+        if self.cache is not None:
+            key = section_cache_key(text, prompt_template, self.model)
+            sections = self.cache.get(key)
+            if sections is not None:
+                return sections
+
+        prompt = prompt_template.format(document=text)
+        response = await self.llm(prompt)
+        sections = parse_sections(response)
+
+        if self.cache is not None:
+            self.cache.set(key, sections)
+        return sections
+
+
+async def _chunk_document(ic, doc):
+    doc_copy = doc.copy()
+    doc_content = doc_copy.pop('content')
+
+    sections = await ic.intelligent_chunking(text=doc_content)
+    return [{**doc_copy, 'section': section} for section in sections]
+
+
+async def iter_chunks_async(repo_data, model_name, max_concurrency=8, tokens_per_minute=None, client=None, cache=None):
+    """Async generator of section docs, in the order of repo_data.
+
+    All documents share one AsyncOpenAI client; at most max_concurrency
+    requests are in flight and the token rate limit is respected. Results
+    are yielded as soon as every earlier document is done. Documents found
+    in the section cache skip the LLM call."""
+
+    ic = AsyncIntelligentChunking(
+        openai_model=model_name,
+        cache=cache,
+        client=client,
+        max_concurrency=max_concurrency,
+        tokens_per_minute=tokens_per_minute,
+    )
+    tasks = [asyncio.create_task(_chunk_document(ic, doc)) for doc in repo_data]
+    try:
+        for task in tqdm(tasks):
+            for section_doc in await task:
+                yield section_doc
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Let the cancelled requests unwind before the caller moves on
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def create_chunks_async(repo_data, model_name, **options):
+    return [section_doc async for section_doc in iter_chunks_async(repo_data, model_name, **options)]
+
+
+def main(repo_owner, repo_name, model_name, concurrency=8, tokens_per_minute=None,
+         cache_path=DEFAULT_CACHE_PATH, prune_cache=False):
     """Function to run the main of reading data from a repo"""
 
     repo_data = read_repo_data(repo_owner=repo_owner, repo_name=repo_name)
-    repo_intelligent_chunked_data = create_chunks(repo_data=repo_data, model_name=model_name)
+    cache = SectionCache(cache_path, namespace=f"{repo_owner}/{repo_name}") if cache_path else None
+    repo_intelligent_chunked_data = asyncio.run(create_chunks_async(
+        repo_data=repo_data,
+        model_name=model_name,
+        max_concurrency=concurrency,
+        tokens_per_minute=tokens_per_minute,
+        cache=cache,
+    ))
+
+    if cache is not None:
+        if prune_cache:
+            removed = cache.prune()
+            print(f"Pruned {removed} stale section cache entries")
+        stats = cache.stats()
+        print(f"Section cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        cache.close()
     return repo_intelligent_chunked_data
 
 
@@ -160,8 +393,20 @@ if __name__ == "__main__":
     parser.add_argument("-o", "--owner", type=str, required=True, help="user name of the github repo owner")
     parser.add_argument("-r", "--repo", type=str, required=True, help="name of the repository on github")
     parser.add_argument("-m", "--model", type=str, required=False, help="name of openai model")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="maximum concurrent llm requests")
+    parser.add_argument("--tpm", type=int, required=False, help="tokens per minute limit of the openai account")
+    parser.add_argument("--cache", type=str, default=DEFAULT_CACHE_PATH, help="sqlite file caching llm sections, empty to disable")
+    parser.add_argument("--prune-cache", action="store_true", help="drop cached sections of this repo that were not used in this run")
     args = parser.parse_args()
 
     # Extract and chunk data
-    data = main(repo_owner=args.owner, repo_name=args.repo, model_name=args.model)
+    data = main(
+        repo_owner=args.owner,
+        repo_name=args.repo,
+        model_name=args.model,
+        concurrency=args.concurrency,
+        tokens_per_minute=args.tpm,
+        cache_path=args.cache,
+        prune_cache=args.prune_cache,
+    )
     print(data)
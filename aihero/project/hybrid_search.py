@@ -1,20 +1,71 @@
-import hashlib
-import pickle
+import asyncio
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+from embeddings import (DEFAULT_MODEL_NAME, DEFAULT_STORE_DIRECTORY,
+                        get_embedding_model, load_search_data,
+                        store_generation, warm_up_embedding_model)
 from minsearch import Index, VectorSearch
-from sentence_transformers import SentenceTransformer
+from query_cache import QueryEmbeddingCache
+from sklearn.metrics.pairwise import cosine_similarity
+from vector_index import build_vector_index
+
+# Queries scored together by search_many, bounds the queries x docs score matrix
+QUERY_BATCH_SIZE = 64
+# Vector legs run at once, one per concurrent search, same default as ThreadPoolExecutor
+VECTOR_SEARCH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def top_results(scores, docs, num_results):
+    """Best num_results docs of one row of scores, like Index.search with output_ids"""
+    candidates = np.flatnonzero(scores > 0)
+    top = candidates[np.argsort(-scores[candidates], kind='stable')][:num_results]
+    return [{**docs[int(i)], '_id': int(i)} for i in top]
 
 
 class MinSearch:
-    def __init__(self, docs: list, embeddings: np.array, model_name: str='multi-qa-distilbert-cos-v1'):
+    def __init__(self, docs: list, embeddings: np.array, model_name: str=DEFAULT_MODEL_NAME, embedding_model=None,
+                 num_results: int=5, num_candidates: int=10, rrf_k: int=60, text_weight: float=1.0, vector_weight: float=1.0,
+                 query_cache: QueryEmbeddingCache=None, vector_index=None, warm_up: bool=False):
         self.docs = docs
         self.embeddings = embeddings
         self.index = self.text_index()
-        self.v_index = self.vector_index()
-        self.embedding_model = SentenceTransformer(f'{model_name}')
-        
+        # A fitted index with the VectorSearch API (e.g. an IVF index) replaces brute force search
+        self.v_index = vector_index if vector_index is not None else self.vector_index()
+        # The model is loaded on the first vector query unless it is warmed up now
+        self.model_name = model_name
+        self._embedding_model = embedding_model
+        if warm_up and embedding_model is None:
+            warm_up_embedding_model(model_name)
+        self.chunk_ids = self.compute_chunk_ids()
+        self.query_cache = query_cache or QueryEmbeddingCache(model_name=model_name)
+
+        # Ranking settings, see fuse_results
+        self.num_results = num_results
+        self.num_candidates = num_candidates
+        self.rrf_k = rrf_k
+        self.text_weight = text_weight
+        self.vector_weight = vector_weight
+        # The vector leg runs here while the caller runs the text leg. Every
+        # caller runs its own text leg, so concurrent searches need a vector
+        # worker each instead of queueing behind one thread
+        self._executor = ThreadPoolExecutor(max_workers=VECTOR_SEARCH_WORKERS, thread_name_prefix='vector-search')
         
+    @property
+    def embedding_model(self):
+        """The injected model, or the model shared by the process"""
+        if self._embedding_model is None:
+            return get_embedding_model(self.model_name)
+        return self._embedding_model
+
+    def encode(self, query: str):
+        return self.embedding_model.encode(query)
+
+    def encode_many(self, queries):
+        return self.embedding_model.encode(list(queries))
+
     def text_index(self) -> Index:
         """Creating a text , vast index"""
 
@@ -30,55 +81,118 @@ class MinSearch:
         index.fit(self.embeddings, self.docs)
         return index
 
+    def compute_chunk_ids(self) -> np.ndarray:
+        """Id of every doc, docs with the same filename and section share the id of the first one"""
+        first_row = {}
+        chunk_ids = np.empty(len(self.docs), dtype=np.int64)
+        for row, doc in enumerate(self.docs):
+            chunk_ids[row] = first_row.setdefault((doc.get('filename'), doc.get('section')), row)
+        return chunk_ids
+
     def text_search(self, query: str):
-        return self.index.search(query, num_results=5)
+        return self.index.search(query, num_results=self.num_candidates, output_ids=True)
 
     def vector_search(self, query: str):
-        q = self.embedding_model.encode(query)
-        return self.v_index.search(q, num_results=5)
+        q = self.query_cache.get_or_encode(query, self.encode)
+        return self.v_index.search(q, num_results=self.num_candidates, output_ids=True)
+
+    def text_search_many(self, queries):
+        """text_search of every query, with one sparse matrix product per field and batch"""
+        results = []
+        for start in range(0, len(queries), QUERY_BATCH_SIZE):
+            batch = queries[start:start + QUERY_BATCH_SIZE]
+            scores = np.zeros((len(batch), len(self.docs)))
+            for field in self.index.text_fields:
+                query_vecs = self.index.vectorizers[field].transform(batch)
+                scores += cosine_similarity(query_vecs, self.index.text_matrices[field])
+            results.extend(top_results(row, self.docs, self.num_candidates) for row in scores)
+        return results
+
+    def vector_search_many(self, queries):
+        """vector_search of every query, with one encode call and one matrix product per batch"""
+        query_vectors = self.query_cache.get_or_encode_many(queries, self.encode_many)
+        if not isinstance(self.v_index, VectorSearch):
+            # ANN and quantized indexes search one query at a time
+            return [self.v_index.search(q, num_results=self.num_candidates, output_ids=True) for q in query_vectors]
+
+        results = []
+        for start in range(0, len(query_vectors), QUERY_BATCH_SIZE):
+            scores = cosine_similarity(query_vectors[start:start + QUERY_BATCH_SIZE], self.v_index.vectors)
+            results.extend(top_results(row, self.docs, self.num_candidates) for row in scores)
+        return results
+
+    def search_many(self, queries: list[str]) -> list[list[dict]]:
+        """
+        Hybrid search for several queries in one call.
+
+        Prefer this over repeated hybrid searches when you need results for
+        more than one query. Returns the results of every query, in order.
+        """
+        vector_future = self._executor.submit(self.vector_search_many, queries)
+        text_results = self.text_search_many(queries)
+        return [
+            self.fuse_results(text, vector)
+            for text, vector in zip(text_results, vector_future.result())
+        ]
 
     def hybrid_search(self, query: str):
+        """Text and vector search of the query, run concurrently"""
+        # encode releases the GIL, so the legs overlap and latency is
+        # close to the slower leg instead of the sum of both
+        vector_future = self._executor.submit(self.vector_search, query)
         text_results = self.text_search(query)
-        vector_results = self.vector_search(query)
-        
-        # Combine and deduplicate results
-        seen_ids = set()
-        combined_results = []
-
-        for result in text_results + vector_results:
-            text_to_hash = result['filename'] + ' ' + result['section'][0:250]
-            encoded_string = text_to_hash.encode('utf-8')
-            hash_object = hashlib.sha256(encoded_string)
-            hex_digest = hash_object.hexdigest()
-            if hex_digest not in seen_ids:
-                seen_ids.add(result['filename'])
-                combined_results.append(result)
-        
-        return combined_results
+        return self.fuse_results(text_results, vector_future.result())
+
+    async def ahybrid_search(self, query: str):
+        """Async variant of hybrid_search that does not block the event loop"""
+        text_results, vector_results = await asyncio.gather(
+            asyncio.to_thread(self.text_search, query),
+            asyncio.to_thread(self.vector_search, query),
+        )
+        return self.fuse_results(text_results, vector_results)
+
+    def fuse_results(self, text_results, vector_results, num_results=None):
+        """
+        Reciprocal rank fusion of the two result lists.
+
+        A doc scores weight / (rrf_k + rank) for each list it appears in, so
+        docs found by both legs rise to the top. Duplicates are merged on
+        the precomputed chunk id and the best num_results docs are returned.
+        """
+        scores = defaultdict(float)
+        fused_docs = {}
+        for results, weight in ((text_results, self.text_weight), (vector_results, self.vector_weight)):
+            for rank, result in enumerate(results, start=1):
+                chunk_id = int(self.chunk_ids[result['_id']])
+                scores[chunk_id] += weight / (self.rrf_k + rank)
+                fused_docs.setdefault(chunk_id, result)
+
+        top_ids = sorted(scores, key=lambda chunk_id: (-scores[chunk_id], chunk_id))
+        top_ids = top_ids[:num_results or self.num_results]
+        return [
+            {key: value for key, value in fused_docs[chunk_id].items() if key != '_id'}
+            for chunk_id in top_ids
+        ]
 
 
 if __name__ == "__main__":
-    FILE_PATH = "../course/vector_search_data.pkl"
-    loaded_data = None
-    try:
-        with open(FILE_PATH, 'rb') as f:
-            loaded_data = pickle.load(f)
-        print(f"Data successfully unpickled from {FILE_PATH}")
-
-        # Access the loaded data
-        loaded_embeddings = loaded_data['embeddings']
-        loaded_docs = loaded_data['documents']
-
-
-    except FileNotFoundError:
-        print(f"Error: The file {FILE_PATH} was not found.")
-    except pickle.UnpicklingError as e:
-        print(f"An error occurred during unpickling: {e}")
+    # Embeddings are memory mapped and docs read on access, see embeddings.py
+    loaded_embeddings, loaded_docs = load_search_data(DEFAULT_STORE_DIRECTORY)
 
     if len(loaded_embeddings) > 0 and len(loaded_docs) > 0:
+        # Large stores get an IVF index, persisted in the store generation
+        generation = store_generation(loaded_docs)
+        vector_index = build_vector_index(
+            loaded_embeddings,
+            loaded_docs,
+            path=os.path.join(generation, "ivf_index.npz"),
+            version=os.path.basename(generation)
+            )
         ms = MinSearch(
             docs=loaded_docs,
-            embeddings=loaded_embeddings
+            embeddings=loaded_embeddings,
+            vector_index=vector_index,
+            warm_up=True
             )
 
         query = "How can I evaluate classification model results, and ensure numerical data is not drifted?"
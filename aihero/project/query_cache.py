@@ -0,0 +1,127 @@
+import os
+import re
+import string
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of normalized query -> query embedding.
+
+    Queries are normalized before lookup and encoding (lowercased,
+    whitespace collapsed and optionally stripped of punctuation), so
+    repeated and trivially rephrased agent searches skip the encoder.
+    Pass path to keep the cache between runs, it is read on creation and
+    written by save().
+    """
+
+    def __init__(self, max_size=1024, lowercase=True, collapse_whitespace=True,
+                 strip_punctuation=False, path=None, model_name=None):
+        self.max_size = max_size
+        self.lowercase = lowercase
+        self.collapse_whitespace = collapse_whitespace
+        self.strip_punctuation = strip_punctuation
+        self.path = path
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def normalize(self, query):
+        if self.strip_punctuation:
+            query = query.translate(PUNCTUATION_TABLE)
+        if self.collapse_whitespace:
+            query = WHITESPACE_PATTERN.sub(' ', query).strip()
+        if self.lowercase:
+            query = query.lower()
+        return query
+
+    def get_or_encode(self, query, encode):
+        """Return the cached embedding of query, calling encode(query) on a miss"""
+        key = self.normalize(query)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+
+        # Encode outside the lock so concurrent searches are not serialized
+        embedding = np.asarray(encode(key))
+        embedding.setflags(write=False)
+        self._put(key, embedding)
+        return embedding
+
+    def get_or_encode_many(self, queries, encode_many):
+        """
+        Embeddings of all queries as one matrix, encoding the misses with a
+        single encode_many(list_of_queries) call.
+        """
+        keys = [self.normalize(query) for query in queries]
+        found = {}
+        with self._lock:
+            for key in keys:
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found[key] = embedding
+                else:
+                    self.misses += 1
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            for key, embedding in zip(missing, np.asarray(encode_many(missing))):
+                embedding.setflags(write=False)
+                self._put(key, embedding)
+                found[key] = embedding
+        return np.stack([found[key] for key in keys])
+
+    def _put(self, key, embedding):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+        }
+
+    def save(self, path=None):
+        """Write the cache to an .npz file, most recently used last"""
+        path = path or self.path
+        with self._lock:
+            keys = list(self._entries)
+            vectors = np.stack(list(self._entries.values())) if keys else np.empty((0, 0))
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, keys=np.array(keys, dtype=str), vectors=vectors,
+                     model_name=np.array(self.model_name or ''))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with np.load(path) as data:
+            # Embeddings of another model are useless
+            if str(data['model_name']) != (self.model_name or ''):
+                return
+            for key, embedding in zip(data['keys'], data['vectors']):
+                embedding.setflags(write=False)
+                self._put(str(key), embedding)
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = ".section_cache.sqlite"
+
+
+def section_cache_key(text, prompt_template, model):
+    """Key of an LLM split, changes when the document, prompt or model change"""
+    payload = json.dumps([text, prompt_template, model])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SectionCache:
+    """
+    Persistent cache of the sections the LLM split a document into.
+
+    Entries live in a single SQLite file so unchanged documents skip the
+    LLM call on the next run. Each entry records the namespace (usually
+    the repo) that wrote it, so prune only touches entries of that repo.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, namespace=""):
+        self.path = path
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.used_keys = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sections (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                sections TEXT NOT NULL,
+                used_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached sections or None, counting hits and misses"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sections FROM sections WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.used_keys.add(key)
+            self._conn.execute(
+                "UPDATE sections SET used_at = ?, namespace = ? WHERE key = ?",
+                (time.time(), self.namespace, key),
+            )
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def set(self, key, sections):
+        with self._lock:
+            self.used_keys.add(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sections (key, namespace, sections, used_at) VALUES (?, ?, ?, ?)",
+                (key, self.namespace, json.dumps(sections), time.time()),
+            )
+            self._conn.commit()
+
+    def prune(self, keep_keys=None):
+        """
+        Delete the entries of this namespace that are not in keep_keys.
+
+        keep_keys defaults to the keys read or written through this cache,
+        i.e. the documents of the current run. Returns the number removed.
+        """
+        keep_keys = self.used_keys if keep_keys is None else set(keep_keys)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM sections WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+            stale = [(key,) for (key,) in rows if key not in keep_keys]
+            self._conn.executemany("DELETE FROM sections WHERE key = ?", stale)
+            self._conn.commit()
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM sections").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def __len__(self):
+        return self.stats()["entries"]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,72 @@
+"""Benchmark memory, recall@k and latency of quantized vector search.
+
+Compares exact float32 search with float16 and int8 quantized matrices,
+with and without full precision re-ranking. Run from the project root:
+    python -m tests.benchmark_quantization --docs 100000 --dim 384
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from minsearch import VectorSearch
+
+from embeddings import load_search_data
+from vector_index import QuantizedVectorIndex
+
+
+def clustered_vectors(n, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim))
+    return vectors.astype(np.float32)
+
+
+def run_queries(index, queries, k, **search_params):
+    latencies, results = [], []
+    for q in queries:
+        started = time.perf_counter()
+        found = index.search(q, num_results=k, output_ids=True, **search_params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({r['_id'] for r in found})
+    return results, statistics.median(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quantized vector search")
+    parser.add_argument("--store", type=str, required=False, help="embedding store instead of synthetic vectors")
+    parser.add_argument("--docs", type=int, default=100_000, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=50, help="number of queries")
+    parser.add_argument("-k", type=int, default=10, help="results per query")
+    args = parser.parse_args()
+
+    if args.store:
+        vectors, docs = load_search_data(args.store)
+        # Duplicate sections tie and would make recall depend on tie breaking
+        vectors = np.unique(np.asarray(vectors, dtype=np.float32), axis=0)
+        docs = [{"id": i} for i in range(len(vectors))]
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(len(vectors), args.queries)] + 0.1 * rng.normal(size=(args.queries, vectors.shape[1]))
+    else:
+        clusters = max(10, args.docs // 1000)
+        vectors = clustered_vectors(args.docs, args.dim, clusters)
+        queries = clustered_vectors(args.queries, args.dim, clusters, seed=1)
+        docs = [{"id": i} for i in range(args.docs)]
+    queries = queries.astype(np.float32)
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    exact = VectorSearch().fit(vectors, docs)
+    expected, exact_latency = run_queries(exact, queries, args.k)
+    full_mb = vectors.nbytes / 1024 ** 2
+    print(f"{'float32 exact':<24} {full_mb:8.1f} MB          recall@{args.k} 1.000  p50 {exact_latency:7.2f} ms")
+
+    for dtype in ("float16", "int8"):
+        index = QuantizedVectorIndex(dtype=dtype).fit(vectors, docs)
+        index_mb = index.nbytes / 1024 ** 2
+        for rerank in (0, 100, 300):
+            found, latency = run_queries(index, queries, args.k, rerank=rerank)
+            recall = statistics.mean(len(e & f) / max(1, len(e)) for e, f in zip(expected, found))
+            label = f"{dtype} rerank={rerank}"
+            print(f"{label:<24} {index_mb:8.1f} MB ({1 - index_mb / full_mb:4.0%} saved) "
+                  f"recall@{args.k} {recall:.3f}  p50 {latency:7.2f} ms")
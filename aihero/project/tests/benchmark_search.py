@@ -0,0 +1,111 @@
+"""Benchmark hybrid search latency: sequential legs, concurrent legs, concurrent callers and batched queries.
+
+Needs an embedding store (see embeddings.py). Run from the project root:
+    python -m tests.benchmark_search --repeat 5 --callers 8
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embeddings import DEFAULT_STORE_DIRECTORY, load_search_data
+from hybrid_search import MinSearch
+
+QUERY_SETS = {
+    "keywords": [
+        "data drift",
+        "classification metrics",
+        "install",
+        "dashboard",
+        "test suite",
+        "regression report",
+    ],
+    "questions": [
+        "How can I evaluate classification model results?",
+        "How do I make sure numerical data is not drifted?",
+        "What is the difference between a report and a test suite?",
+        "How do I add a custom metric to a dashboard?",
+        "Can I run the checks on a schedule in production?",
+        "How do I compare reference and current datasets?",
+    ],
+    "long": [
+        "I am monitoring a binary classification model in production and I want to "
+        "compare the current week of predictions to the reference dataset used for "
+        "training, including drift in numerical and categorical features, what should I use?",
+        "We log LLM responses to a table and would like to evaluate them for toxicity, "
+        "sentiment and length and build a dashboard that tracks those descriptors over time, "
+        "how can we set that up?",
+    ],
+}
+
+
+def sequential_search(ms, query):
+    """hybrid_search with the two legs run one after the other"""
+    return ms.fuse_results(ms.text_search(query), ms.vector_search(query))
+
+
+def percentile(latencies, q):
+    return statistics.quantiles(latencies, n=100, method="inclusive")[q - 1]
+
+
+def measure(search, queries, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def measure_concurrent(search, queries, repeat, callers):
+    """Latency of every search when callers threads search at the same time, like concurrent chat sessions"""
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        runs = pool.map(lambda _: measure(search, queries, repeat), range(callers))
+        return [latency for latencies in runs for latency in latencies]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs concurrent hybrid search")
+    parser.add_argument("--store", type=str, default=DEFAULT_STORE_DIRECTORY, help="embedding store directory")
+    parser.add_argument("--repeat", type=int, default=5, help="times each query set is run")
+    parser.add_argument("--callers", type=int, default=8, help="threads searching at once for the concurrent run")
+    args = parser.parse_args()
+
+    embeddings, docs = load_search_data(args.store)
+    ms = MinSearch(docs=docs, embeddings=embeddings)
+    # Every run should pay for encoding, not hit the query embedding cache
+    ms.query_cache.max_size = 0
+
+    # Warm up the model and the thread pool
+    ms.hybrid_search("warm up")
+
+    strategies = {
+        "sequential": lambda query: sequential_search(ms, query),
+        "threaded": ms.hybrid_search,
+        "async": lambda query: asyncio.run(ms.ahybrid_search(query)),
+    }
+    legs = {
+        "text leg": ms.text_search,
+        "vector leg": ms.vector_search,
+    }
+
+    # Fused results are what ends up in the agent prompt
+    results = [ms.hybrid_search(query) for queries in QUERY_SETS.values() for query in queries]
+    result_chars = [sum(len(str(doc)) for doc in docs) for docs in results]
+    print(f"results per query: {statistics.mean(map(len, results)):.1f}, "
+          f"chars per query: {statistics.mean(result_chars):.0f}")
+
+    print(f"{'query set':<10} {'strategy':<11} {'p50 ms':>8} {'p95 ms':>8}")
+    for set_name, queries in QUERY_SETS.items():
+        for name, search in {**legs, **strategies}.items():
+            latencies = measure(search, queries, args.repeat)
+            print(f"{set_name:<10} {name:<11} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f}")
+
+        latencies = measure_concurrent(ms.hybrid_search, queries, args.repeat, args.callers)
+        print(f"{set_name:<10} {f'{args.callers} callers':<11} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f}")
+
+        # search_many answers the whole set at once, report the time per query
+        batch_latencies = [latency / len(queries) for latency in measure(ms.search_many, [queries], args.repeat)]
+        print(f"{set_name:<10} {'batched':<11} {statistics.median(batch_latencies):>8.1f} {'':>8}")
@@ -0,0 +1,84 @@
+"""Benchmark recall@k and latency of the IVF index against exact vector search.
+
+Uses synthetic clustered vectors, or an embedding store with --store.
+Run from the project root:
+    python -m tests.benchmark_vector_index --docs 200000 --dim 384
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from minsearch import VectorSearch
+
+from embeddings import load_search_data
+from vector_index import IVFVectorIndex
+
+
+def clustered_vectors(n, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim))
+    return vectors.astype(np.float16)
+
+
+def run_queries(index, queries, k, **search_params):
+    latencies, results = [], []
+    for q in queries:
+        started = time.perf_counter()
+        found = index.search(q, num_results=k, output_ids=True, **search_params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({r['_id'] for r in found})
+    return results, statistics.median(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark IVF vs exact vector search")
+    parser.add_argument("--store", type=str, required=False, help="embedding store instead of synthetic vectors")
+    parser.add_argument("--docs", type=int, default=100_000, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=100, help="number of queries")
+    parser.add_argument("-k", type=int, default=10, help="results per query")
+    parser.add_argument("--lists", type=int, required=False, help="IVF lists, sqrt(docs) by default")
+    args = parser.parse_args()
+
+    if args.store:
+        vectors, docs = load_search_data(args.store)
+        # Duplicate sections tie and would make recall depend on tie breaking
+        vectors = np.unique(np.asarray(vectors, dtype=np.float32), axis=0)
+        docs = [{"id": i} for i in range(len(vectors))]
+        rng = np.random.default_rng(1)
+        queries = np.asarray(vectors[rng.choice(len(vectors), args.queries)], dtype=np.float32)
+        queries += 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    else:
+        clusters = max(10, args.docs // 1000)
+        vectors = clustered_vectors(args.docs, args.dim, clusters)
+        queries = clustered_vectors(args.queries, args.dim, clusters, seed=1).astype(np.float32)
+        docs = [{"id": i} for i in range(args.docs)]
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    exact = VectorSearch().fit(vectors, docs)
+    expected, exact_latency = run_queries(exact, queries, args.k)
+    print(f"{'exact':<14} recall@{args.k} 1.000  p50 {exact_latency:7.2f} ms")
+
+    started = time.perf_counter()
+    ivf = IVFVectorIndex(n_lists=args.lists).fit(vectors, docs)
+    build_time = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ivf_index.npz")
+        ivf.save(path)
+        started = time.perf_counter()
+        IVFVectorIndex.load(path, vectors, docs)
+        load_time = time.perf_counter() - started
+    print(f"IVF with {len(ivf.centroids)} lists: build {build_time:.2f}s, load {load_time * 1000:.1f} ms")
+
+    for n_probe in (1, 2, 4, 8, 16, 32):
+        if n_probe > len(ivf.centroids):
+            break
+        found, latency = run_queries(ivf, queries, args.k, n_probe=n_probe)
+        recall = statistics.mean(len(e & f) / max(1, len(e)) for e, f in zip(expected, found))
+        print(f"{'ivf n_probe=' + str(n_probe):<14} recall@{args.k} {recall:.3f}  p50 {latency:7.2f} ms  "
+              f"speedup {exact_latency / latency:5.1f}x")
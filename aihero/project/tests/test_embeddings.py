@@ -0,0 +1,220 @@
+import json
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from minsearch import Index, VectorSearch
+
+from embeddings import (GENERATION_PREFIX, META_FILE, POINTER_FILE,
+                        EmbeddingStore, JsonlDocuments, build_embeddings,
+                        load_search_data, store_from_pickle)
+
+DOCS = [
+    {'filename': 'a.md', 'section': '## Install\n\npip install evidently'},
+    {'filename': 'a.md', 'section': '## Drift\n\nDetect data drift'},
+    {'filename': 'b.md', 'section': '## Metrics\n\nClassification metrics'},
+]
+
+
+class FakeModel:
+    """Deterministic stand-in for SentenceTransformer that records what it encodes"""
+
+    def __init__(self, dimension=8):
+        self.dimension = dimension
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        self.encoded.extend(texts)
+        return np.array([
+            np.random.default_rng(sum(text.encode())).random(self.dimension)
+            for text in texts
+        ], dtype=np.float32)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmbeddingStore(str(tmp_path / 'store'))
+
+
+def test_build_writes_float16_memmap_and_doc_table(store):
+    model = FakeModel()
+    stats = build_embeddings(DOCS, store, model=model)
+
+    embeddings, docs = store.load()
+    assert stats == {'reused': 0, 'encoded': 3}
+    assert isinstance(embeddings, np.memmap)
+    assert embeddings.dtype == np.float16
+    assert embeddings.shape == (3, 8)
+    assert list(docs) == DOCS
+    np.testing.assert_allclose(embeddings[2], model.encode([DOCS[2]['section']])[0], atol=1e-3)
+
+
+def test_rebuild_only_encodes_changed_sections(store):
+    build_embeddings(DOCS, store, model=FakeModel())
+    before, _ = store.load()
+    before = np.array(before)
+
+    edited = [DOCS[0], {**DOCS[1], 'section': '## Drift\n\nDetect drift in numerical data'}, DOCS[2], DOCS[2]]
+    model = FakeModel()
+    stats = build_embeddings(edited, store, model=model)
+
+    after, docs = store.load()
+    assert model.encoded == [edited[1]['section']]
+    assert stats == {'reused': 3, 'encoded': 1}
+    assert list(docs) == edited
+    np.testing.assert_array_equal(after[0], before[0])
+    np.testing.assert_array_equal(after[3], before[2])
+
+
+def test_unchanged_docs_do_not_load_model(store):
+    build_embeddings(DOCS, store, model=FakeModel())
+
+    stats = build_embeddings(DOCS, store, model=None)
+
+    assert stats == {'reused': 3, 'encoded': 0}
+
+
+def test_model_change_reencodes_everything(store):
+    build_embeddings(DOCS, store, model=FakeModel())
+
+    model = FakeModel()
+    stats = build_embeddings(DOCS, store, model=model, model_name='other-model')
+
+    assert stats['encoded'] == 3
+    assert store.load_meta()['model_name'] == 'other-model'
+
+
+def test_documents_are_read_lazily_by_offset(store):
+    build_embeddings(DOCS + [{'filename': 'c.md', 'section': 'Unicode — ünïcode'}], store, model=FakeModel())
+
+    docs = store.load_documents()
+    assert isinstance(docs, JsonlDocuments)
+    assert len(docs) == 4
+    assert docs[2] == DOCS[2]
+    assert docs[-1]['section'] == 'Unicode — ünïcode'
+    assert docs[np.int64(0)] == DOCS[0]
+    assert docs[1:3] == DOCS[1:3]
+    with pytest.raises(IndexError):
+        docs[4]
+
+    # Worker processes get the file paths, not the documents
+    assert pickle.loads(pickle.dumps(docs))[1] == DOCS[1]
+
+
+def test_documents_can_be_read_from_many_threads(store):
+    docs_in = [{'filename': f'{i}.md', 'section': f'Section {i} ' + 'x' * (i % 50)} for i in range(200)]
+    build_embeddings(docs_in, store, model=FakeModel())
+    docs = store.load_documents()
+
+    def read_all(offset):
+        return [docs[(offset + i) % len(docs)] for i in range(2000)]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(read_all, range(0, 200, 50)))
+
+    for offset, read in zip(range(0, 200, 50), results):
+        assert read == [docs_in[(offset + i) % len(docs_in)] for i in range(2000)]
+
+
+def test_write_switches_generations_in_one_step(store):
+    build_embeddings(DOCS, store, model=FakeModel())
+    old_embeddings, old_docs = store.load()
+
+    edited = DOCS + [{'filename': 'c.md', 'section': '## Reports\n\nBuild a report'}]
+    build_embeddings(edited, store, model=FakeModel())
+
+    # A reader of the previous generation still reads its own files
+    assert list(old_docs) == DOCS and len(old_embeddings) == 3
+    embeddings, docs = store.load()
+    assert list(docs) == edited and len(embeddings) == 4
+
+    # Only the current and the previous generation are kept
+    build_embeddings(edited[1:], store, model=FakeModel())
+    generations = [name for name in os.listdir(store.directory) if name.startswith(GENERATION_PREFIX)]
+    assert len(generations) == 2
+    assert os.path.basename(store.current_generation()) in generations
+    assert list(store.load()[1]) == edited[1:]
+
+
+def test_failed_write_keeps_current_generation(store):
+    build_embeddings(DOCS, store, model=FakeModel())
+
+    def fill_rows(out):
+        raise RuntimeError('interrupted')
+
+    with pytest.raises(RuntimeError):
+        store.write(DOCS[:1], fill_rows, dimension=8, model_name='multi-qa-distilbert-cos-v1')
+
+    assert list(store.load()[1]) == DOCS
+    assert not [name for name in os.listdir(store.directory) if name.startswith('.')]
+
+
+def test_store_without_generations_is_read_and_replaced(store):
+    build_embeddings(DOCS, store, model=FakeModel())
+    generation = store.current_generation()
+    for name in os.listdir(generation):
+        os.replace(os.path.join(generation, name), os.path.join(store.directory, name))
+    os.rmdir(generation)
+    os.remove(os.path.join(store.directory, POINTER_FILE))
+
+    assert list(store.load()[1]) == DOCS
+    stats = build_embeddings(DOCS, store, model=None)
+
+    assert stats == {'reused': 3, 'encoded': 0}
+    assert not os.path.exists(os.path.join(store.directory, META_FILE))
+    assert list(store.load()[1]) == DOCS
+
+
+def test_inconsistent_store_is_not_loaded(store, capsys):
+    build_embeddings(DOCS, store, model=FakeModel())
+    meta_path = os.path.join(store.current_generation(), META_FILE)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    with open(meta_path, 'w') as f:
+        json.dump({**meta, 'count': 2}, f)
+
+    with pytest.raises(ValueError):
+        store.load()
+    embeddings, docs = load_search_data(store.directory)
+    assert len(embeddings) == 0 and len(docs) == 0
+    assert 'Inconsistent embedding store' in capsys.readouterr().out
+
+
+def test_minsearch_indexes_fit_on_store(store):
+    build_embeddings(DOCS, store, model=FakeModel())
+    embeddings, docs = load_search_data(store.directory)
+
+    text_results = Index(text_fields=['section'], keyword_fields=[]).fit(docs).search('drift')
+    vector_results = VectorSearch().fit(embeddings, docs).search(np.asarray(embeddings[1], dtype=np.float32), num_results=1)
+
+    assert text_results == [DOCS[1]]
+    assert vector_results == [DOCS[1]]
+
+
+def test_store_from_pickle(store, tmp_path):
+    embeddings = np.random.default_rng(0).random((3, 4)).astype(np.float32)
+    pickle_path = tmp_path / 'vector_search_data.pkl'
+    with open(pickle_path, 'wb') as f:
+        pickle.dump({'embeddings': embeddings, 'documents': DOCS}, f)
+
+    assert store_from_pickle(pickle_path, store) == 3
+
+    loaded_embeddings, docs = store.load()
+    assert list(docs) == DOCS
+    np.testing.assert_allclose(loaded_embeddings, embeddings, atol=1e-3)
+
+
+def test_missing_store_loads_empty(tmp_path, capsys):
+    embeddings, docs = load_search_data(str(tmp_path / 'missing'))
+
+    assert len(embeddings) == 0 and len(docs) == 0
+    assert 'run embeddings.py first' in capsys.readouterr().out
+
+
+def test_full_precision_store(store):
+    build_embeddings(DOCS, store, model=FakeModel(), dtype='float32')
+
+    assert store.load_embeddings().dtype == np.float32
+    assert store.load_meta()['dtype'] == 'float32'
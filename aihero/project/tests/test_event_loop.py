@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import pytest
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+from agentic_hybrid_search import AgentSearch
+from event_loop import BackgroundEventLoop, get_event_loop
+
+
+async def current_loop():
+    return asyncio.get_running_loop()
+
+
+def test_shared_loop_is_reused():
+    loop = get_event_loop()
+
+    assert get_event_loop() is loop
+    assert loop.run(current_loop()) is loop.run(current_loop())
+
+
+def test_submit_from_many_threads():
+    loop = BackgroundEventLoop().start()
+
+    async def square(x):
+        await asyncio.sleep(0.01)
+        return x * x
+
+    futures = {}
+    threads = [threading.Thread(target=lambda x=x: futures.setdefault(x, loop.submit(square(x)))) for x in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {x: future.result(timeout=5) for x, future in futures.items()} == {x: x * x for x in range(8)}
+    loop.stop()
+    assert not loop.running
+
+
+def test_run_inside_loop_raises():
+    loop = BackgroundEventLoop().start()
+
+    async def nested():
+        with pytest.raises(RuntimeError):
+            loop.run(asyncio.sleep(0))
+
+    loop.run(nested())
+    loop.stop()
+
+
+def test_agent_search_runs_on_shared_loop(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    loops = []
+
+    async def answer(messages, info):
+        loops.append(asyncio.get_running_loop())
+        return ModelResponse(parts=[TextPart('done')])
+
+    ag = AgentSearch(name='test', tools=[], system_prompt='Answer', model='gpt-4o-mini')
+    with ag._agent.override(model=FunctionModel(answer)):
+        first = ag.search('first')
+        second = ag.search('second')
+
+    assert first.output == second.output == 'done'
+    assert loops[0] is loops[1] is get_event_loop().run(current_loop())
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+
+import pytest
+from openai import AsyncOpenAI
+from tenacity import wait_none
+
+from extract_and_chunking import (AsyncOpenAIClient, TokenRateLimiter,
+                                  create_chunks_async, iter_chunks_async,
+                                  parse_duration)
+from section_cache import SectionCache
+
+REPO_DATA = [
+    {'filename': f'doc_{i}.md', 'title': f'Doc {i}', 'content': f'document {i}'}
+    for i in range(12)
+]
+
+
+class StubResponsesServer(ThreadingHTTPServer):
+    """Local stand-in for the Responses API that splits every document in two sections"""
+
+    def __init__(self, delay=0.05, rate_limited_requests=0):
+        super().__init__(('127.0.0.1', 0), StubResponsesHandler)
+        self.delay = delay
+        self.rate_limited_requests = rate_limited_requests
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+
+class StubResponsesHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['input'][0]['content']
+        document = prompt.rsplit('<DOCUMENT>', 1)[-1].split('</DOCUMENT>')[0].strip()
+
+        with server.lock:
+            server.requests += 1
+            if server.rate_limited_requests:
+                server.rate_limited_requests -= 1
+                self._send(429, {'error': {'message': 'Rate limit reached', 'type': 'tokens'}},
+                           headers={'retry-after': '0.05'})
+                return
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+
+        # Later documents finish first so ordering is actually exercised
+        time.sleep(server.delay / (1 + int(document.split()[-1])))
+        with server.lock:
+            server.in_flight -= 1
+
+        text = f'## Intro\n\n{document} intro\n\n---\n\n## Details\n\n{document} details'
+        self._send(200, {
+            'id': 'resp_stub',
+            'object': 'response',
+            'created_at': 0,
+            'model': body['model'],
+            'status': 'completed',
+            'parallel_tool_calls': False,
+            'tool_choice': 'auto',
+            'tools': [],
+            'output': [{
+                'type': 'message',
+                'id': 'msg_stub',
+                'role': 'assistant',
+                'status': 'completed',
+                'content': [{'type': 'output_text', 'text': text, 'annotations': []}],
+            }],
+            'usage': {
+                'input_tokens': 100,
+                'input_tokens_details': {'cached_tokens': 0},
+                'output_tokens': 20,
+                'output_tokens_details': {'reasoning_tokens': 0},
+                'total_tokens': 120,
+            },
+        }, headers={
+            'x-ratelimit-limit-tokens': '1000000',
+            'x-ratelimit-remaining-tokens': '999000',
+        })
+
+
+@pytest.fixture
+def stub_server(request):
+    server = StubResponsesServer(**getattr(request, 'param', {}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub_server):
+    return AsyncOpenAI(base_url=stub_server.base_url, api_key='test', max_retries=0)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(AsyncOpenAIClient.llm.retry, 'wait', wait_none())
+
+
+async def test_chunks_keep_document_order(stub_server, client):
+    chunks = await create_chunks_async(REPO_DATA, 'stub-model', client=client, max_concurrency=4)
+
+    assert len(chunks) == 2 * len(REPO_DATA)
+    assert [chunk['filename'] for chunk in chunks[::2]] == [doc['filename'] for doc in REPO_DATA]
+    assert chunks[0] == {'filename': 'doc_0.md', 'title': 'Doc 0', 'section': '## Intro\n\ndocument 0 intro'}
+    assert all('content' not in chunk for chunk in chunks)
+
+
+async def test_closing_early_waits_for_cancelled_requests(stub_server, client):
+    chunks = iter_chunks_async(REPO_DATA, 'stub-model', client=client, max_concurrency=4)
+    await anext(chunks)
+    await chunks.aclose()
+
+    pending = [task for task in asyncio.all_tasks() if task.get_coro().__name__ == '_chunk_document']
+    assert pending == []
+
+
+async def test_concurrency_is_bounded(stub_server, client):
+    await create_chunks_async(REPO_DATA, 'stub-model', client=client, max_concurrency=3)
+
+    assert 1 < stub_server.max_in_flight <= 3
+
+
+@pytest.mark.parametrize('stub_server', [{'rate_limited_requests': 2}], indirect=True)
+async def test_rate_limited_requests_are_retried(stub_server, client):
+    chunks = await create_chunks_async(REPO_DATA[:3], 'stub-model', client=client, max_concurrency=1)
+
+    assert len(chunks) == 6
+    assert stub_server.requests == 5
+
+
+async def test_rate_limiter_adapts_to_headers():
+    limiter = TokenRateLimiter()
+    await limiter.acquire(10_000)
+
+    limiter.update_from_headers({'x-ratelimit-limit-tokens': '6000', 'x-ratelimit-remaining-tokens': '0'})
+    assert limiter.tokens_per_minute == 6000
+
+    # 6000 tokens per minute refill at 100 per second
+    started = time.monotonic()
+    await limiter.acquire(10)
+    assert time.monotonic() - started >= 0.09
+
+
+def test_parse_duration():
+    assert parse_duration('1s') == 1
+    assert parse_duration('6m0s') == 360
+    assert parse_duration('20ms') == pytest.approx(0.02)
+    assert parse_duration('0.5') == 0.5
+    assert parse_duration(None) is None
+
+
+async def test_cached_documents_skip_llm(stub_server, client):
+    with TemporaryDirectory() as tmp:
+        cache = SectionCache(os.path.join(tmp, 'sections.sqlite'))
+        first = await create_chunks_async(REPO_DATA, 'stub-model', client=client, cache=cache)
+        assert stub_server.requests == len(REPO_DATA)
+
+        changed = REPO_DATA[:-1] + [{**REPO_DATA[-1], 'content': 'document 99'}]
+        second = await create_chunks_async(changed, 'stub-model', client=client, cache=cache)
+
+        assert stub_server.requests == len(REPO_DATA) + 1
+        assert second[:-2] == first[:-2]
+        assert cache.stats()['hits'] == len(REPO_DATA) - 1
+        cache.close()
@@ -0,0 +1,159 @@
+import os
+import subprocess
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import embeddings
+from hybrid_search import MinSearch
+
+DOCS = [
+    {'title': 'Install', 'filename': 'install.md', 'section': 'Install with pip install evidently'},
+    {'title': 'Drift', 'filename': 'drift.md', 'section': 'Detect data drift in numerical columns'},
+    {'title': 'Metrics', 'filename': 'metrics.md', 'section': 'Classification metrics and reports'},
+]
+EMBEDDINGS = np.eye(3, dtype=np.float32)
+LEG_SECONDS = 0.2
+
+
+class SlowModel:
+    """Encoder that blocks outside the GIL for LEG_SECONDS, like a CPU bound encode"""
+
+    def encode(self, query):
+        time.sleep(LEG_SECONDS)
+        return np.array([0.0, 1.0, 0.0], dtype=np.float32)
+
+
+@pytest.fixture
+def search():
+    ms = MinSearch(docs=DOCS, embeddings=EMBEDDINGS, embedding_model=SlowModel())
+    text_search = ms.text_search
+
+    def slow_text_search(query):
+        time.sleep(LEG_SECONDS)
+        return text_search(query)
+
+    ms.text_search = slow_text_search
+    return ms
+
+
+def test_hybrid_search_overlaps_legs(search):
+    started = time.perf_counter()
+    results = search.hybrid_search('drift')
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1.5 * LEG_SECONDS
+    assert results[0] == DOCS[1]
+
+
+def test_concurrent_searches_do_not_queue_vector_legs(search):
+    queries = ['drift', 'install', 'metrics', 'reports']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        list(pool.map(search.hybrid_search, queries))
+    elapsed = time.perf_counter() - started
+
+    # One vector worker would take len(queries) * LEG_SECONDS
+    assert elapsed < 2 * LEG_SECONDS
+
+
+async def test_ahybrid_search_matches_sync(search):
+    started = time.perf_counter()
+    results = await search.ahybrid_search('drift')
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1.5 * LEG_SECONDS
+    assert results == search.hybrid_search('drift')
+
+
+def test_fusion_ranks_docs_found_by_both_legs_first(search):
+    text_results = [{**DOCS[0], '_id': 0}, {**DOCS[1], '_id': 1}]
+    vector_results = [{**DOCS[2], '_id': 2}, {**DOCS[1], '_id': 1}]
+
+    assert search.fuse_results(text_results, vector_results) == [DOCS[1], DOCS[0], DOCS[2]]
+    assert search.fuse_results(text_results, vector_results, num_results=1) == [DOCS[1]]
+
+
+def test_fusion_merges_duplicate_chunks():
+    docs = DOCS + [dict(DOCS[0])]
+    ms = MinSearch(docs=docs, embeddings=np.eye(4, 3, dtype=np.float32), embedding_model=SlowModel())
+
+    assert list(ms.chunk_ids) == [0, 1, 2, 0]
+    fused = ms.fuse_results([{**docs[3], '_id': 3}], [{**docs[0], '_id': 0}, {**docs[2], '_id': 2}])
+    assert fused == [DOCS[0], DOCS[2]]
+
+
+def test_fusion_weights():
+    ms = MinSearch(docs=DOCS, embeddings=EMBEDDINGS, embedding_model=SlowModel(), vector_weight=2.0)
+
+    fused = ms.fuse_results([{**DOCS[0], '_id': 0}], [{**DOCS[2], '_id': 2}])
+
+    assert fused == [DOCS[2], DOCS[0]]
+
+
+def test_importing_does_not_load_sentence_transformers():
+    # A fresh interpreter, other tests may have imported them already
+    code = ("import sys, embeddings, hybrid_search; "
+            "assert 'sentence_transformers' not in sys.modules and 'torch' not in sys.modules")
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', code], cwd=project_dir, check=True)
+
+
+def test_model_is_shared_and_loaded_on_first_vector_query(monkeypatch):
+    loads = []
+
+    class FakeSentenceTransformer(SlowModel):
+        def __init__(self, model_name):
+            loads.append(model_name)
+            time.sleep(LEG_SECONDS)
+
+    monkeypatch.setattr(embeddings, '_models', {})
+    monkeypatch.setitem(sys.modules, 'sentence_transformers',
+                        types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer))
+
+    first = MinSearch(docs=DOCS, embeddings=EMBEDDINGS)
+    first.text_search('drift')
+    assert loads == []
+
+    # A warm up and a query racing it share one load
+    second = MinSearch(docs=DOCS, embeddings=EMBEDDINGS, warm_up=True)
+    first.vector_search('drift')
+    second.vector_search('metrics')
+
+    assert loads == ['multi-qa-distilbert-cos-v1']
+    assert first.embedding_model is second.embedding_model
+
+
+class BatchModel:
+    """Encoder with distinct vectors per query that counts encode calls"""
+
+    VECTORS = {
+        'drift': [0.1, 1.0, 0.2],
+        'install pip': [1.0, 0.1, 0.3],
+        'classification metrics': [0.2, 0.3, 1.0],
+    }
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, queries):
+        self.calls.append(queries)
+        if isinstance(queries, str):
+            return np.array(self.VECTORS[queries], dtype=np.float32)
+        return np.array([self.VECTORS[q] for q in queries], dtype=np.float32)
+
+
+def test_search_many_matches_hybrid_search():
+    queries = list(BatchModel.VECTORS)
+    model = BatchModel()
+    ms = MinSearch(docs=DOCS, embeddings=EMBEDDINGS, embedding_model=model, num_results=3)
+
+    batched = ms.search_many(queries)
+
+    assert model.calls == [queries]
+    assert batched == [ms.hybrid_search(q) for q in queries]
+    assert len(model.calls) == 1
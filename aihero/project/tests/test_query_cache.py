@@ -0,0 +1,79 @@
+import numpy as np
+
+from query_cache import QueryEmbeddingCache
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, query):
+        self.queries.append(query)
+        return np.full(4, len(self.queries), dtype=np.float32)
+
+
+def test_normalized_queries_hit_cache():
+    cache = QueryEmbeddingCache()
+    encode = CountingEncoder()
+
+    first = cache.get_or_encode('How do I detect  Drift?', encode)
+    second = cache.get_or_encode('  how do i detect drift? ', encode)
+
+    assert encode.queries == ['how do i detect drift?']
+    assert second is first
+    assert not first.flags.writeable
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'size': 1}
+
+
+def test_normalization_settings():
+    cache = QueryEmbeddingCache(lowercase=False, strip_punctuation=True)
+
+    assert cache.normalize('Data drift?!') == 'Data drift'
+    assert cache.normalize('data drift') != cache.normalize('Data drift')
+
+
+def test_lru_eviction():
+    cache = QueryEmbeddingCache(max_size=2)
+    encode = CountingEncoder()
+
+    cache.get_or_encode('a', encode)
+    cache.get_or_encode('b', encode)
+    cache.get_or_encode('a', encode)
+    cache.get_or_encode('c', encode)
+    cache.get_or_encode('a', encode)
+    cache.get_or_encode('b', encode)
+
+    assert encode.queries == ['a', 'b', 'c', 'b']
+    assert cache.stats()['size'] == 2
+
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / 'queries.npz')
+    cache = QueryEmbeddingCache(path=path, model_name='model')
+    expected = cache.get_or_encode('data drift', CountingEncoder())
+    cache.save()
+
+    encode = CountingEncoder()
+    reloaded = QueryEmbeddingCache(path=path, model_name='model')
+    np.testing.assert_array_equal(reloaded.get_or_encode('data drift', encode), expected)
+    assert encode.queries == []
+
+    other_model = QueryEmbeddingCache(path=path, model_name='other-model')
+    assert other_model.stats()['size'] == 0
+
+
+def test_get_or_encode_many_encodes_misses_once():
+    cache = QueryEmbeddingCache()
+    cache.get_or_encode('data drift', CountingEncoder())
+    batches = []
+
+    def encode_many(queries):
+        batches.append(queries)
+        return np.ones((len(queries), 4), dtype=np.float32)
+
+    vectors = cache.get_or_encode_many(['Data drift', 'metrics', 'METRICS', 'install'], encode_many)
+
+    assert batches == [['metrics', 'install']]
+    assert vectors.shape == (4, 4)
+    np.testing.assert_array_equal(vectors[0], np.full(4, 1))
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,50 @@
+import os
+from tempfile import TemporaryDirectory
+
+from section_cache import SectionCache, section_cache_key
+
+
+def test_key_changes_with_text_prompt_and_model():
+    key = section_cache_key('doc', 'prompt', 'model')
+
+    assert key == section_cache_key('doc', 'prompt', 'model')
+    assert key != section_cache_key('doc 2', 'prompt', 'model')
+    assert key != section_cache_key('doc', 'prompt 2', 'model')
+    assert key != section_cache_key('doc', 'prompt', 'model 2')
+
+
+def test_sections_persist_across_instances():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sections.sqlite')
+        cache = SectionCache(path)
+        assert cache.get('a') is None
+        cache.set('a', ['## One', '## Two'])
+        cache.close()
+
+        cache = SectionCache(path)
+        assert cache.get('a') == ['## One', '## Two']
+        assert cache.stats() == {'hits': 1, 'misses': 0, 'entries': 1}
+        cache.close()
+
+
+def test_prune_removes_unreferenced_entries_of_namespace():
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sections.sqlite')
+        other_repo = SectionCache(path, namespace='other/repo')
+        other_repo.set('other', ['## Other'])
+
+        first_run = SectionCache(path, namespace='owner/repo')
+        first_run.set('old', ['## Old'])
+        first_run.set('kept', ['## Kept'])
+
+        second_run = SectionCache(path, namespace='owner/repo')
+        second_run.get('kept')
+        second_run.set('new', ['## New'])
+
+        assert second_run.prune() == 1
+        assert second_run.get('old') is None
+        assert second_run.get('other') == ['## Other']
+        assert len(second_run) == 3
+
+        for cache in (other_repo, first_run, second_run):
+            cache.close()
@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+import pytest
+from minsearch import VectorSearch
+
+from embeddings import EmbeddingStore, store_generation
+from vector_index import (IVFVectorIndex, QuantizedVectorIndex,
+                          build_vector_index)
+
+
+def clustered_vectors(n=2000, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    return vectors.astype(np.float32)
+
+
+@pytest.fixture
+def data():
+    vectors = clustered_vectors()
+    docs = [{'section': f'doc {i}'} for i in range(len(vectors))]
+    queries = clustered_vectors(n=50, seed=1)
+    return vectors, docs, queries
+
+
+def test_ivf_recall_against_exact_search(data):
+    vectors, docs, queries = data
+    exact = VectorSearch().fit(vectors, docs)
+    ivf = IVFVectorIndex(n_probe=8).fit(vectors, docs)
+
+    recalls = []
+    for q in queries:
+        expected = {r['_id'] for r in exact.search(q, num_results=10, output_ids=True)}
+        found = {r['_id'] for r in ivf.search(q, num_results=10, output_ids=True)}
+        recalls.append(len(expected & found) / len(expected))
+
+    assert np.mean(recalls) >= 0.9
+
+
+def test_probing_every_list_is_exact(data):
+    vectors, docs, queries = data
+    exact = VectorSearch().fit(vectors, docs)
+    ivf = IVFVectorIndex().fit(vectors, docs)
+
+    q = queries[0]
+    assert ivf.search(q, num_results=5, n_probe=len(ivf.centroids)) == exact.search(q, num_results=5)
+
+
+class Unreadable:
+    """Stand-in for a memory mapped matrix that must not be paged in"""
+
+    def __init__(self, n):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, rows):
+        raise AssertionError('vectors were read')
+
+
+def test_save_and_load(data, tmp_path):
+    vectors, docs, queries = data
+    path = str(tmp_path / 'ivf.npz')
+    ivf = IVFVectorIndex(version='generation-a').fit(vectors, docs)
+    ivf.save(path)
+
+    # Loading checks the version, it does not read the vectors
+    assert IVFVectorIndex.load(path, Unreadable(len(vectors)), docs, version='generation-a') is not None
+    loaded = IVFVectorIndex.load(path, vectors, docs, version='generation-a')
+    assert loaded.search(queries[0], output_ids=True) == ivf.search(queries[0], output_ids=True)
+
+    assert IVFVectorIndex.load(path, vectors, docs, version='generation-b') is None
+    assert IVFVectorIndex.load(path, vectors, docs) is None
+    assert IVFVectorIndex.load(path, vectors[:-1], docs[:-1], version='generation-a') is None
+
+
+def test_build_vector_index(data, tmp_path):
+    vectors, docs, _ = data
+    path = str(tmp_path / 'ivf.npz')
+
+    assert isinstance(build_vector_index(vectors, docs, path=path), VectorSearch)
+    built = build_vector_index(vectors, docs, path=path, version='a', min_docs=100, n_probe=4)
+    loaded = build_vector_index(vectors, docs, path=path, version='a', min_docs=100, n_probe=6)
+
+    assert isinstance(built, IVFVectorIndex)
+    np.testing.assert_array_equal(loaded.centroids, built.centroids)
+    assert loaded.n_probe == 6
+
+
+def test_index_is_kept_per_store_generation(data, tmp_path):
+    vectors, docs, _ = data
+    store = EmbeddingStore(str(tmp_path / 'store'))
+
+    def open_index():
+        embeddings, store_docs = store.load()
+        generation = store_generation(store_docs)
+        path = os.path.join(generation, 'ivf_index.npz')
+        return build_vector_index(embeddings, store_docs, path=path, version=os.path.basename(generation),
+                                  min_docs=100), path
+
+    def write(matrix):
+        def fill_rows(out):
+            out[:] = matrix
+        store.write(docs, fill_rows, dimension=matrix.shape[1], model_name='test', dtype='float32')
+
+    write(vectors)
+    first, first_path = open_index()
+    assert os.path.exists(first_path)
+    second, second_path = open_index()
+    np.testing.assert_array_equal(second.centroids, first.centroids)
+
+    # A rebuild with the same number of vectors is a new generation and a new index
+    edited = vectors.copy()
+    edited[1:31] = clustered_vectors(n=30, seed=2)
+    write(edited)
+    rebuilt, rebuilt_path = open_index()
+    assert rebuilt_path != first_path
+    np.testing.assert_allclose(rebuilt.inv_norms[1:31], 1 / np.linalg.norm(edited[1:31], axis=1), rtol=1e-5)
+
+
+@pytest.mark.parametrize('dtype, memory_ratio', [('int8', 0.3), ('float16', 0.55)])
+def test_quantized_index_with_rerank_matches_exact(data, dtype, memory_ratio):
+    vectors, docs, queries = data
+    exact = VectorSearch().fit(vectors, docs)
+    quantized = QuantizedVectorIndex(dtype=dtype, rerank=100).fit(vectors, docs)
+
+    assert quantized.quantized.dtype == np.dtype(dtype)
+    assert quantized.nbytes < memory_ratio * vectors.nbytes
+    for q in queries[:10]:
+        expected = [r['_id'] for r in exact.search(q, num_results=10, output_ids=True)]
+        assert [r['_id'] for r in quantized.search(q, num_results=10, output_ids=True)] == expected
+
+
+def test_quantized_index_without_rerank_has_high_recall(data):
+    vectors, docs, queries = data
+    exact = VectorSearch().fit(vectors, docs)
+    quantized = QuantizedVectorIndex(dtype='int8', rerank=0).fit(vectors, docs)
+
+    recalls = []
+    for q in queries:
+        expected = {r['_id'] for r in exact.search(q, num_results=10, output_ids=True)}
+        found = {r['_id'] for r in quantized.search(q, num_results=10, output_ids=True)}
+        recalls.append(len(expected & found) / len(expected))
+
+    assert np.mean(recalls) >= 0.9
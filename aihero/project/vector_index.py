@@ -0,0 +1,273 @@
+import os
+
+import numpy as np
+from minsearch import VectorSearch
+
+# Below this many vectors brute force search is fast enough
+ANN_MIN_DOCS = 10_000
+ASSIGN_BATCH_SIZE = 65_536
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _assign(x, centroids):
+    """Nearest centroid of every row, computed in batches to bound memory"""
+    assignments = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), ASSIGN_BATCH_SIZE):
+        batch = _normalize(np.asarray(x[start:start + ASSIGN_BATCH_SIZE], dtype=np.float32))
+        assignments[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(x, n_clusters, iterations=10, seed=0):
+    """k-means on the unit sphere, x must be normalized"""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, x)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Re-seed empty clusters with random points
+        empty = counts == 0
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFVectorIndex:
+    """
+    Inverted file index for cosine similarity search.
+
+    fit clusters the vectors with spherical k-means into n_lists lists,
+    search only scores the vectors of the n_probe lists closest to the
+    query. Vectors are not copied, so a memory mapped embedding matrix
+    stays on disk; the index itself (centroids, lists and inverse norms)
+    is small and can be saved in the embedding store generation it was
+    built from. version names that generation, a saved index is only
+    loaded for the same version, so loading never reads the vectors.
+
+    Same search API as minsearch.VectorSearch, without keyword filters.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, iterations=10, seed=0, version=None):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        self.version = version
+        self.vectors = None
+        self.docs = []
+
+    def fit(self, vectors, payload):
+        if len(vectors) != len(payload):
+            raise ValueError("Number of vectors must match number of payload documents")
+
+        self.vectors = vectors
+        self.docs = payload
+        n = len(vectors)
+        if n == 0:
+            return self
+
+        n_lists = min(self.n_lists or int(np.sqrt(n)), n)
+        # Train on a sample, assigning every vector afterwards
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n, 256 * n_lists)
+        sample_rows = np.sort(rng.choice(n, sample_size, replace=False))
+        sample = _normalize(np.asarray(vectors[sample_rows], dtype=np.float32))
+        self.centroids = spherical_kmeans(sample, n_lists, iterations=self.iterations, seed=self.seed)
+
+        assignments = _assign(vectors, self.centroids)
+        self.order = np.argsort(assignments, kind='stable').astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+        self.inv_norms = np.empty(n, dtype=np.float32)
+        for start in range(0, n, ASSIGN_BATCH_SIZE):
+            batch = np.asarray(vectors[start:start + ASSIGN_BATCH_SIZE], dtype=np.float32)
+            self.inv_norms[start:start + len(batch)] = 1 / np.maximum(np.linalg.norm(batch, axis=1), 1e-12)
+        return self
+
+    def candidates(self, query_vector, n_probe=None):
+        """Rows of the lists closest to the query, in ascending order for locality"""
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        centroid_scores = self.centroids @ query_vector
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        rows = np.concatenate([self.order[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe])
+        rows.sort()
+        return rows
+
+    def search(self, query_vector, filter_dict=None, num_results=10, output_ids=False, n_probe=None):
+        if filter_dict:
+            raise ValueError("IVFVectorIndex does not support keyword filters")
+        if not len(self.docs) or self.vectors is None:
+            return []
+
+        query_vector = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(-1))
+        rows = self.candidates(query_vector, n_probe=n_probe)
+        scores = (np.asarray(self.vectors[rows], dtype=np.float32) @ query_vector) * self.inv_norms[rows]
+
+        # Like VectorSearch, only positive scores are results
+        positive = scores > 0
+        rows, scores = rows[positive], scores[positive]
+        num_results = min(num_results, len(rows))
+        if num_results == 0:
+            return []
+        top = np.argpartition(-scores, num_results - 1)[:num_results]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        if output_ids:
+            return [{**self.docs[int(rows[i])], '_id': int(rows[i])} for i in top]
+        return [self.docs[int(rows[i])] for i in top]
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                order=self.order,
+                list_offsets=self.list_offsets,
+                inv_norms=self.inv_norms,
+                n_probe=self.n_probe,
+                version=self.version or '',
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, vectors, payload, version=None):
+        """Load a saved index, None when it was saved for another version or number of vectors"""
+        with np.load(path) as data:
+            # Indexes saved before versions have a fingerprint instead
+            if 'version' not in data.files or str(data['version']) != (version or ''):
+                return None
+            if not len(data['inv_norms']) == len(vectors) == len(payload):
+                return None
+            index = cls(n_lists=len(data['centroids']), n_probe=int(data['n_probe']), version=version)
+            index.centroids = data['centroids']
+            index.order = data['order']
+            index.list_offsets = data['list_offsets']
+            index.inv_norms = data['inv_norms']
+        index.vectors = vectors
+        index.docs = payload
+        return index
+
+
+class QuantizedVectorIndex:
+    """
+    Brute force cosine search over a quantized copy of the vectors.
+
+    The normalized vectors are kept in memory as float16 (half the size of
+    float32) or int8 with a per dimension scale (a quarter of the size).
+    Every vector is scored on the quantized matrix, then the best rerank
+    candidates are re-scored with the full precision vectors, which may be
+    a memory mapped store that stays on disk.
+
+    Same search API as minsearch.VectorSearch, without keyword filters.
+    """
+
+    def __init__(self, dtype='int8', rerank=200):
+        if dtype not in ('int8', 'float16'):
+            raise ValueError(f"Unsupported quantization dtype: {dtype}")
+        self.dtype = dtype
+        self.rerank = rerank
+        self.vectors = None
+        self.docs = []
+
+    def fit(self, vectors, payload):
+        if len(vectors) != len(payload):
+            raise ValueError("Number of vectors must match number of payload documents")
+
+        self.vectors = vectors
+        self.docs = payload
+        n = len(vectors)
+        dim = vectors.shape[1] if n else 0
+
+        self.inv_norms = np.empty(n, dtype=np.float32)
+        self.quantized = np.empty((n, dim), dtype=self.dtype)
+        if self.dtype == 'int8':
+            max_abs = np.zeros(dim, dtype=np.float32)
+            for start in range(0, n, ASSIGN_BATCH_SIZE):
+                batch = _normalize(np.asarray(vectors[start:start + ASSIGN_BATCH_SIZE], dtype=np.float32))
+                max_abs = np.maximum(max_abs, np.abs(batch).max(axis=0))
+            self.scale = np.maximum(max_abs, 1e-12) / 127
+        else:
+            self.scale = np.ones(dim, dtype=np.float32)
+
+        for start in range(0, n, ASSIGN_BATCH_SIZE):
+            batch = np.asarray(vectors[start:start + ASSIGN_BATCH_SIZE], dtype=np.float32)
+            inv_norms = 1 / np.maximum(np.linalg.norm(batch, axis=1), 1e-12)
+            self.inv_norms[start:start + len(batch)] = inv_norms
+            normalized = batch * inv_norms[:, None]
+            if self.dtype == 'int8':
+                normalized = np.clip(np.rint(normalized / self.scale), -127, 127)
+            self.quantized[start:start + len(batch)] = normalized
+        return self
+
+    @property
+    def nbytes(self):
+        """Memory held by the index, the full precision vectors excluded"""
+        return self.quantized.nbytes + self.inv_norms.nbytes + self.scale.nbytes
+
+    def approximate_scores(self, query_vector):
+        # Folding the scale into the query keeps the matrix quantized
+        scaled_query = (query_vector * self.scale).astype(np.float32)
+        scores = np.empty(len(self.quantized), dtype=np.float32)
+        for start in range(0, len(self.quantized), ASSIGN_BATCH_SIZE):
+            batch = self.quantized[start:start + ASSIGN_BATCH_SIZE]
+            scores[start:start + len(batch)] = batch.astype(np.float32) @ scaled_query
+        return scores
+
+    def search(self, query_vector, filter_dict=None, num_results=10, output_ids=False, rerank=None):
+        if filter_dict:
+            raise ValueError("QuantizedVectorIndex does not support keyword filters")
+        if not len(self.docs) or self.vectors is None:
+            return []
+
+        query_vector = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(-1))
+        scores = self.approximate_scores(query_vector)
+
+        rerank = self.rerank if rerank is None else rerank
+        num_candidates = min(max(rerank, num_results), len(scores))
+        rows = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+        rows.sort()
+        if rerank:
+            scores = (np.asarray(self.vectors[rows], dtype=np.float32) @ query_vector) * self.inv_norms[rows]
+        else:
+            scores = scores[rows]
+
+        # Like VectorSearch, only positive scores are results
+        positive = scores > 0
+        rows, scores = rows[positive], scores[positive]
+        num_results = min(num_results, len(rows))
+        if num_results == 0:
+            return []
+        top = np.argsort(-scores, kind='stable')[:num_results]
+
+        if output_ids:
+            return [{**self.docs[int(rows[i])], '_id': int(rows[i])} for i in top]
+        return [self.docs[int(rows[i])] for i in top]
+
+
+def build_vector_index(vectors, payload, path=None, version=None, min_docs=ANN_MIN_DOCS, **ivf_params):
+    """
+    Vector index for MinSearch: exact VectorSearch for small collections,
+    an IVF index otherwise, loaded from path when it was saved for the
+    same version (the store generation of the vectors, see
+    embeddings.store_generation) and built (and saved to path) when not.
+    """
+    if len(vectors) < min_docs:
+        return VectorSearch().fit(vectors, payload)
+
+    if path and os.path.exists(path):
+        index = IVFVectorIndex.load(path, vectors, payload, version=version)
+        if index is not None:
+            index.n_probe = ivf_params.get('n_probe', index.n_probe)
+            return index
+
+    index = IVFVectorIndex(version=version, **ivf_params).fit(vectors, payload)
+    if path:
+        index.save(path)
+    return index